@@ -0,0 +1,120 @@
+import math
+import time
+import threading
+
+
+class Overloaded(Exception):
+    """Raised when the admission queue is full."""
+
+    def __init__(self, retry_after):
+        super().__init__("Server overloaded, retry later")
+        self.retry_after = retry_after
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a request's deadline passes before its forward pass."""
+
+
+def check_deadline(deadline):
+    if deadline is not None and time.monotonic() >= deadline:
+        raise DeadlineExceeded("Request deadline exceeded")
+
+
+class Ticket:
+    """One admitted request; releases its slot when closed."""
+
+    __slots__ = ("controller", "deadline", "_released")
+
+    def __init__(self, controller, deadline):
+        self.controller = controller
+        self.deadline = deadline
+        self._released = False
+
+    def check(self):
+        check_deadline(self.deadline)
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self.controller._release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+        return False
+
+
+class AdmissionController:
+    """
+    Bounded admission in front of inference.
+
+    At most `max_pending` requests are admitted at once (decoding, queued
+    for the model or running); beyond that `admit()` fails immediately with
+    Overloaded instead of letting work, and the decoded images it holds,
+    pile up. Each admitted request carries an absolute deadline that later
+    stages check so expired work is dropped before the forward pass.
+    """
+
+    def __init__(self, max_pending=64, default_deadline_ms=0, max_deadline_ms=60000, retry_after=1):
+        self.max_pending = max(1, int(max_pending))
+        self.default_deadline_ms = float(default_deadline_ms)
+        self.max_deadline_ms = float(max_deadline_ms)
+        self.retry_after = max(1, int(retry_after))
+
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._peak = 0
+        self._admitted = 0
+        self._shed = {"queue_full": 0, "deadline": 0}
+
+    # ----------------------------------------------------------------------
+    def deadline_from(self, budget_ms=None):
+        """Absolute deadline for a request with `budget_ms` (header value or default)."""
+        try:
+            budget = float(budget_ms) if budget_ms not in (None, "") else self.default_deadline_ms
+        except ValueError:
+            budget = self.default_deadline_ms
+        # nan compares false with everything, so it would never expire
+        if not math.isfinite(budget):
+            budget = self.default_deadline_ms
+        if budget <= 0:
+            return None
+        return time.monotonic() + min(budget, self.max_deadline_ms) / 1000.0
+
+    def admit(self, deadline=None):
+        """Take a slot or raise Overloaded; use the returned Ticket as a context manager."""
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self._shed["queue_full"] += 1
+                raise Overloaded(self.retry_after)
+            self._pending += 1
+            self._admitted += 1
+            self._peak = max(self._peak, self._pending)
+        return Ticket(self, deadline)
+
+    def record_expired(self):
+        with self._lock:
+            self._shed["deadline"] += 1
+
+    def _release(self):
+        with self._lock:
+            self._pending -= 1
+
+    # ----------------------------------------------------------------------
+    @property
+    def depth(self):
+        return self._pending
+
+    def stats(self):
+        with self._lock:
+            return {
+                "pending": self._pending,
+                "max_pending": self.max_pending,
+                "utilization": round(self._pending / self.max_pending, 4),
+                "peak_pending": self._peak,
+                "admitted": self._admitted,
+                "shed_queue_full": self._shed["queue_full"],
+                "shed_deadline": self._shed["deadline"],
+            }
@@ -1,17 +1,31 @@
 import os
+import json
+import time
 import logging
+import threading
 import base64
+import binascii
+import shutil
+import tempfile
+import zipfile
 from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
 
 from dotenv import load_dotenv
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify, stream_with_context
 from flask_cors import CORS
-from PIL import Image
+from werkzeug.exceptions import RequestEntityTooLarge
 import numpy as np
+from PIL import Image, UnidentifiedImageError
 
-# Keras 3.x (NOT tensorflow.keras!)
-from keras.models import load_model
-from keras.applications.resnet50 import preprocess_input
+from admission import AdmissionController, DeadlineExceeded, Overloaded, check_deadline
+from batcher import MicroBatcher
+from model_registry import ModelRegistry, ModelRouter, ModelVersion
+from metrics import Registry, SlowRequestProfiler, StageTimer
+from prediction_cache import PredictionCache
+from similarity_index import SimilarityIndex, index_dir
+from preprocessing import ImagePreprocessor, TTA_VIEWS
+from inference_backends import load_backend
 
 # Optional internal modules (you can remove if unused)
 # from model_trainer import TeethDiseaseModel
@@ -21,6 +35,8 @@ from keras.applications.resnet50 import preprocess_input
 # -------------------------------------------------
 # INIT APP + LOGGING
 # -------------------------------------------------
+STARTED_AT = time.monotonic()
+
 app = Flask(__name__)
 CORS(app, resources={r"/*": {"origins": "*"}})
 
@@ -35,15 +51,34 @@ logger = logging.getLogger(__name__)
 BASE_DIR = os.path.dirname(__file__)
 MODEL_PATH = os.path.join(BASE_DIR, "models", "teeth_disease_model.h5")
 
-logger.info(f"🔍 Loading trained model from: {MODEL_PATH}")
+# keras: the .h5 above; tflite: an artifact from `model_trainer.py --mode export`
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "keras").lower()
+TFLITE_MODEL_PATH = os.getenv(
+    "TFLITE_MODEL_PATH", os.path.join(BASE_DIR, "models", "teeth_disease_model_int8.tflite")
+)
+INFERENCE_THREADS = int(os.getenv("INFERENCE_THREADS", "0")) or None
+INTER_OP_THREADS = int(os.getenv("INTER_OP_THREADS", "0")) or None
+# keras: serve through a compiled fixed-shape call, padding batches up to
+# these sizes (false = plain model.predict)
+INFERENCE_COMPILED = os.getenv("INFERENCE_COMPILED", "true").lower() == "true"
+INFERENCE_BATCH_BUCKETS = [int(b) for b in os.getenv("INFERENCE_BATCH_BUCKETS", "1,2,4,8,16,32").split(",") if b.strip()]
+
+ACTIVE_MODEL_PATH = TFLITE_MODEL_PATH if INFERENCE_BACKEND == "tflite" else MODEL_PATH
 
-model = None
-try:
-    model = load_model(MODEL_PATH, compile=False)
-    logger.info("✅ Model loaded successfully (Keras 3.x)")
-except Exception as e:
-    logger.error(f"❌ Model loading failed: {e}")
-    model = None
+# Versioned model registry (see model_registry.py). When set and non-empty,
+# its CURRENT version is served instead of MODEL_PATH, and polling CURRENT
+# hot-swaps new versions without a restart.
+MODEL_REGISTRY_DIR = os.getenv("MODEL_REGISTRY_DIR", "")
+MODEL_REGISTRY_POLL_SECONDS = float(os.getenv("MODEL_REGISTRY_POLL_SECONDS", "0"))
+# Required as X-Admin-Token on /api/models/* (unset: localhost only)
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+# Startup: load in a background thread so /livez answers immediately, then
+# run warmup passes at the batch sizes we serve before reporting ready
+MODEL_BACKGROUND_LOAD = os.getenv("MODEL_BACKGROUND_LOAD", "true").lower() == "true"
+# serve.py turns this off and starts loading in each worker after fork
+MODEL_AUTOLOAD = os.getenv("MODEL_AUTOLOAD", "true").lower() == "true"
+WARMUP_RUNS = int(os.getenv("WARMUP_RUNS", "2"))
 
 
 # -------------------------------------------------
@@ -60,6 +95,471 @@ CLASS_LABELS = [
 
 IMG_SIZE = (224, 224)
 
+# Micro-batching: trade a few ms of latency for fewer, larger forward passes
+BATCH_ENABLED = os.getenv("BATCH_ENABLED", "true").lower() == "true"
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", "16"))
+BATCH_MAX_WAIT_MS = float(os.getenv("BATCH_MAX_WAIT_MS", "5"))
+BATCH_BYPASS_SINGLE = os.getenv("BATCH_BYPASS_SINGLE", "true").lower() == "true"
+
+# Bulk endpoint: images per forward pass, decode threads and request cap
+BULK_CHUNK_SIZE = int(os.getenv("BULK_CHUNK_SIZE", "16"))
+BULK_DECODE_WORKERS = int(os.getenv("BULK_DECODE_WORKERS", "4"))
+BULK_MAX_IMAGES = int(os.getenv("BULK_MAX_IMAGES", "500"))
+
+# Upload limits, enforced from Content-Length before the body is read
+MAX_UPLOAD_BYTES = int(float(os.getenv("MAX_UPLOAD_MB", "16")) * 1024 * 1024)
+BULK_MAX_UPLOAD_BYTES = int(float(os.getenv("BULK_MAX_UPLOAD_MB", "256")) * 1024 * 1024)
+# Zip uploads to the bulk endpoint: entries per archive and total uncompressed
+# image bytes per request (each member is also held to MAX_UPLOAD_BYTES)
+BULK_MAX_ARCHIVE_ENTRIES = int(os.getenv("BULK_MAX_ARCHIVE_ENTRIES", "2000"))
+BULK_MAX_UNCOMPRESSED_BYTES = int(float(os.getenv("BULK_MAX_UNCOMPRESSED_MB", "1024")) * 1024 * 1024)
+# Hard ceiling for every request, including chunked bodies without a length;
+# only the bulk endpoint raises it (per request) to BULK_MAX_UPLOAD_BYTES
+app.config["MAX_CONTENT_LENGTH"] = MAX_UPLOAD_BYTES
+
+# Bodies sent as-is (no multipart / base64 wrapping) to /api/predict
+RAW_IMAGE_MIMETYPES = ("application/octet-stream",)
+
+# Admission control: cap on requests admitted at once (beyond it → 503 +
+# Retry-After) and per-request deadlines, from the header or the default
+ADMISSION_MAX_PENDING = int(os.getenv("ADMISSION_MAX_PENDING", "64"))
+ADMISSION_RETRY_AFTER = int(os.getenv("ADMISSION_RETRY_AFTER", "1"))
+REQUEST_DEADLINE_MS = float(os.getenv("REQUEST_DEADLINE_MS", "0"))
+REQUEST_DEADLINE_MAX_MS = float(os.getenv("REQUEST_DEADLINE_MAX_MS", "60000"))
+DEADLINE_HEADER = "X-Request-Deadline-Ms"
+
+# Prediction cache (CACHE_DIR enables the shared on-disk tier)
+CACHE_ENABLED = os.getenv("CACHE_ENABLED", "true").lower() == "true"
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "2048"))
+CACHE_TTL_SECONDS = float(os.getenv("CACHE_TTL_SECONDS", "3600"))
+CACHE_DIR = os.getenv("CACHE_DIR", "")
+# Disk tier bounds: entry cap, enforced by a background prune every N seconds
+CACHE_DISK_MAX_ENTRIES = int(os.getenv("CACHE_DISK_MAX_ENTRIES", "50000"))
+CACHE_PRUNE_INTERVAL_SECONDS = float(os.getenv("CACHE_PRUNE_INTERVAL_SECONDS", "300"))
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".gif", ".webp")
+
+WARMUP_BATCH_SIZES = sorted({
+    int(b) for b in os.getenv("WARMUP_BATCH_SIZES", f"1,{BATCH_MAX_SIZE},{BULK_CHUNK_SIZE}").split(",") if b.strip()
+})
+
+# Test-time augmentation (per request: /api/predict?tta=true): below this
+# top-class probability the plain answer is averaged with TTA_VIEWS views
+TTA_DEFAULT = os.getenv("TTA_DEFAULT", "false").lower() == "true"
+TTA_VIEW_COUNT = max(1, min(int(os.getenv("TTA_VIEWS", "4")), len(TTA_VIEWS)))
+TTA_CONFIDENCE = float(os.getenv("TTA_CONFIDENCE", "0.9"))
+
+# Similar-case retrieval: a keras model with a `<model>.similarity/` index
+# beside it (model_trainer.py --mode similarity) also outputs its pooled
+# features, and reports list the closest training images
+SIMILARITY_ENABLED = os.getenv("SIMILARITY_ENABLED", "true").lower() == "true"
+SIMILARITY_TOP_K = int(os.getenv("SIMILARITY_TOP_K", "3"))
+SIMILARITY_NPROBE = int(os.getenv("SIMILARITY_NPROBE", "8"))
+
+# Sampling profiler: profile this fraction of requests, keep the slow ones
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_SLOW_MS = float(os.getenv("PROFILE_SLOW_MS", "500"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(BASE_DIR, "profiles"))
+
+
+# -------------------------------------------------
+# METRICS
+# -------------------------------------------------
+metrics = Registry()
+
+HTTP_REQUESTS = metrics.counter(
+    "ml_http_requests_total", "HTTP requests by endpoint and status code", ["endpoint", "method", "status"]
+)
+HTTP_IN_FLIGHT = metrics.gauge("ml_http_requests_in_flight", "Requests currently being served", ["endpoint"])
+HTTP_SECONDS = metrics.histogram("ml_http_request_duration_seconds", "End-to-end request latency", ["endpoint"])
+STAGE_SECONDS = metrics.histogram(
+    "ml_predict_stage_seconds", "Time spent in each stage of a prediction request", ["endpoint", "stage"]
+)
+INFERENCE_SECONDS = metrics.histogram("ml_inference_seconds", "Forward pass latency per batch", ["version"])
+BATCH_SIZE = metrics.histogram(
+    "ml_inference_batch_size", "Images per forward pass", ["version"], buckets=(1, 2, 4, 8, 16, 32, 64, 128)
+)
+PREDICTIONS = metrics.counter("ml_predictions_total", "Images predicted by model version and route", ["version", "role"])
+SHADOW_RESULTS = metrics.counter(
+    "ml_shadow_predictions_total", "Shadow predictions by agreement with the served answer", ["version", "result"]
+)
+MODEL_LOAD_SECONDS = metrics.gauge("ml_model_load_seconds", "Time to load the model at startup")
+MODEL_WARMUP_SECONDS = metrics.gauge("ml_model_warmup_seconds", "Time spent in warmup passes at startup")
+MODEL_READY = metrics.gauge("ml_model_ready", "1 once the model is loaded and warm")
+CACHE_STATS = metrics.gauge("ml_prediction_cache", "Prediction cache counters and size", ["stat"])
+REQUESTS_SHED = metrics.counter("ml_requests_shed_total", "Requests rejected by admission control", ["endpoint", "reason"])
+TTA_REQUESTS = metrics.counter(
+    "ml_tta_predictions_total", "TTA predictions by outcome (early_exit, augmented, cached)", ["outcome"]
+)
+ADMISSION_STATS = metrics.gauge("ml_admission", "Admission queue depth, capacity and totals", ["stat"])
+
+profiler = SlowRequestProfiler(PROFILE_SAMPLE_RATE, PROFILE_SLOW_MS, PROFILE_DIR)
+
+
+# -------------------------------------------------
+# INFERENCE SCHEDULER
+# -------------------------------------------------
+def instrumented(backend, version):
+    """Forward pass over a stacked (N, 224, 224, 3) batch, with metrics."""
+    def run_model(batch):
+        start = time.perf_counter()
+        outputs = backend.predict(batch)
+        INFERENCE_SECONDS.observe(time.perf_counter() - start, version=version)
+        BATCH_SIZE.observe(len(batch), version=version)
+        return outputs
+    return run_model
+
+
+# Live model versions: primary plus optional canary / shadow
+router = ModelRouter()
+registry = ModelRegistry(MODEL_REGISTRY_DIR) if MODEL_REGISTRY_DIR else None
+
+model_state = {
+    "status": "starting",  # starting → loading → warming_up → ready | failed
+    "error": None,
+    "load_seconds": None,
+    "warmup_seconds": None,
+    "time_to_ready_seconds": None,
+}
+model_ready = threading.Event()
+# Background deploys of new versions (registry poll or /api/models/deploy)
+deploy_state = {"status": "idle", "version": None, "mode": None, "error": None}
+# Extra backend arguments, e.g. a model_content buffer shared by serve.py
+BACKEND_OPTIONS = {}
+_load_lock = threading.Lock()
+_load_thread = None
+_deploy_lock = threading.Lock()
+
+
+def warmup(backend):
+    """Trace/allocate for every batch size we serve before taking traffic."""
+    largest = max(WARMUP_BATCH_SIZES + [BATCH_MAX_SIZE, BULK_CHUNK_SIZE])
+    # Compiled keras: one trace per padded bucket a served batch can land in
+    buckets = sorted(getattr(backend, "buckets", ()))
+    buckets = [b for b in buckets if b < largest] + [b for b in buckets if b >= largest][:1]
+    sizes = sorted(set(WARMUP_BATCH_SIZES) | set(buckets))
+    for batch_size in sizes:
+        dummy = np.zeros((batch_size, IMG_SIZE[1], IMG_SIZE[0], 3), dtype=np.float32)
+        for _ in range(WARMUP_RUNS):
+            backend.predict(dummy)
+    return sizes
+
+
+def resolve_model(version=None):
+    """(version name, artifact path, backend name) to load."""
+    if registry is not None and registry.versions():
+        name = registry.resolve(version)
+        path = str(registry.artifact(name))
+        return name, path, "tflite" if path.endswith(".tflite") else "keras"
+    if version not in (None, "", "current", "latest", "default"):
+        raise KeyError(f"Unknown model version '{version}' (no registry configured)")
+    return "default", ACTIVE_MODEL_PATH, INFERENCE_BACKEND
+
+
+def open_similarity(name, path, backend_name):
+    """The similar-case index built for this artifact, if there is a usable one."""
+    if not SIMILARITY_ENABLED:
+        return None
+    try:
+        similarity = SimilarityIndex.open(index_dir(path))
+    except (OSError, ValueError) as e:
+        logger.warning(f"Similarity index for model {name} not loaded: {e}")
+        return None
+    if similarity is not None and backend_name != "keras":
+        logger.warning(f"Similarity index for model {name} needs the keras backend, not {backend_name}; skipped")
+        return None
+    return similarity
+
+
+def training_metrics(path):
+    """metrics.json saved next to a model artifact by the trainer (and the registry), or {}."""
+    try:
+        with open(os.path.join(os.path.dirname(path), "metrics.json"), "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def load_version(name, path, backend_name, state=None):
+    """Load + warm one model version and give it its own batcher."""
+    state = state if state is not None else {}
+    logger.info(f"🔍 Loading model {name} from: {path} ({backend_name} backend)")
+    state["status"] = "loading"
+    started = time.monotonic()
+    # A buffer in BACKEND_OPTIONS (serve.py) holds the startup artifact only
+    options = BACKEND_OPTIONS if path == ACTIVE_MODEL_PATH else {}
+    similarity = open_similarity(name, path, backend_name)
+    # Heavy ML imports (keras / tensorflow) happen here, not at import time
+    backend = load_backend(
+        backend_name, path,
+        num_threads=INFERENCE_THREADS, inter_op_threads=INTER_OP_THREADS,
+        compiled=INFERENCE_COMPILED, buckets=INFERENCE_BATCH_BUCKETS,
+        embeddings=similarity is not None, **options
+    )
+    state["load_seconds"] = round(time.monotonic() - started, 3)
+    logger.info(f"✅ Model {name} loaded successfully ({backend_name}) in {state['load_seconds']}s")
+    if similarity is not None and not similarity.matches(backend.model):
+        # Embeddings from other weights would give meaningless neighbours
+        logger.warning(f"Similarity index for model {name} was built from other weights; rebuild it")
+        similarity = None
+    elif similarity is not None:
+        logger.info(f"🔎 Similarity index for model {name}: {len(similarity)} images ({similarity.meta['dtype']})")
+
+    state["status"] = "warming_up"
+    warm_started = time.monotonic()
+    state["warmed_batch_sizes"] = warmup(backend) if WARMUP_RUNS > 0 else []
+    state["warmup_seconds"] = round(time.monotonic() - warm_started, 3)
+
+    run = instrumented(backend, name)
+    batcher = None
+    if BATCH_ENABLED:
+        batcher = MicroBatcher(
+            run,
+            max_batch_size=BATCH_MAX_SIZE,
+            max_wait_ms=BATCH_MAX_WAIT_MS,
+            bypass_single=BATCH_BYPASS_SINGLE,
+        )
+    return ModelVersion(name, path, backend, run=run, batcher=batcher, similarity=similarity,
+                        metrics=training_metrics(path))
+
+
+def _load_model():
+    try:
+        name, path, backend_name = resolve_model()
+        version = load_version(name, path, backend_name, state=model_state)
+    except Exception as e:
+        logger.error(f"❌ Model loading failed: {e}")
+        model_state["status"] = "failed"
+        model_state["error"] = str(e)
+        return
+
+    if BATCH_ENABLED:
+        logger.info(f"⚡ Micro-batching enabled (max_batch={BATCH_MAX_SIZE}, max_wait={BATCH_MAX_WAIT_MS}ms)")
+
+    activate(version)
+    model_state["status"] = "ready"
+    MODEL_LOAD_SECONDS.set(model_state["load_seconds"])
+    MODEL_WARMUP_SECONDS.set(model_state["warmup_seconds"])
+    MODEL_READY.set(1)
+    model_state["time_to_ready_seconds"] = round(time.monotonic() - STARTED_AT, 3)
+    model_ready.set()
+    logger.info(
+        f"🚀 Ready in {model_state['time_to_ready_seconds']}s "
+        f"(load {model_state['load_seconds']}s, warmup {model_state['warmup_seconds']}s "
+        f"at batch sizes {model_state['warmed_batch_sizes']})"
+    )
+
+    if registry is not None and MODEL_REGISTRY_POLL_SECONDS > 0:
+        threading.Thread(target=_watch_registry, name="registry-watcher", daemon=True).start()
+
+
+def start_model_loading(background=True):
+    """Kick off model loading once; blocks until done if not background."""
+    global _load_thread
+    with _load_lock:
+        if _load_thread is not None:
+            return _load_thread
+        _load_thread = threading.Thread(target=_load_model, name="model-loader", daemon=True)
+        _load_thread.start()
+    if not background:
+        _load_thread.join()
+    return _load_thread
+
+
+def wait_until_ready(timeout=None):
+    """Block until the model is warm; False on timeout or failed load."""
+    start_model_loading()
+    return model_ready.wait(timeout)
+
+
+# -------------------------------------------------
+# HOT SWAP / CANARY / SHADOW
+# -------------------------------------------------
+def activate(version):
+    """Atomically make `version` primary; the previous one drains, then unloads."""
+    return swapped(router.swap(version), version)
+
+
+def swapped(old, version):
+    """After `version` replaced `old` as primary: repoint the cache, log it."""
+    if cache is not None and (old is not None or cache.model_path != version.path):
+        cache.use_model(version.path)
+    if old is not None:
+        logger.info(f"🔁 Swapped model {old.name} → {version.name}")
+    return old
+
+
+def deploy(version=None, mode="swap", percent=100.0, make_current=False):
+    """
+    Load and warm a version, then route to it. Runs in the calling thread;
+    returns False if another deploy is already in progress.
+
+    mode: swap (replace primary), canary (serve `percent` of traffic) or
+    shadow (mirror `percent` of traffic, responses discarded).
+    """
+    if not _deploy_lock.acquire(blocking=False):
+        return False
+    try:
+        deploy_state.update({"status": "loading", "version": version, "mode": mode, "error": None})
+        name, path, backend_name = resolve_model(version)
+        deploy_state["version"] = name
+        loaded = load_version(name, path, backend_name)
+
+        if mode == "canary":
+            router.set_canary(loaded, percent)
+        elif mode == "shadow":
+            router.set_shadow(loaded, percent)
+        else:
+            activate(loaded)
+            if make_current and registry is not None:
+                registry.set_current(name)
+        deploy_state["status"] = "done"
+        logger.info(f"🚢 Deployed model {name} as {mode}" + (f" ({percent}%)" if mode != "swap" else ""))
+        return True
+    except Exception as e:
+        logger.error(f"❌ Deploy of model {version} failed: {e}")
+        deploy_state.update({"status": "failed", "error": str(e)})
+        return True
+    finally:
+        _deploy_lock.release()
+
+
+def _watch_registry():
+    """Swap to the registry's CURRENT version whenever it changes."""
+    seen = registry.current()
+    while True:
+        time.sleep(MODEL_REGISTRY_POLL_SECONDS)
+        try:
+            current = registry.current()
+            if current == seen:
+                continue
+            primary = router.primary
+            if current and (primary is None or current != primary.name):
+                logger.info(f"📦 Registry CURRENT is now {current}, hot-swapping")
+                if not deploy(current, mode="swap"):
+                    continue  # another deploy is running; retry next poll
+            seen = current
+        except Exception as e:
+            logger.warning(f"Registry watch failed: {e}")
+
+
+# Shadow inference runs off the response path; past this backlog it's skipped
+SHADOW_MAX_PENDING = 32
+_shadow_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="shadow")
+_shadow_slots = threading.BoundedSemaphore(SHADOW_MAX_PENDING)
+
+
+def _run_shadow(version, arr, served):
+    try:
+        preds = split_outputs(version.run(np.expand_dims(arr, axis=0)))[0][0]
+        result = "match" if int(np.argmax(preds)) == int(np.argmax(served)) else "mismatch"
+        SHADOW_RESULTS.inc(version=version.name, result=result)
+    except Exception as e:
+        logger.warning(f"Shadow prediction on {version.name} failed: {e}")
+        SHADOW_RESULTS.inc(version=version.name, result="error")
+    finally:
+        version.release()
+        _shadow_slots.release()
+
+
+cache = None
+if CACHE_ENABLED:
+    cache = PredictionCache(
+        max_entries=CACHE_MAX_ENTRIES,
+        ttl_seconds=CACHE_TTL_SECONDS,
+        disk_dir=CACHE_DIR or None,
+        model_path=ACTIVE_MODEL_PATH,
+        disk_max_entries=CACHE_DISK_MAX_ENTRIES,
+        prune_interval=CACHE_PRUNE_INTERVAL_SECONDS,
+    )
+
+
+admission = AdmissionController(
+    max_pending=ADMISSION_MAX_PENDING,
+    default_deadline_ms=REQUEST_DEADLINE_MS,
+    max_deadline_ms=REQUEST_DEADLINE_MAX_MS,
+    retry_after=ADMISSION_RETRY_AFTER,
+)
+
+
+class ModelUnavailable(Exception):
+    pass
+
+
+class InvalidImage(ValueError):
+    """Upload that isn't a decodable image (answered with a 400)."""
+
+
+def split_outputs(outputs):
+    """
+    (class probabilities, embeddings or None) from a model output, for one
+    image or a batch: versions with a similarity index return both.
+    """
+    if isinstance(outputs, (list, tuple)):
+        return outputs[0], outputs[1]
+    return outputs, None
+
+
+def _forward(version, arr, deadline=None):
+    """One image through `version`'s micro-batcher (or straight to the model)."""
+    if version.batcher is not None:
+        return version.batcher.submit(arr, deadline=deadline)
+    check_deadline(deadline)
+    return version.run(np.expand_dims(arr, axis=0))[0]
+
+
+def predict_one(arr, deadline=None):
+    """
+    Model outputs (see split_outputs) for one preprocessed (224, 224, 3)
+    image, plus the (ModelVersion, role) that produced them.
+    """
+    version, role = router.acquire()
+    if version is None:
+        raise ModelUnavailable("Model not ready")
+    try:
+        preds = _forward(version, arr, deadline)
+    finally:
+        version.release()
+    PREDICTIONS.inc(version=version.name, role=role)
+
+    if router.shadow is not None and _shadow_slots.acquire(blocking=False):
+        shadow = router.acquire_shadow()
+        if shadow is None:
+            _shadow_slots.release()
+        else:
+            # arr is a per-thread scratch buffer, so the shadow gets its own copy
+            _shadow_pool.submit(_run_shadow, shadow, arr.copy(), split_outputs(preds)[0])
+    return preds, version, role
+
+
+def predict_tta(arr, pixels, deadline=None):
+    """
+    predict_one with test-time augmentation: if the plain prediction's top
+    probability is below TTA_CONFIDENCE, the other TTA_VIEW_COUNT - 1
+    views of `pixels` go through the same model version as one batch and
+    the softmax outputs of all views are averaged (the embedding, if any,
+    stays the plain view's). Returns (outputs, version, role, views used).
+    Not mirrored to the shadow.
+    """
+    version, role = router.acquire()
+    if version is None:
+        raise ModelUnavailable("Model not ready")
+    try:
+        outputs = _forward(version, arr, deadline)
+        preds, embedding = split_outputs(outputs)
+        views = 1
+        if TTA_VIEW_COUNT > 1 and float(np.max(preds)) < TTA_CONFIDENCE:
+            check_deadline(deadline)
+            extra = split_outputs(version.run(preprocessor.tta_batch(pixels, TTA_VIEW_COUNT, start=1)))[0]
+            views = TTA_VIEW_COUNT
+            preds = (np.asarray(preds, dtype=np.float32) + np.sum(extra, axis=0)) / views
+            outputs = preds if embedding is None else (preds, embedding)
+    finally:
+        version.release()
+    PREDICTIONS.inc(views, version=version.name, role=role)
+    TTA_REQUESTS.inc(outcome="augmented" if views > 1 else "early_exit")
+    return outputs, version, role, views
+
 
 # -------------------------------------------------
 # HEALTH SCORE LOGIC (FIXED)
@@ -129,52 +629,687 @@ def build_report(pred):
     }
 
 
+def format_prediction(preds, similar=None):
+    """Full API response for one row of class probabilities."""
+    report = build_report(preds)
+    if similar is not None:
+        report["similar_cases"] = similar
+
+    report["predicted_class"] = CLASS_LABELS[int(np.argmax(preds))]
+    report["confidence"] = float(max(preds) * 100)
+
+    # raw probabilities
+    report["probabilities"] = {
+        CLASS_LABELS[i]: float(preds[i]) for i in range(len(CLASS_LABELS))
+    }
+    return report
+
+
+# -------------------------------------------------
+# IMAGE DECODING
+# -------------------------------------------------
+# JPEG draft decode + ResNet preprocessing into reusable buffers
+preprocessor = ImagePreprocessor(IMG_SIZE, draft=os.getenv("JPEG_DRAFT_DECODE", "true").lower() == "true")
+
+
+def collect_bulk_images(files):
+    """
+    Flatten uploaded files into (filename, opener) pairs plus the spool
+    files backing them.
+
+    Flask closes request.files when the view returns, so each upload is
+    copied into a spool file the stream owns (memory for small uploads,
+    disk for large archives). Zip archives are expanded into their image
+    members; members are only read when the opener is called, so decoding
+    threads pull them lazily.
+
+    Archives are checked against their central directory before anything
+    is inflated: entry count, each member's uncompressed size and the
+    request's total (RequestEntityTooLarge past a limit). zipfile never
+    inflates a member past its declared size, so the checks hold for
+    archives that lie about it.
+    """
+    items, spools = [], []
+    uncompressed = 0
+    try:
+        for f in files:
+            spool = tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024)
+            spools.append(spool)
+            shutil.copyfileobj(f.stream, spool)
+            spool.seek(0)
+
+            if (f.filename or "").lower().endswith(".zip") or f.mimetype in ("application/zip", "application/x-zip-compressed"):
+                archive = zipfile.ZipFile(spool)
+                members = archive.infolist()
+                if len(members) > BULK_MAX_ARCHIVE_ENTRIES:
+                    raise RequestEntityTooLarge(
+                        f"Archive {f.filename} has {len(members)} entries (limit {BULK_MAX_ARCHIVE_ENTRIES})"
+                    )
+                for info in members:
+                    name = info.filename
+                    if info.is_dir() or name.startswith("__MACOSX/") or not name.lower().endswith(IMAGE_EXTENSIONS):
+                        continue
+                    if info.file_size > MAX_UPLOAD_BYTES:
+                        raise RequestEntityTooLarge(
+                            f"{name} is {info.file_size} bytes uncompressed (limit {MAX_UPLOAD_BYTES})"
+                        )
+                    uncompressed += info.file_size
+                    if uncompressed > BULK_MAX_UNCOMPRESSED_BYTES:
+                        raise RequestEntityTooLarge(
+                            f"Archives expand past the {BULK_MAX_UNCOMPRESSED_BYTES} byte limit"
+                        )
+                    items.append((name, lambda a=archive, i=info: BytesIO(a.read(i))))
+            else:
+                items.append((f.filename, lambda s=spool: s))
+    except Exception:
+        close_spools(spools)
+        raise
+    return items, spools
+
+
+def close_spools(spools):
+    for spool in spools:
+        spool.close()
+
+
+def _decode_into(item, out):
+    """Decode one bulk item into its slot of the batch buffer."""
+    name, opener = item
+    try:
+        preprocessor.load(opener(), out=out)
+        return None
+    except Exception as e:
+        logger.warning(f"Failed to decode {name}: {e}")
+        return str(e)
+
+
+class BulkResources:
+    """
+    What one bulk request holds until its stream is done: the admission
+    ticket, the model version and the upload spools.
+
+    close() is idempotent. The stream's own `finally` calls it, and so does
+    response.call_on_close, because a client that disconnects before the
+    first chunk closes a generator that never started, so its `finally`
+    never runs.
+    """
+
+    def __init__(self, ticket):
+        self.ticket = ticket
+        self.version = None
+        self.spools = []
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        if self.version is not None:
+            self.version.release()
+        close_spools(self.spools)
+        self.ticket.release()
+
+
+def stream_bulk_predictions(items, resources):
+    """Yield one NDJSON line per image, one inference chunk at a time."""
+    try:
+        # The whole stream runs on one model version, even across a swap
+        yield from _predict_chunks(items, resources.version, resources.ticket.deadline)
+    finally:
+        resources.close()
+
+
+def _predict_chunks(items, version, deadline=None):
+    chunks = [items[i:i + BULK_CHUNK_SIZE] for i in range(0, len(items), BULK_CHUNK_SIZE)]
+    if not chunks:
+        return
+
+    # Two batch buffers: the next chunk decodes into one while the other
+    # is on the model, so memory stays at 2 x BULK_CHUNK_SIZE images.
+    buffers = [np.empty((BULK_CHUNK_SIZE,) + preprocessor.shape, dtype=np.float32) for _ in range(2)]
+
+    def start(idx):
+        buf = buffers[idx % 2]
+        return pool.map(_decode_into, chunks[idx], buf[:len(chunks[idx])])
+
+    timer = StageTimer(STAGE_SECONDS, endpoint="predict_batch")
+    with ThreadPoolExecutor(max_workers=BULK_DECODE_WORKERS) as pool:
+        pending = start(0)
+        for idx, chunk in enumerate(chunks):
+            # Only the time spent blocked on decoding: the rest overlaps the model
+            with timer.stage("decode"):
+                errors = list(pending)
+            # Past the deadline: the rest of the images get an error line
+            # instead of a forward pass (the 200 has already been sent)
+            if deadline is not None and time.monotonic() >= deadline:
+                admission.record_expired()
+                REQUESTS_SHED.inc(endpoint="predict_batch", reason="deadline")
+                remaining = [name for later in chunks[idx:] for name, _ in later]
+                yield "".join(
+                    json.dumps({"filename": name, "error": "Request deadline exceeded"}) + "\n" for name in remaining
+                )
+                return
+
+            if idx + 1 < len(chunks):
+                pending = start(idx + 1)
+
+            buf = buffers[idx % 2]
+            ok = [i for i, error in enumerate(errors) if error is None]
+            if ok:
+                PREDICTIONS.inc(len(ok), version=version.name, role="bulk")
+            if len(ok) == len(chunk):
+                batch = buf[:len(chunk)]
+            else:
+                batch = buf[ok]
+            with timer.stage("model"):
+                preds, embeddings = split_outputs(version.run(batch)) if ok else ([], None)
+            rows = iter(preds)
+
+            similar = None
+            if embeddings is not None and version.similarity is not None:
+                with timer.stage("similar"):
+                    similar = iter(version.similarity.search(embeddings, SIMILARITY_TOP_K, SIMILARITY_NPROBE))
+
+            lines = []
+            for (name, _), error in zip(chunk, errors):
+                if error is not None:
+                    lines.append({"filename": name, "error": error})
+                else:
+                    with timer.stage("build_report"):
+                        report = format_prediction(next(rows), next(similar) if similar is not None else None)
+                        lines.append({"filename": name, **report})
+            with timer.stage("json"):
+                body = "".join(json.dumps(line) + "\n" for line in lines)
+            yield body
+
+
+# -------------------------------------------------
+# REQUEST BODIES
+# -------------------------------------------------
+def check_upload_size(limit):
+    """
+    Reject a declared body larger than `limit` before reading any of it,
+    and cap what Werkzeug will buffer for this request (chunked bodies,
+    form parsing) at `limit` too.
+    """
+    request.max_content_length = limit
+    if request.content_length is not None and request.content_length > limit:
+        raise RequestEntityTooLarge(f"Upload of {request.content_length} bytes exceeds the {limit} byte limit")
+
+
+def read_stream(stream, limit, chunk_size=64 * 1024):
+    """Read a request body, failing as soon as it grows past `limit`."""
+    if request.content_length is not None:
+        return stream.read(request.content_length)
+
+    # Chunked transfer: no length up front, so count as we go
+    buf = bytearray()
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            return bytes(buf)
+        buf += chunk
+        if len(buf) > limit:
+            raise RequestEntityTooLarge(f"Upload exceeds the {limit} byte limit")
+
+
+def decode_base64_image(value):
+    """Image bytes from base64 text, with or without a `data:...;base64,` prefix."""
+    if not isinstance(value, (str, bytes)):
+        raise InvalidImage("image_base64 must be a base64 string")
+    try:
+        view = memoryview(value.encode("ascii") if isinstance(value, str) else value)
+    except UnicodeEncodeError:
+        raise InvalidImage("Invalid base64 image: non-ASCII characters")
+    if view[:5] == b"data:":
+        comma = bytes(view[:256]).find(b",")
+        if comma < 0:
+            raise InvalidImage("Malformed data URL")
+        view = view[comma + 1:]
+    try:
+        # a2b_base64 decodes straight from the buffer; b64decode would copy it first
+        return binascii.a2b_base64(view)
+    except binascii.Error as e:
+        raise InvalidImage(f"Invalid base64 image: {e}")
+
+
+def parse_flag(value, default=False):
+    """Query-string boolean: 1/true/yes/on or 0/false/no/off."""
+    if value is None or value == "":
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def read_image_payload():
+    """
+    Encoded image bytes for /api/predict, or None if the request has none.
+
+    Accepts a raw image body (Content-Type image/* or octet-stream), JSON
+    `{"image_base64": ...}`, a form `image_base64` field or a multipart
+    `image` file. The bytes returned are handed to PIL via BytesIO, which
+    wraps them without copying.
+    """
+    check_upload_size(MAX_UPLOAD_BYTES)
+    mimetype = request.mimetype
+
+    if mimetype.startswith("image/") or mimetype in RAW_IMAGE_MIMETYPES:
+        return read_stream(request.stream, MAX_UPLOAD_BYTES) or None
+
+    if request.is_json:
+        # Read in chunks: a chunked body past the limit is then a 413 instead
+        # of a silently truncated document
+        try:
+            payload = json.loads(read_stream(request.stream, MAX_UPLOAD_BYTES))
+        except ValueError:
+            payload = None
+        value = (payload.get("image_base64") or payload.get("image")) if isinstance(payload, dict) else None
+        return decode_base64_image(value) if value else None
+
+    if "image" in request.files:
+        return request.files["image"].read()
+
+    value = request.form.get("image_base64") or request.form.get("image")
+    return decode_base64_image(value) if value else None
+
+
+@app.errorhandler(RequestEntityTooLarge)
+def request_too_large(e):
+    return jsonify({"error": e.description or "Upload too large"}), 413
+
+
+def shed_response(endpoint, error):
+    """503 + Retry-After for a full queue, 504 for an expired deadline."""
+    if isinstance(error, Overloaded):
+        REQUESTS_SHED.inc(endpoint=endpoint, reason="queue_full")
+        response = jsonify({"error": str(error), "queue_depth": admission.depth})
+        response.status_code = 503
+        response.headers["Retry-After"] = str(error.retry_after)
+        return response
+
+    admission.record_expired()
+    REQUESTS_SHED.inc(endpoint=endpoint, reason="deadline")
+    return jsonify({"error": str(error)}), 504
+
+
+# -------------------------------------------------
+# REQUEST METRICS
 # -------------------------------------------------
-# HEALTH CHECK ENDPOINT
+def _endpoint_label():
+    # Route template, not the raw path, so label cardinality stays bounded
+    return request.url_rule.rule if request.url_rule is not None else "unmatched"
+
+
+@app.before_request
+def _start_request_metrics():
+    g.metrics_started = time.perf_counter()
+    g.metrics_endpoint = _endpoint_label()
+    HTTP_IN_FLIGHT.inc(endpoint=g.metrics_endpoint)
+
+
+@app.after_request
+def _count_request(response):
+    HTTP_REQUESTS.inc(endpoint=_endpoint_label(), method=request.method, status=str(response.status_code))
+    return response
+
+
+@app.teardown_request
+def _finish_request_metrics(exc=None):
+    # Runs after a streamed body has been fully sent
+    started = g.pop("metrics_started", None)
+    if started is not None:
+        endpoint = g.pop("metrics_endpoint")
+        HTTP_IN_FLIGHT.dec(endpoint=endpoint)
+        HTTP_SECONDS.observe(time.perf_counter() - started, endpoint=endpoint)
+
+
+@app.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    """Prometheus text exposition of this process's metrics."""
+    if cache is not None:
+        for stat, value in cache.stats().items():
+            if isinstance(value, (int, float)):
+                CACHE_STATS.set(value, stat=stat)
+    for stat, value in admission.stats().items():
+        ADMISSION_STATS.set(value, stat=stat)
+    return Response(metrics.render(), content_type=Registry.CONTENT_TYPE)
+
+
 # -------------------------------------------------
+# HEALTH CHECK ENDPOINTS
+# -------------------------------------------------
+@app.route("/livez", methods=["GET"])
+def livez():
+    """Liveness: the process is up and serving HTTP."""
+    return jsonify({"status": "alive"})
+
+
+@app.route("/readyz", methods=["GET"])
+def readyz():
+    """Readiness: model loaded and warmed up, OK to route traffic."""
+    body = {"ready": model_ready.is_set(), **model_state}
+    return jsonify(body), (200 if model_ready.is_set() else 503)
+
+
+def process_memory():
+    """Resident (RSS) and proportional (PSS) memory of this process in MB.
+
+    PSS splits shared pages between the processes mapping them, so summing
+    it over pre-forked workers gives their real combined footprint.
+    """
+    mem = {"pid": os.getpid()}
+    try:
+        with open("/proc/self/smaps_rollup", "r") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key in ("Rss", "Pss", "Shared_Clean", "Private_Dirty"):
+                    mem[key.lower() + "_mb"] = round(int(value.split()[0]) / 1024, 1)
+    except OSError:
+        import resource
+        mem["max_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    return mem
+
+
 @app.route("/health", methods=["GET"])
 def health():
     return jsonify({
         "status": "running",
-        "model_loaded": model is not None
+        "process": process_memory(),
+        "model_loaded": router.primary is not None,
+        "model_state": model_state["status"],
+        "backend": INFERENCE_BACKEND,
+        "models": router.state(),
+        "cache": cache.stats() if cache is not None else None,
+        "admission": admission.stats(),
     })
 
 
 # -------------------------------------------------
 # PREDICT ENDPOINT
 # -------------------------------------------------
+def _cache_lookup(key, tta):
+    """
+    Cached (preds, views used) for a raw/pixel key, or None. With `tta`, an
+    averaged answer comes first; a confident plain answer is an early exit.
+    """
+    if tta:
+        preds = cache.get(f"{key}-tta{TTA_VIEW_COUNT}")
+        if preds is not None:
+            return preds, TTA_VIEW_COUNT
+    preds = cache.get(key)
+    if preds is None:
+        return None
+    if tta and float(np.max(split_outputs(preds)[0])) < TTA_CONFIDENCE:
+        return None
+    return preds, 1
+
+
+def predict_bytes(data, timer, deadline=None, tta=False):
+    """
+    (model outputs, ModelVersion, views used) for one encoded image, going
+    through the cache. Cached answers always come from the primary
+    version. With `tta`, see predict_tta.
+    """
+    pixels_buf, arr_buf = preprocessor.scratch()
+    cached_version = router.primary
+
+    raw_key = None
+    if cache is not None:
+        # Same upload bytes (retries, refreshes) → skip decode entirely
+        with timer.stage("cache"):
+            raw_key = cache.raw_key(data)
+            hit = _cache_lookup(raw_key, tta)
+        if hit is not None:
+            if tta:
+                TTA_REQUESTS.inc(outcome="cached")
+            return hit[0], cached_version, hit[1]
+
+    with timer.stage("decode"):
+        try:
+            img = preprocessor.open(BytesIO(data))
+        except UnidentifiedImageError:
+            raise InvalidImage("Not a recognised image format")
+        except (OSError, SyntaxError, ValueError, Image.DecompressionBombError) as e:
+            # Truncated files raise OSError, broken PNGs SyntaxError
+            raise InvalidImage(f"Could not decode image: {e}")
+    with timer.stage("resize"):
+        pixels = preprocessor.resize(img, out=pixels_buf)
+
+    hit = pixel_key = None
+    if cache is not None:
+        # Same picture re-encoded → skip the forward pass
+        with timer.stage("cache"):
+            pixel_key = cache.pixel_key(pixels)
+            hit = _cache_lookup(pixel_key, tta)
+
+    if hit is not None:
+        preds, views = hit
+        cache.put(raw_key if views == 1 else f"{raw_key}-tta{views}", preds)
+        if tta:
+            TTA_REQUESTS.inc(outcome="cached")
+        return preds, cached_version, views
+
+    # Expired while decoding: don't spend a forward pass on it
+    check_deadline(deadline)
+    with timer.stage("preprocess"):
+        arr = preprocessor.preprocess(pixels, out=arr_buf)
+    with timer.stage("model"):
+        if tta:
+            preds, version, role, views = predict_tta(arr, pixels, deadline=deadline)
+        else:
+            (preds, version, role), views = predict_one(arr, deadline=deadline), 1
+
+    # Canary answers stay out of the cache, which holds the primary's.
+    # Early exits are plain answers and are cached as such
+    if cache is not None and role == "primary":
+        suffix = "" if views == 1 else f"-tta{views}"
+        cache.put(pixel_key + suffix, preds)
+        cache.put(raw_key + suffix, preds)
+    return preds, version, views
+
+
 @app.route("/api/predict", methods=["POST"])
 def predict():
     try:
-        if "image" not in request.files:
-            return jsonify({"error": "No image provided"}), 400
-
-        img = Image.open(request.files["image"]).convert("RGB")
-        img = img.resize(IMG_SIZE)
+        if router.primary is None:
+            return jsonify({"error": "Model not ready", "model_state": model_state["status"]}), 503
 
-        arr = np.array(img, dtype=np.float32)
-        arr = preprocess_input(arr)  # ResNet preprocess
-        arr = np.expand_dims(arr, axis=0)
+        # Admit before reading the body, so a rejected request costs nothing
+        ticket = admission.admit(admission.deadline_from(request.headers.get(DEADLINE_HEADER)))
 
-        preds = model.predict(arr)[0]
+        timer = StageTimer(STAGE_SECONDS, endpoint="predict")
+        with ticket, profiler.maybe_profile("predict"):
+            with timer.stage("read"):
+                try:
+                    data = read_image_payload()
+                except ValueError as e:
+                    return jsonify({"error": str(e)}), 400
+            if not data:
+                return jsonify({"error": "No image provided"}), 400
+            # A slow upload can use up the budget: answer 504 before decoding
+            ticket.check()
 
-        report = build_report(preds)
+            tta = parse_flag(request.args.get("tta"), TTA_DEFAULT)
+            outputs, version, views = predict_bytes(data, timer, deadline=ticket.deadline, tta=tta)
+            preds, embedding = split_outputs(outputs)
 
-        report["predicted_class"] = CLASS_LABELS[int(np.argmax(preds))]
-        report["confidence"] = float(max(preds) * 100)
+            similar = None
+            if embedding is not None and version is not None and version.similarity is not None:
+                with timer.stage("similar"):
+                    similar = version.similarity.search(embedding, SIMILARITY_TOP_K, SIMILARITY_NPROBE)
 
-        # raw probabilities
-        report["probabilities"] = {
-            CLASS_LABELS[i]: float(preds[i]) for i in range(len(CLASS_LABELS))
-        }
+            with timer.stage("build_report"):
+                report = format_prediction(preds, similar)
+                report["model_version"] = version.name if version is not None else None
+                metrics = version.metrics if version is not None else {}
+                report["model_accuracy"] = metrics.get("val_accuracy")
+                report["training_accuracy"] = metrics.get("train_accuracy")
+                if tta:
+                    report["tta"] = {"views_used": views, "max_views": TTA_VIEW_COUNT,
+                                     "confidence_threshold": TTA_CONFIDENCE}
+            with timer.stage("json"):
+                response = jsonify(report)
 
-        return jsonify(report)
+        response.headers["Server-Timing"] = ", ".join(
+            f"{stage};dur={seconds * 1000:.2f}" for stage, seconds in timer.stages.items()
+        )
+        return response
 
+    except (Overloaded, DeadlineExceeded) as e:
+        return shed_response("predict", e)
+    except ModelUnavailable as e:
+        return jsonify({"error": str(e), "model_state": model_state["status"]}), 503
+    except InvalidImage as e:
+        return jsonify({"error": str(e)}), 400
+    except RequestEntityTooLarge:
+        raise
     except Exception as e:
         logger.error(f"Prediction Error: {e}")
         return jsonify({"error": str(e)}), 500
 
 
+# -------------------------------------------------
+# BULK PREDICT ENDPOINT (NDJSON STREAM)
+# -------------------------------------------------
+@app.route("/api/predict/batch", methods=["POST"])
+def predict_batch():
+    if router.primary is None:
+        return jsonify({"error": "Model not ready", "model_state": model_state["status"]}), 503
+
+    # One admission slot for the whole request, held until the stream ends.
+    # Only an explicit deadline header applies: REQUEST_DEADLINE_MS is sized
+    # for single images, not for a whole upload
+    budget = request.headers.get(DEADLINE_HEADER)
+    try:
+        resources = BulkResources(admission.admit(admission.deadline_from(budget) if budget else None))
+    except Overloaded as e:
+        return shed_response("predict_batch", e)
+
+    streaming = False
+    try:
+        check_upload_size(BULK_MAX_UPLOAD_BYTES)
+        files = request.files.getlist("images") + request.files.getlist("image")
+        if not files:
+            return jsonify({"error": "No images provided"}), 400
+
+        try:
+            items, resources.spools = collect_bulk_images(files)
+        except zipfile.BadZipFile as e:
+            return jsonify({"error": f"Invalid zip archive: {e}"}), 400
+
+        if not items:
+            return jsonify({"error": "No images provided"}), 400
+        if len(items) > BULK_MAX_IMAGES:
+            return jsonify({"error": f"Too many images ({len(items)} > {BULK_MAX_IMAGES})"}), 413
+        try:
+            resources.ticket.check()
+        except DeadlineExceeded as e:
+            return shed_response("predict_batch", e)
+
+        resources.version, _ = router.acquire()
+        if resources.version is None:
+            return jsonify({"error": "Model not ready", "model_state": model_state["status"]}), 503
+
+        response = Response(
+            stream_with_context(stream_bulk_predictions(items, resources)),
+            mimetype="application/x-ndjson",
+        )
+        response.headers["X-Model-Version"] = resources.version.name
+        response.call_on_close(resources.close)
+        # The stream now owns the resources
+        streaming = True
+        return response
+    finally:
+        if not streaming:
+            resources.close()
+
+
+# -------------------------------------------------
+# MODEL ADMIN
+# -------------------------------------------------
+def admin_allowed():
+    if ADMIN_TOKEN:
+        return request.headers.get("X-Admin-Token") == ADMIN_TOKEN
+    return request.remote_addr in ("127.0.0.1", "::1")
+
+
+@app.route("/api/models", methods=["GET"])
+def list_models():
+    if not admin_allowed():
+        return jsonify({"error": "Forbidden"}), 403
+    return jsonify({
+        "registry": registry.describe() if registry is not None else None,
+        "routing": router.state(),
+        "deploy": deploy_state,
+    })
+
+
+@app.route("/api/models/deploy", methods=["POST"])
+def deploy_model():
+    """
+    Load a registry version in the background and route to it.
+
+    Body: {"version": "v0003", "mode": "swap" | "canary" | "shadow",
+           "percent": 10, "make_current": false}
+    """
+    if not admin_allowed():
+        return jsonify({"error": "Forbidden"}), 403
+    body = request.get_json(silent=True) or {}
+    mode = body.get("mode", "swap")
+    if mode not in ("swap", "canary", "shadow"):
+        return jsonify({"error": f"Unknown mode '{mode}'"}), 400
+    try:
+        percent = float(body.get("percent", 100 if mode == "swap" else 10))
+        name, _, _ = resolve_model(body.get("version"))
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+    except (KeyError, FileNotFoundError) as e:
+        return jsonify({"error": str(e)}), 404
+    if not 0 <= percent <= 100:
+        return jsonify({"error": "percent must be between 0 and 100"}), 400
+    if deploy_state["status"] == "loading":
+        return jsonify({"error": "Another deploy is in progress", "deploy": deploy_state}), 409
+
+    threading.Thread(
+        target=deploy, args=(name, mode, percent, bool(body.get("make_current"))),
+        name="model-deploy", daemon=True,
+    ).start()
+    return jsonify({"status": "deploying", "version": name, "mode": mode, "percent": percent}), 202
+
+
+@app.route("/api/models/promote", methods=["POST"])
+def promote_model():
+    """Make the canary the primary version (and CURRENT in the registry)."""
+    if not admin_allowed():
+        return jsonify({"error": "Forbidden"}), 403
+    try:
+        old, canary = router.promote_canary()
+    except KeyError as e:
+        return jsonify({"error": e.args[0]}), 409
+    swapped(old, canary)
+    if registry is not None and canary.name in registry.versions():
+        registry.set_current(canary.name)
+    return jsonify({"status": "promoted", "routing": router.state()})
+
+
+@app.route("/api/models/abort", methods=["POST"])
+def abort_model():
+    """Stop canary and shadow traffic; their versions drain and unload."""
+    if not admin_allowed():
+        return jsonify({"error": "Forbidden"}), 403
+    router.set_canary(None, 0)
+    router.set_shadow(None, 0)
+    return jsonify({"status": "aborted", "routing": router.state()})
+
+
+# -------------------------------------------------
+# MODEL STARTUP
+# -------------------------------------------------
+if MODEL_AUTOLOAD:
+    start_model_loading(background=MODEL_BACKGROUND_LOAD)
+
+
 # -------------------------------------------------
 # RUN SERVER
 # -------------------------------------------------
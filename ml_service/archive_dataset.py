@@ -0,0 +1,231 @@
+import os
+import json
+import zlib
+import struct
+import zipfile
+import logging
+import argparse
+import threading
+from io import BytesIO
+from pathlib import PurePosixPath, Path
+
+from data_loader import ImageBatchStream, is_image_file, read_image
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+INDEX_VERSION = 2
+
+_LOCAL_HEADER = struct.Struct("<4sHHHHHIIIHH")
+_LOCAL_HEADER_MAGIC = b"PK\x03\x04"
+
+
+class ArchiveDataset:
+    """
+    Class-per-folder image dataset read straight out of a zip archive.
+
+    `index()` scans the central directory once and records, for every
+    image, its class, compression method, sizes, CRC and the byte offset of
+    its data inside the archive; the index is saved next to the zip as
+    `<name>.zip.index.json` and reused while the zip is unchanged. Reading
+    an image is then one seek + read (+ inflate) with no extraction.
+
+    Kaggle archives are often wrapped in one or more single top-level
+    folders (`oral-diseases/oral-diseases/<class>/...`); those prefixes are
+    stripped in the index, the way DatasetHandler used to flatten the
+    extracted tree, without renaming anything.
+    """
+
+    def __init__(self, zip_path, index_path=None):
+        self.zip_path = Path(zip_path)
+        self.index_path = Path(index_path) if index_path else self.zip_path.with_name(self.zip_path.name + ".index.json")
+        self.manifest = None
+        self._local = threading.local()
+
+    # ----------------------------------------------------------------------
+    def _signature(self):
+        st = self.zip_path.stat()
+        return {"size": st.st_size, "mtime": st.st_mtime_ns}
+
+    def _load_index(self):
+        try:
+            with open(self.index_path, "r") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if manifest.get("version") != INDEX_VERSION or manifest.get("archive") != self._signature():
+            logger.info(f"{self.zip_path.name} changed, rebuilding its index")
+            return None
+        return manifest
+
+    def index(self, rebuild=False):
+        """Load the member index, building it on first use. Returns the manifest."""
+        manifest = None if rebuild else self._load_index()
+        if manifest is None:
+            manifest = self._build_index()
+            tmp = self.index_path.with_name(self.index_path.name + ".tmp")
+            with open(tmp, "w") as f:
+                json.dump(manifest, f)
+            os.replace(tmp, self.index_path)
+        self.manifest = manifest
+        return manifest
+
+    def _build_index(self):
+        with zipfile.ZipFile(self.zip_path, "r") as zf, open(self.zip_path, "rb") as raw:
+            members = zf.infolist()
+            infos = [i for i in members if not i.is_dir()]
+            prefix = virtual_root([i.filename for i in infos])
+
+            # Every folder under the root is a class, even an empty one (as in list_class_images)
+            by_class = {}
+            for info in members:
+                parts = PurePosixPath(info.filename).parts[len(prefix):]
+                if len(parts) > 1 or (parts and info.is_dir()):
+                    by_class.setdefault(parts[0], [])
+
+            for info in infos:
+                parts = PurePosixPath(info.filename).parts[len(prefix):]
+                if len(parts) != 2 or not is_image_file(parts[1]):
+                    continue
+                if info.compress_type not in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED):
+                    logger.warning(f"Skipping {info.filename}: unsupported compression {info.compress_type}")
+                    continue
+                if info.flag_bits & 0x1:
+                    logger.warning(f"Skipping {info.filename}: encrypted")
+                    continue
+                by_class[parts[0]].append({
+                    "name": info.filename,
+                    "offset": _data_offset(raw, info),
+                    "compress_type": info.compress_type,
+                    "compress_size": info.compress_size,
+                    "size": info.file_size,
+                    "crc": info.CRC,
+                })
+
+        class_names = sorted(by_class)
+        entries = []
+        for class_name in class_names:
+            members = sorted(by_class[class_name], key=lambda m: PurePosixPath(m["name"]).name)
+            entries.extend({**m, "class": class_name} for m in members)
+            logger.info(f"Found {len(members)} images in {class_name}")
+
+        logger.info(f"Indexed {len(entries)} images in {len(class_names)} classes from {self.zip_path.name}"
+                    + (f" (under {'/'.join(prefix)}/)" if prefix else ""))
+        return {
+            "version": INDEX_VERSION,
+            "archive": self._signature(),
+            "root": "/".join(prefix),
+            "class_names": class_names,
+            "entries": entries,
+        }
+
+    # ----------------------------------------------------------------------
+    @property
+    def class_names(self):
+        return self.manifest["class_names"]
+
+    def samples(self):
+        """(entry index, class_index) pairs in list_class_images order."""
+        if self.manifest is None:
+            self.index()
+        classes = {name: i for i, name in enumerate(self.class_names)}
+        return [(i, classes[e["class"]]) for i, e in enumerate(self.manifest["entries"])]
+
+    def _file(self):
+        # One handle per thread: the tf.data pipeline reads from several
+        f = getattr(self._local, "file", None)
+        if f is None:
+            f = self._local.file = open(self.zip_path, "rb")
+        return f
+
+    def read_bytes(self, key):
+        """Encoded bytes of entry `key`, CRC-checked."""
+        entry = self.manifest["entries"][key]
+        f = self._file()
+        f.seek(entry["offset"])
+        data = f.read(entry["compress_size"])
+        if entry["compress_type"] == zipfile.ZIP_DEFLATED:
+            data = zlib.decompress(data, -15)
+        if zlib.crc32(data) != entry["crc"]:
+            raise zipfile.BadZipFile(f"CRC mismatch in {entry['name']}")
+        return data
+
+    def read(self, key, img_size=(224, 224)):
+        """Decode + resize one image into a uint8 (H, W, 3) array."""
+        return read_image(BytesIO(self.read_bytes(key)), img_size)
+
+    def content_id(self, key):
+        """CRC + size of entry `key`: changes with the member, not with its index."""
+        entry = self.manifest["entries"][key]
+        return f"{entry['crc']:08x}-{entry['size']}"
+
+    def stream(self, batch_size=32, img_size=(224, 224), **kwargs):
+        """ImageBatchStream decoding lazily from the archive."""
+        if self.manifest is None:
+            self.index()
+        return ImageBatchStream(
+            self.samples(), self.class_names, batch_size=batch_size,
+            img_size=img_size, reader=self.read, content_id=self.content_id, **kwargs
+        )
+
+    def counts(self):
+        """{class: image count}"""
+        if self.manifest is None:
+            self.index()
+        counts = {}
+        for entry in self.manifest["entries"]:
+            counts[entry["class"]] = counts.get(entry["class"], 0) + 1
+        return counts
+
+    # Handles are per process; don't carry them across pickling/fork
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state.pop("_local", None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._local = threading.local()
+
+
+# --------------------------------------------------------------------------
+def virtual_root(names):
+    """
+    Leading folders shared by every member while they are the only thing
+    at their level, e.g. ('oral-diseases', 'oral-diseases').
+    """
+    paths = [PurePosixPath(n).parts for n in names]
+    prefix = []
+    while paths:
+        depth = len(prefix)
+        # A file directly at this level means it is the dataset root
+        if any(len(p) <= depth + 1 for p in paths):
+            break
+        heads = {p[depth] for p in paths}
+        if len(heads) != 1:
+            break
+        prefix.append(heads.pop())
+    return tuple(prefix)
+
+
+def _data_offset(raw, info):
+    """Offset of a member's data: its local header's name/extra lengths can differ from the central directory's."""
+    raw.seek(info.header_offset)
+    header = _LOCAL_HEADER.unpack(raw.read(_LOCAL_HEADER.size))
+    if header[0] != _LOCAL_HEADER_MAGIC:
+        raise zipfile.BadZipFile(f"Bad local header for {info.filename}")
+    name_len, extra_len = header[9], header[10]
+    return info.header_offset + _LOCAL_HEADER.size + name_len + extra_len
+
+
+# --------------------------------------------------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Index a class-per-folder dataset zip for direct reading")
+    parser.add_argument("zip_path")
+    parser.add_argument("--rebuild", action="store_true", help="ignore the existing index")
+    args = parser.parse_args()
+
+    dataset = ArchiveDataset(args.zip_path)
+    manifest = dataset.index(rebuild=args.rebuild)
+    print(f"Classes: {manifest['class_names']}")
+    print(f"Images: {len(manifest['entries'])}" + (f" under {manifest['root']}/" if manifest["root"] else ""))
@@ -0,0 +1,162 @@
+import logging
+import queue
+import threading
+import time
+
+import numpy as np
+
+from admission import DeadlineExceeded
+
+logger = logging.getLogger(__name__)
+
+
+class _PendingRequest:
+    """A single caller waiting for its slice of a batched forward pass."""
+
+    __slots__ = ("inputs", "deadline", "event", "result", "error")
+
+    def __init__(self, inputs, deadline=None):
+        self.inputs = inputs
+        self.deadline = deadline
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class MicroBatcher:
+    """
+    Collects concurrent inference requests into one forward pass.
+
+    Each caller submits a single preprocessed image (H, W, C). A background
+    worker waits up to `max_wait_ms` for more requests, stacks up to
+    `max_batch_size` of them and calls `predict_fn` once. Every caller gets
+    back only its own row of the output.
+
+    When a request arrives and nobody else is waiting, it is run straight
+    away instead of sitting out the batching window.
+
+    Requests may carry a deadline (a time.monotonic() value); any whose
+    deadline has passed by the time their batch is formed fail with
+    DeadlineExceeded instead of taking a row in the forward pass.
+    """
+
+    def __init__(self, predict_fn, max_batch_size=16, max_wait_ms=5.0, bypass_single=True):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.bypass_single = bypass_single
+
+        self._queue = queue.Queue()
+        self._waiting = 0
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._worker = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+        self._worker.start()
+
+    # ----------------------------------------------------------------------
+    def submit(self, inputs, timeout=None, deadline=None):
+        """Queue one input and block until its prediction row is ready."""
+        if self._stopped.is_set():
+            raise RuntimeError("Batcher has been stopped")
+
+        pending = _PendingRequest(inputs, deadline)
+        with self._lock:
+            self._waiting += 1
+        try:
+            self._queue.put(pending)
+            if not pending.event.wait(timeout):
+                raise TimeoutError("Timed out waiting for batched prediction")
+        finally:
+            with self._lock:
+                self._waiting -= 1
+
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+
+    # ----------------------------------------------------------------------
+    def stop(self):
+        """Stop the worker thread after the current batch."""
+        self._stopped.set()
+        self._queue.put(None)
+        self._worker.join(timeout=5)
+
+        # Fail anything that was queued after the worker exited
+        while True:
+            try:
+                pending = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if pending is not None:
+                pending.error = RuntimeError("Batcher has been stopped")
+                pending.event.set()
+
+    # ----------------------------------------------------------------------
+    def _collect(self, first):
+        """Gather a batch starting with `first`, honouring the wait window."""
+        batch = [first]
+
+        with self._lock:
+            alone = self._waiting <= 1
+        if self.bypass_single and alone and self._queue.empty():
+            return batch
+
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining <= 0:
+                    item = self._queue.get_nowait()
+                else:
+                    item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                self._queue.put(None)
+                break
+            batch.append(item)
+
+        return batch
+
+    # ----------------------------------------------------------------------
+    def _run(self):
+        while not self._stopped.is_set():
+            first = self._queue.get()
+            if first is None:
+                break
+
+            batch = self._drop_expired(self._collect(first))
+            if not batch:
+                continue
+            try:
+                outputs = self.predict_fn(np.stack([p.inputs for p in batch]))
+                for i, pending in enumerate(batch):
+                    pending.result = _take_row(outputs, i)
+            except Exception as e:
+                logger.error(f"Batched prediction failed: {e}")
+                for pending in batch:
+                    pending.error = e
+            finally:
+                for pending in batch:
+                    pending.event.set()
+
+    # ----------------------------------------------------------------------
+    @staticmethod
+    def _drop_expired(batch):
+        """Fail requests whose deadline passed while they were queued."""
+        now = time.monotonic()
+        live = []
+        for pending in batch:
+            if pending.deadline is not None and now >= pending.deadline:
+                pending.error = DeadlineExceeded("Request deadline exceeded while queued")
+                pending.event.set()
+            else:
+                live.append(pending)
+        return live
+
+
+def _take_row(outputs, i):
+    """Slice row `i` out of a model output (array or tuple/list of arrays)."""
+    if isinstance(outputs, (list, tuple)):
+        return type(outputs)(o[i] for o in outputs)
+    return outputs[i]
@@ -0,0 +1,101 @@
+"""
+Compiled serving call vs `model.predict`.
+
+Checks that CompiledModel returns bit-identical outputs to `model.predict`
+for batch sizes on, between and above the padding buckets (exit code 1 on
+any mismatch), then times both per call to show the overhead saved.
+
+    cd ml_service
+    python benchmarks/bench_compiled.py                    # stand-in model
+    python benchmarks/bench_compiled.py --model models/teeth_disease_model.h5
+"""
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+import numpy as np  # noqa: E402
+
+from microbench import bench  # noqa: E402
+from stand_in import build_stand_in_model  # noqa: E402
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("bench_compiled")
+
+
+def check_equivalence(model, compiled, batch_sizes, seed=0):
+    """Max abs difference per batch size; all zeros means bit-identical."""
+    rng = np.random.default_rng(seed)
+    diffs = {}
+    for n in batch_sizes:
+        # Inputs in the range preprocess_input produces
+        batch = rng.uniform(-124, 152, size=(n,) + compiled.input_shape).astype(np.float32)
+        expected = np.asarray(model.predict(batch, verbose=0))
+        actual = np.asarray(compiled(batch))
+        diffs[n] = {
+            "bit_identical": bool(actual.shape == expected.shape and np.array_equal(actual, expected)),
+            "max_abs_diff": float(np.abs(actual - expected).max()),
+        }
+    return diffs
+
+
+def main():
+    from inference_backends import BATCH_BUCKETS, CompiledModel
+
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--model", help="Keras model to load instead of the random stand-in")
+    parser.add_argument("--batch-sizes", default="1,4,16", help="batch sizes to time")
+    parser.add_argument("--min-time", type=float, default=2.0, help="seconds of timing per case")
+    parser.add_argument("--output", help="write results as JSON")
+    args = parser.parse_args()
+
+    if args.model:
+        from keras.models import load_model
+        model = load_model(args.model, compile=False)
+    else:
+        model = build_stand_in_model()
+
+    compiled = CompiledModel(model, BATCH_BUCKETS)
+    check_sizes = sorted({1, 2, 3, 5, 8, 13, 16, 17, BATCH_BUCKETS[-1], BATCH_BUCKETS[-1] + 3})
+    equivalence = check_equivalence(model, compiled, check_sizes)
+    for n, result in equivalence.items():
+        logger.info(f"batch {n:3d}: bit-identical={result['bit_identical']} max_abs_diff={result['max_abs_diff']}")
+
+    timings = {}
+    rng = np.random.default_rng(1)
+    for n in (int(b) for b in args.batch_sizes.split(",")):
+        batch = rng.uniform(-124, 152, size=(n,) + compiled.input_shape).astype(np.float32)
+        predict = bench(lambda: model.predict(batch, verbose=0), args.min_time)
+        fast = bench(lambda: compiled(batch), args.min_time)
+        timings[n] = {
+            "predict_ms": round(predict["median_us"] / 1000, 3),
+            "compiled_ms": round(fast["median_us"] / 1000, 3),
+            "overhead_saved_ms": round((predict["median_us"] - fast["median_us"]) / 1000, 3),
+            "speedup": round(predict["median_us"] / fast["median_us"], 2),
+        }
+        logger.info(f"batch {n:3d}: model.predict {timings[n]['predict_ms']} ms, "
+                    f"compiled {timings[n]['compiled_ms']} ms (x{timings[n]['speedup']})")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                "model": args.model or "stand_in",
+                "buckets": list(compiled.buckets),
+                "equivalence": equivalence,
+                "timings": timings,
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            }, f, indent=2)
+        logger.info(f"Results saved to {args.output}")
+
+    if not all(r["bit_identical"] for r in equivalence.values()):
+        logger.error("Compiled outputs differ from model.predict")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
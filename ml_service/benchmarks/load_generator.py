@@ -0,0 +1,180 @@
+"""
+Load generator for /api/predict.
+
+Two ways to reach the app:
+  - InProcessClient: Flask test client, no sockets (isolates app cost)
+  - HttpClient: real HTTP over localhost against a threaded werkzeug server
+
+Two ways to drive it:
+  - closed_loop: N clients, each sends its next request when the previous
+    one returns (measures capacity at a given concurrency)
+  - open_loop: Poisson arrivals at a fixed rate regardless of responses;
+    latency is measured from the scheduled send time, so queueing behind a
+    slow server is counted (no coordinated omission)
+"""
+import time
+import threading
+from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+PREDICT_PATH = "/api/predict"
+
+
+class InProcessClient:
+    """Per-thread Flask test clients."""
+
+    name = "inprocess"
+
+    def __init__(self, app):
+        self.app = app
+        self._local = threading.local()
+
+    def predict(self, image):
+        client = getattr(self._local, "client", None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        response = client.post(PREDICT_PATH, data={"image": (BytesIO(image), "image.jpg")})
+        return response.status_code
+
+
+class HttpClient:
+    """Per-thread keep-alive `requests` sessions against `base_url`."""
+
+    name = "http"
+
+    def __init__(self, base_url):
+        self.url = base_url.rstrip("/") + PREDICT_PATH
+        self._local = threading.local()
+
+    def predict(self, image):
+        import requests
+
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        response = session.post(self.url, files={"image": ("image.jpg", image, "image/jpeg")})
+        return response.status_code
+
+
+class LocalServer:
+    """Threaded werkzeug server for `app` on a free localhost port."""
+
+    def __init__(self, app, host="127.0.0.1", port=0):
+        from werkzeug.serving import make_server
+
+        self.server = make_server(host, port, app, threaded=True)
+        self.url = f"http://{host}:{self.server.server_port}"
+        self._thread = threading.Thread(target=self.server.serve_forever, name="bench-server", daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self._thread.join()
+
+
+# --------------------------------------------------------------------------
+def summarize(latencies, errors, elapsed):
+    """Latency percentiles (ms) and throughput for one run."""
+    lat = np.asarray(latencies, dtype=np.float64) * 1000
+    ok = len(lat)
+    result = {
+        "requests": ok + errors,
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "images_per_sec": round(ok / elapsed, 2) if elapsed else 0.0,
+    }
+    if ok:
+        p50, p95, p99 = np.percentile(lat, [50, 95, 99])
+        result.update({
+            "mean_ms": round(float(lat.mean()), 2),
+            "p50_ms": round(float(p50), 2),
+            "p95_ms": round(float(p95), 2),
+            "p99_ms": round(float(p99), 2),
+            "max_ms": round(float(lat.max()), 2),
+        })
+    return result
+
+
+def closed_loop(client, images, concurrency, duration=10.0, max_requests=None, warmup=2):
+    """`concurrency` clients in lock-step for `duration` seconds."""
+    for i in range(warmup):
+        client.predict(images[i % len(images)])
+
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+    started = time.perf_counter()
+    stop_at = started + duration
+    counter = iter(range(max_requests if max_requests else 1 << 62))
+
+    def worker(offset):
+        local, local_errors = [], 0
+        i = offset
+        while time.perf_counter() < stop_at:
+            with lock:
+                if next(counter, None) is None:
+                    break
+            t0 = time.perf_counter()
+            try:
+                status = client.predict(images[i % len(images)])
+            except Exception:
+                status = None
+            if status == 200:
+                local.append(time.perf_counter() - t0)
+            else:
+                local_errors += 1
+            i += concurrency
+        with lock:
+            latencies.extend(local)
+            errors[0] += local_errors
+
+    threads = [threading.Thread(target=worker, args=(c,)) for c in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    return summarize(latencies, errors[0], elapsed)
+
+
+def open_loop(client, images, rate, duration=10.0, max_in_flight=256, seed=0, warmup=2):
+    """Poisson arrivals at `rate` req/s for `duration` seconds."""
+    for i in range(warmup):
+        client.predict(images[i % len(images)])
+
+    rng = np.random.default_rng(seed)
+    arrivals = np.cumsum(rng.exponential(1.0 / rate, size=int(rate * duration * 1.5) + 16))
+    arrivals = arrivals[arrivals < duration]
+
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+
+    def send(i, scheduled):
+        try:
+            status = client.predict(images[i % len(images)])
+        except Exception:
+            status = None
+        done = time.perf_counter()
+        with lock:
+            if status == 200:
+                latencies.append(done - scheduled)
+            else:
+                errors[0] += 1
+
+    with ThreadPoolExecutor(max_workers=max_in_flight) as pool:
+        started = time.perf_counter()
+        for i, offset in enumerate(arrivals):
+            scheduled = started + offset
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(send, i, scheduled)
+    elapsed = time.perf_counter() - started
+
+    result = summarize(latencies, errors[0], elapsed)
+    result["offered_rate"] = rate
+    return result
@@ -0,0 +1,92 @@
+"""
+Microbenchmarks for the CPU work around the model: decode/preprocess,
+report building and similar-case search.
+"""
+import time
+import tempfile
+from io import BytesIO
+
+import numpy as np
+
+
+def bench(fn, min_time=0.5, repeat=5):
+    """
+    Median / min seconds per call of `fn()`.
+
+    Each of `repeat` rounds runs enough calls to last ~min_time / repeat,
+    which keeps timer resolution out of sub-millisecond results.
+    """
+    fn()  # warmup
+    start = time.perf_counter()
+    fn()
+    once = max(time.perf_counter() - start, 1e-7)
+    number = max(1, int(min_time / repeat / once))
+
+    rounds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        rounds.append((time.perf_counter() - start) / number)
+    return {
+        "median_us": round(float(np.median(rounds)) * 1e6, 2),
+        "min_us": round(float(np.min(rounds)) * 1e6, 2),
+        "calls": number * repeat,
+    }
+
+
+def run_microbenchmarks(images_by_size, num_classes=6, min_time=0.5):
+    """
+    Returns {name: timing}. `images_by_size` maps '640x480' to a list of
+    encoded images; the first of each is used.
+    """
+    import app
+    from preprocessing import ImagePreprocessor, reference_preprocess
+
+    results = {}
+    fast = ImagePreprocessor(app.IMG_SIZE, draft=True)
+    full = ImagePreprocessor(app.IMG_SIZE, draft=False)
+
+    for label, images in images_by_size.items():
+        data = images[0]
+        pixels_buf, arr_buf = fast.scratch()
+        pixels = fast.decode(BytesIO(data))
+
+        results[f"decode_draft[{label}]"] = bench(lambda: fast.open(BytesIO(data)), min_time)
+        results[f"decode_full[{label}]"] = bench(lambda: full.open(BytesIO(data)), min_time)
+        img = fast.open(BytesIO(data))
+        results[f"resize[{label}]"] = bench(lambda: fast.resize(img, out=pixels_buf), min_time)
+        results[f"load_fast[{label}]"] = bench(lambda: fast.load(BytesIO(data), out=arr_buf), min_time)
+        results[f"load_reference[{label}]"] = bench(
+            lambda: reference_preprocess(BytesIO(data), app.IMG_SIZE), min_time
+        )
+
+    results["preprocess"] = bench(lambda: fast.preprocess(pixels, out=arr_buf), min_time)
+
+    rng = np.random.default_rng(0)
+    preds = rng.dirichlet(np.ones(num_classes)).astype(np.float32)
+    results["build_report"] = bench(lambda: app.build_report(preds), min_time)
+    results["format_prediction"] = bench(lambda: app.format_prediction(preds), min_time)
+
+    report = app.format_prediction(preds)
+    with app.app.app_context():
+        results["jsonify"] = bench(lambda: app.jsonify(report), min_time)
+
+    results.update(bench_similarity(rng, min_time=min_time))
+    return results
+
+
+def bench_similarity(rng, count=5000, dim=2048, min_time=0.5):
+    """Top-k search on a synthetic index (ResNet50-sized features), exact and with lists."""
+    from similarity_index import SimilarityIndex, write_index
+
+    embeddings = rng.random((count, dim), dtype=np.float32)
+    names = [f"class/{i}.jpg" for i in range(count)]
+    query = rng.random(dim, dtype=np.float32)
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, nlist in (("exact", 0), ("ivf64", 64)):
+            index = SimilarityIndex(write_index(f"{tmp}/{name}", embeddings, names, np.zeros(count), ["class"],
+                                                nlist=nlist))
+            results[f"similarity_{name}[{count}x{dim}]"] = bench(lambda: index.search(query, 3), min_time)
+    return results
@@ -0,0 +1,210 @@
+"""
+Serving benchmark suite.
+
+Runs offline against a small randomly initialised stand-in model (or a real
+artifact with --model) and writes one JSON file per run, so two commits can
+be compared with --compare.
+
+    cd ml_service
+    python benchmarks/run_benchmarks.py                    # full run
+    python benchmarks/run_benchmarks.py --quick            # smoke run
+    python benchmarks/run_benchmarks.py --compare old.json new.json
+"""
+import os
+import sys
+import json
+import time
+import logging
+import platform
+import argparse
+import subprocess
+import tempfile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from stand_in import save_stand_in_model, synthetic_images, parse_size  # noqa: E402
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("benchmarks")
+
+DEFAULT_SIZES = "224x224,640x480,1920x1080"
+DEFAULT_CONCURRENCY = "1,4,16"
+DEFAULT_RATES = "10,50"
+
+
+def _csv(text, cast=str):
+    return [cast(v) for v in text.split(",") if v.strip()]
+
+
+def git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, cwd=BENCH_DIR)
+        dirty = subprocess.run(["git", "status", "--porcelain"], capture_output=True, text=True, cwd=BENCH_DIR)
+        return out.stdout.strip() + ("-dirty" if dirty.stdout.strip() else "")
+    except OSError:
+        return "unknown"
+
+
+def load_app(model_path, backend, cache):
+    """Import app.py without its autoload and serve `model_path` instead."""
+    os.environ["MODEL_AUTOLOAD"] = "false"
+    os.environ["CACHE_ENABLED"] = "true" if cache else "false"
+    os.environ["PROFILE_SAMPLE_RATE"] = "0"
+    import app
+
+    app.INFERENCE_BACKEND = backend
+    app.ACTIVE_MODEL_PATH = model_path
+    app.start_model_loading(background=False)
+    if app.model_state["status"] != "ready":
+        raise RuntimeError(f"Model failed to load: {app.model_state['error']}")
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    return app
+
+
+def run_load(app, images_by_size, args):
+    from load_generator import InProcessClient, HttpClient, LocalServer, closed_loop, open_loop
+
+    results = []
+
+    def drive(client):
+        for size, images in images_by_size.items():
+            if "closed" in args.modes:
+                for concurrency in args.concurrency:
+                    stats = closed_loop(client, images, concurrency, duration=args.duration)
+                    results.append({"target": client.name, "mode": "closed", "image_size": size,
+                                    "concurrency": concurrency, **stats})
+                    logger.info(f"{client.name} closed c={concurrency} {size}: p50 {stats.get('p50_ms')}ms "
+                                f"p99 {stats.get('p99_ms')}ms, {stats['images_per_sec']} img/s")
+            if "open" in args.modes:
+                for rate in args.rates:
+                    stats = open_loop(client, images, rate, duration=args.duration, seed=args.seed)
+                    results.append({"target": client.name, "mode": "open", "image_size": size, **stats})
+                    logger.info(f"{client.name} open {rate}/s {size}: p50 {stats.get('p50_ms')}ms "
+                                f"p99 {stats.get('p99_ms')}ms, {stats['images_per_sec']} img/s")
+
+    if "inprocess" in args.targets:
+        drive(InProcessClient(app.app))
+    if "http" in args.targets:
+        with LocalServer(app.app) as server:
+            drive(HttpClient(server.url))
+    return results
+
+
+# --------------------------------------------------------------------------
+def compare(old_path, new_path):
+    """Print new/old ratios for every metric present in both runs."""
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    print(f"{old['meta']['commit']} -> {new['meta']['commit']}")
+
+    print("\nMicrobenchmarks (median us, lower is better)")
+    for name, stats in new.get("microbenchmarks", {}).items():
+        before = old.get("microbenchmarks", {}).get(name)
+        if before:
+            ratio = stats["median_us"] / before["median_us"]
+            print(f"  {name:32s} {before['median_us']:>10.1f} -> {stats['median_us']:>10.1f}  x{ratio:.2f}")
+
+    def key(r):
+        return (r["target"], r["mode"], r["image_size"], r.get("concurrency"), r.get("offered_rate"))
+
+    before = {key(r): r for r in old.get("load", [])}
+    print("\nLoad (p50 / p99 ms, img/s)")
+    for run in new.get("load", []):
+        prev = before.get(key(run))
+        if not prev or "p50_ms" not in run or "p50_ms" not in prev:
+            continue
+        target, mode, size, conc, rate = key(run)
+        label = f"{target} {mode} {size} " + (f"c={conc}" if conc else f"{rate}/s")
+        print(f"  {label:36s} p50 {prev['p50_ms']:>8.1f} -> {run['p50_ms']:>8.1f}  "
+              f"p99 {prev['p99_ms']:>8.1f} -> {run['p99_ms']:>8.1f}  "
+              f"img/s {prev['images_per_sec']:>7.1f} -> {run['images_per_sec']:>7.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark /api/predict and its hot-path helpers")
+    parser.add_argument("--model", help="serve this artifact instead of the random stand-in")
+    parser.add_argument("--backend", choices=["keras", "tflite"], default="keras")
+    parser.add_argument("--image-sizes", default=DEFAULT_SIZES)
+    parser.add_argument("--concurrency", default=DEFAULT_CONCURRENCY)
+    parser.add_argument("--rates", default=DEFAULT_RATES, help="open-loop request rates (req/s)")
+    parser.add_argument("--modes", default="closed,open")
+    parser.add_argument("--targets", default="inprocess,http")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per load run")
+    parser.add_argument("--images-per-size", type=int, default=16)
+    parser.add_argument("--cache", action="store_true", help="keep the prediction cache on")
+    parser.add_argument("--skip-load", action="store_true")
+    parser.add_argument("--skip-micro", action="store_true")
+    parser.add_argument("--quick", action="store_true", help="short runs at one size for smoke checks")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="result file (default: benchmarks/results/<time>-<commit>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"))
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    if args.quick:
+        args.image_sizes, args.concurrency, args.rates, args.duration = "640x480", "1,4", "20", 2.0
+    args.concurrency = _csv(args.concurrency, int)
+    args.rates = _csv(args.rates, float)
+    args.modes = _csv(args.modes)
+    args.targets = _csv(args.targets)
+    sizes = _csv(args.image_sizes)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        model_path = args.model or save_stand_in_model(tmp, seed=args.seed, tflite=args.backend == "tflite")
+        app = load_app(model_path, args.backend, args.cache)
+
+        images_by_size = {
+            size: synthetic_images(parse_size(size), count=args.images_per_size, seed=args.seed)
+            for size in sizes
+        }
+
+        report = {
+            "meta": {
+                "commit": git_commit(),
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "cpu_count": os.cpu_count(),
+                "model": args.model or "stand_in",
+                "backend": args.backend,
+                "load_seconds": app.model_state["load_seconds"],
+                "config": {
+                    "batch_enabled": app.BATCH_ENABLED,
+                    "batch_max_size": app.BATCH_MAX_SIZE,
+                    "batch_max_wait_ms": app.BATCH_MAX_WAIT_MS,
+                    "cache_enabled": app.cache is not None,
+                    "duration": args.duration,
+                    "images_per_size": args.images_per_size,
+                    "seed": args.seed,
+                },
+            },
+        }
+
+        if not args.skip_micro:
+            from microbench import run_microbenchmarks
+
+            logger.info("Running microbenchmarks...")
+            report["microbenchmarks"] = run_microbenchmarks(images_by_size, num_classes=len(app.CLASS_LABELS))
+            for name, stats in report["microbenchmarks"].items():
+                logger.info(f"{name}: {stats['median_us']} us")
+
+        if not args.skip_load:
+            report["load"] = run_load(app, images_by_size, args)
+
+    output = args.output or os.path.join(
+        BENCH_DIR, "results", f"{time.strftime('%Y%m%d-%H%M%S')}-{report['meta']['commit']}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    logger.info(f"Results saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Offline stand-ins for the benchmark suite: a small randomly initialised
+classifier with the serving model's input/output signature, and seeded
+synthetic photos.
+"""
+import os
+from io import BytesIO
+
+import numpy as np
+from PIL import Image
+
+
+def build_stand_in_model(num_classes=6, img_size=(224, 224), seed=0):
+    """
+    Small CNN with the same (224, 224, 3) -> softmax(num_classes) signature
+    as TeethDiseaseModel. Weights are random but seeded, so runs compare.
+    """
+    import keras
+    from keras import layers
+
+    keras.utils.set_random_seed(seed)
+    inputs = keras.Input(shape=(img_size[1], img_size[0], 3))
+    x = layers.Conv2D(32, 3, strides=2, padding="same", activation="relu")(inputs)
+    x = layers.Conv2D(64, 3, strides=2, padding="same", activation="relu")(x)
+    x = layers.Conv2D(128, 3, strides=2, padding="same", activation="relu")(x)
+    x = layers.Conv2D(256, 3, strides=2, padding="same", activation="relu")(x)
+    x = layers.GlobalAveragePooling2D()(x)
+    x = layers.Dropout(0.3)(x)
+    outputs = layers.Dense(num_classes, activation="softmax")(x)
+    return keras.Model(inputs, outputs, name="stand_in")
+
+
+def save_stand_in_model(out_dir, num_classes=6, img_size=(224, 224), seed=0, tflite=False):
+    """Write the stand-in as .h5 (and optionally fp32 .tflite); returns the path to serve."""
+    os.makedirs(out_dir, exist_ok=True)
+    model = build_stand_in_model(num_classes, img_size, seed)
+    path = os.path.join(out_dir, "stand_in.h5")
+    model.save(path)
+    if not tflite:
+        return path
+
+    from model_export import convert_tflite
+
+    tflite_path = os.path.join(out_dir, "stand_in_fp32.tflite")
+    with open(tflite_path, "wb") as f:
+        f.write(convert_tflite(model))
+    return tflite_path
+
+
+# --------------------------------------------------------------------------
+def synthetic_photo(width, height, seed=0):
+    """Smooth gradients plus mild noise: compresses and decodes like a photo."""
+    rng = np.random.default_rng(seed)
+    yy, xx = np.mgrid[0:height, 0:width].astype(np.float32)
+    fx, fy, fxy = rng.uniform(0.3, 3.0, size=3) / max(width, height) * 2 * np.pi * 8
+    phase = rng.uniform(0, 2 * np.pi, size=3)
+    photo = np.stack([
+        127 + 90 * np.sin(xx * fx + phase[0]),
+        127 + 90 * np.cos(yy * fy + phase[1]),
+        127 + 90 * np.sin((xx + yy) * fxy + phase[2]),
+    ], axis=-1)
+    photo += rng.normal(0, 6, size=photo.shape)
+    return np.clip(photo, 0, 255).astype(np.uint8)
+
+
+def synthetic_images(size, count=8, seed=0, fmt="JPEG", quality=90):
+    """`count` distinct encoded images of `size` (width, height)."""
+    images = []
+    for i in range(count):
+        buf = BytesIO()
+        Image.fromarray(synthetic_photo(size[0], size[1], seed=seed * 1000 + i)).save(buf, fmt, quality=quality)
+        images.append(buf.getvalue())
+    return images
+
+
+def parse_size(text):
+    """'640x480' -> (640, 480)."""
+    w, _, h = text.lower().partition("x")
+    return int(w), int(h or w)
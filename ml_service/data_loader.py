@@ -0,0 +1,159 @@
+import math
+import logging
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+from sklearn.model_selection import train_test_split
+from tensorflow import keras
+
+logger = logging.getLogger(__name__)
+
+# Image files a class folder contributes, matched case-insensitively
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+
+
+def is_image_file(name):
+    return str(name).lower().endswith(IMAGE_EXTENSIONS)
+
+
+def list_class_images(data_dir):
+    """
+    Scan a class-per-folder dataset.
+
+    Returns (class_names, samples) where samples is a list of
+    (image_path, class_index): classes sorted by folder name, files sorted
+    by name inside each (see IMAGE_EXTENSIONS).
+    """
+    data_path = Path(data_dir)
+    class_dirs = sorted(d for d in data_path.iterdir() if d.is_dir())
+    class_names = [d.name for d in class_dirs]
+
+    samples = []
+    for class_idx, class_dir in enumerate(class_dirs):
+        image_files = sorted(p for p in class_dir.iterdir() if is_image_file(p.name) and p.is_file())
+        logger.info(f"Found {len(image_files)} images in {class_dir.name}")
+        samples.extend((path, class_idx) for path in image_files)
+
+    return class_names, samples
+
+
+def file_content_id(key):
+    """Default ImageBatchStream content id: a file's mtime (nothing for other keys)."""
+    return str(key.stat().st_mtime_ns) if isinstance(key, Path) else ""
+
+
+def read_image(path, img_size=(224, 224)):
+    """Decode + resize one image into a uint8 (H, W, 3) array."""
+    img = Image.open(path).convert("RGB")
+    img = img.resize(img_size)
+    return np.asarray(img, dtype=np.uint8)
+
+
+# --------------------------------------------------------------------------
+class ImageBatchStream(keras.utils.Sequence):
+    """
+    Lazily decoded batches of (images, labels) for `model.fit`.
+
+    Only file paths and labels are held in memory; each batch is decoded
+    on demand as uint8 and converted to float32 in [0, 1] right before it
+    is returned, so peak memory depends on `batch_size`, not on the size
+    of the dataset. Files that fail to decode are logged and skipped.
+
+    `reader(key, img_size)` turns a sample key into a uint8 image; by
+    default keys are file paths decoded with `read_image`, but other
+    sources (e.g. memory-mapped shards) can plug in their own.
+
+    `content_id(key)` is a string that changes whenever that sample's
+    content does; caches keyed on the stream (EmbeddingCache) hash it.
+    Sources whose keys are positions rather than files (archive members,
+    shard rows) supply their own.
+    """
+
+    def __init__(self, samples, class_names, batch_size=32, img_size=(224, 224),
+                 shuffle=False, augmenter=None, seed=42, reader=read_image, content_id=file_content_id, **kwargs):
+        super().__init__(**kwargs)
+        self.reader = reader
+        self.content_id = content_id
+        self.samples = list(samples)
+        self.class_names = list(class_names)
+        self.batch_size = batch_size
+        self.img_size = img_size
+        self.shuffle = shuffle
+        self.augmenter = augmenter
+        self._rng = np.random.default_rng(seed)
+        self._order = np.arange(len(self.samples))
+        if self.shuffle:
+            self._rng.shuffle(self._order)
+
+    # ----------------------------------------------------------------------
+    @property
+    def labels(self):
+        return np.array([label for _, label in self.samples])
+
+    @property
+    def num_classes(self):
+        return len(self.class_names)
+
+    def __len__(self):
+        return math.ceil(len(self.samples) / self.batch_size)
+
+    # ----------------------------------------------------------------------
+    def __getitem__(self, idx):
+        indices = self._order[idx * self.batch_size:(idx + 1) * self.batch_size]
+
+        batch = np.empty((len(indices), self.img_size[1], self.img_size[0], 3), dtype=np.uint8)
+        labels = np.empty(len(indices), dtype=np.int64)
+        n = 0
+        for i in indices:
+            path, label = self.samples[i]
+            try:
+                batch[n] = self.reader(path, self.img_size)
+                labels[n] = label
+                n += 1
+            except Exception as e:
+                logger.warning(f"Failed to load {path}: {e}")
+
+        images = batch[:n].astype(np.float32)
+        if self.augmenter is not None and n:
+            if hasattr(self.augmenter, "augment_batch"):
+                images = self.augmenter.augment_batch(images)
+            else:
+                for j in range(n):
+                    images[j] = self.augmenter.random_transform(images[j])
+        images /= 255.0
+
+        return images, labels[:n]
+
+    # ----------------------------------------------------------------------
+    def on_epoch_end(self):
+        if self.shuffle:
+            self._rng.shuffle(self._order)
+
+    # ----------------------------------------------------------------------
+    def subset(self, indices=None, **overrides):
+        """New stream over `indices` (default: all) sharing this one's settings."""
+        if indices is None:
+            indices = range(len(self.samples))
+        params = {
+            "class_names": self.class_names,
+            "batch_size": self.batch_size,
+            "img_size": self.img_size,
+            "shuffle": self.shuffle,
+            "augmenter": self.augmenter,
+            "reader": self.reader,
+            "content_id": self.content_id,
+        }
+        params.update(overrides)
+        return ImageBatchStream([self.samples[i] for i in indices], **params)
+
+    def split(self, validation_split=0.2, random_state=42):
+        """
+        Train/validation split.
+
+        Uses the same `train_test_split` call as the in-memory path, so the
+        partition is identical to splitting the loaded arrays.
+        """
+        indices = np.arange(len(self.samples))
+        train_idx, val_idx = train_test_split(indices, test_size=validation_split, random_state=random_state)
+        return self.subset(train_idx), self.subset(val_idx, shuffle=False, augmenter=None)
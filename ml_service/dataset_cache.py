@@ -0,0 +1,266 @@
+import os
+import json
+import logging
+import argparse
+from pathlib import Path
+
+import numpy as np
+
+from data_loader import ImageBatchStream, read_image
+from dataset_index import DatasetIndex
+from parallel_ingest import ingest_images
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+
+# Images decoded per pass when compiling, bounds memory on first builds
+INGEST_BLOCK = 1024
+
+
+class CompiledDataset:
+    """
+    Decoded training images stored as memory-mapped uint8 shards.
+
+    `compile()` decodes + resizes every image under `data_dir` once and
+    writes them into `shard_XXXXX.npy` files, together with a manifest of
+    each source file's path, mtime, size and SHA-1. Re-running it only
+    decodes files that are new or whose content hash changed;
+    everything else keeps pointing at the shard row it already has.
+
+    `open()` maps the shards read-only, so batches are sliced straight
+    out of the page cache without decoding or copying whole files.
+    """
+
+    def __init__(self, data_dir="./data", cache_dir="./data_cache", img_size=(224, 224)):
+        self.data_dir = Path(data_dir)
+        self.cache_dir = Path(cache_dir)
+        self.img_size = tuple(img_size)
+        self.manifest = None
+        self._shards = {}
+        self._content = None
+
+    # ----------------------------------------------------------------------
+    @property
+    def manifest_path(self):
+        return self.cache_dir / MANIFEST_NAME
+
+    def _load_manifest(self):
+        if not self.manifest_path.exists():
+            return None
+        try:
+            with open(self.manifest_path, "r") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable manifest {self.manifest_path}: {e}")
+            return None
+
+        if manifest.get("version") != MANIFEST_VERSION or tuple(manifest.get("img_size", ())) != self.img_size:
+            logger.info("Manifest format or image size changed, rebuilding dataset cache")
+            return None
+        return manifest
+
+    def _write_manifest(self, manifest):
+        tmp = self.manifest_path.with_suffix(".json.tmp")
+        with open(tmp, "w") as f:
+            json.dump(manifest, f)
+        os.replace(tmp, self.manifest_path)
+
+    # ----------------------------------------------------------------------
+    def compile(self, rebuild=False, workers=0, deep=False):
+        """
+        Create or incrementally refresh the shard cache. Returns the manifest.
+        workers > 0 decodes new files on a process pool.
+
+        Files come from the DatasetIndex next to `data_dir` (paths, mtimes,
+        sizes and SHA-1s), which only rescans class folders whose mtime
+        changed, so an unchanged dataset costs a few stats, not a stat and
+        hash per file. `deep` is passed on to the index's refresh, for
+        files edited in place.
+        """
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        old = None if rebuild else self._load_manifest()
+        old_entries = {e["path"]: e for e in old["entries"]} if old else {}
+
+        index = DatasetIndex(self.data_dir).refresh(deep=deep)
+        class_names = index.class_names()
+
+        entries, todo = [], []
+        for row in index.rows():
+            entry = {key: row[key] for key in ("path", "class", "mtime", "size", "sha1")}
+            prev = old_entries.get(entry["path"])
+            if prev is not None and prev["sha1"] == entry["sha1"]:
+                # Same content (touched or not): keep the decoded pixels
+                entries.append({**prev, **entry})
+                continue
+            entries.append(entry)
+            todo.append((len(entries) - 1, self.data_dir / entry["path"]))
+
+        shards = list(old["shards"]) if old else []
+        next_shard = old.get("next_shard", len(shards)) if old else 0
+        if todo:
+            shards.append(self._write_shard(next_shard, entries, todo, workers))
+            next_shard += 1
+
+        # Drop shards nobody points at any more
+        live = {e["shard"] for e in entries if "shard" in e}
+        for shard in shards:
+            if shard["file"] not in live:
+                (self.cache_dir / shard["file"]).unlink(missing_ok=True)
+        shards = [s for s in shards if s["file"] in live]
+
+        manifest = {
+            "version": MANIFEST_VERSION,
+            "img_size": list(self.img_size),
+            "class_names": class_names,
+            "shards": shards,
+            "next_shard": next_shard,
+            "entries": entries,
+        }
+        self._write_manifest(manifest)
+        self.manifest = manifest
+        self._shards = {}
+
+        logger.info(
+            f"Dataset cache: {len(live_entries(manifest))} images, {len(todo)} decoded, "
+            f"{len(entries) - len(todo)} unchanged"
+        )
+        return manifest
+
+    # ----------------------------------------------------------------------
+    def _write_shard(self, number, entries, todo, workers=0):
+        """Decode `todo` into a new shard and point their entries at it."""
+        name = f"shard_{number:05d}.npy"
+        shape = (len(todo), self.img_size[1], self.img_size[0], 3)
+        shard = np.lib.format.open_memmap(self.cache_dir / name, mode="w+", dtype=np.uint8, shape=shape)
+
+        row = 0
+        for block in range(0, len(todo), INGEST_BLOCK):
+            part = todo[block:block + INGEST_BLOCK]
+            decoded = self._decode_block([path for _, path in part], workers)
+            for (entry_idx, path), pixels in zip(part, decoded):
+                if pixels is None:
+                    entries[entry_idx]["failed"] = True  # not retried until the file changes
+                    continue
+                shard[row] = pixels
+                entries[entry_idx]["shard"] = name
+                entries[entry_idx]["offset"] = row
+                row += 1
+
+        shard.flush()
+        del shard
+        logger.info(f"Wrote {row} images to {name}")
+        return {"file": name, "count": row}
+
+    def _decode_block(self, paths, workers):
+        """Decoded uint8 images for `paths`, None where decoding failed."""
+        if workers:
+            images, kept, _ = ingest_images(paths, self.img_size, workers=workers)
+            decoded = [None] * len(paths)
+            for row, idx in enumerate(kept):
+                decoded[idx] = images[row]
+            return decoded
+
+        decoded = []
+        for path in paths:
+            try:
+                decoded.append(read_image(path, self.img_size))
+            except Exception as e:
+                logger.warning(f"Failed to load {path}: {e}")
+                decoded.append(None)
+        return decoded
+
+    # ----------------------------------------------------------------------
+    def open(self):
+        """Map the shards read-only. Compiles first if no cache exists."""
+        self.manifest = self._load_manifest() or self.compile()
+        self._content = None
+        self._shards = {
+            s["file"]: np.load(self.cache_dir / s["file"], mmap_mode="r")
+            for s in self.manifest["shards"]
+        }
+        return self
+
+    @property
+    def class_names(self):
+        return self.manifest["class_names"]
+
+    def read(self, key, img_size=None):
+        """Zero-copy view of one cached image; `key` is (shard file, row)."""
+        shard, offset = key
+        return self._shards[shard][offset]
+
+    def content_id(self, key):
+        """SHA-1 of the source file decoded into shard row `key`."""
+        if self._content is None:
+            self._content = {(e["shard"], e["offset"]): e["sha1"] for e in live_entries(self.manifest)}
+        return self._content[tuple(key)]
+
+    def samples(self):
+        """(key, class_index) pairs in dataset order."""
+        index = {name: i for i, name in enumerate(self.class_names)}
+        return [((e["shard"], e["offset"]), index[e["class"]]) for e in live_entries(self.manifest)]
+
+    def stream(self, batch_size=32, **kwargs):
+        """ImageBatchStream over the cached images."""
+        if not self._shards:
+            self.open()
+        return ImageBatchStream(
+            self.samples(), self.class_names, batch_size=batch_size,
+            img_size=self.img_size, reader=self.read, content_id=self.content_id, **kwargs
+        )
+
+
+# --------------------------------------------------------------------------
+def live_entries(manifest):
+    """Manifest entries that decoded successfully."""
+    return [e for e in manifest["entries"] if not e.get("failed")]
+
+
+def trained_set(manifest, keys=None):
+    """
+    {path: sha1} of the manifest's images, or of those whose sample key is
+    in `keys`, to record what a model was trained or validated on.
+    """
+    keys = None if keys is None else set(keys)
+    return {
+        e["path"]: e["sha1"] for e in live_entries(manifest)
+        if keys is None or (e["shard"], e["offset"]) in keys
+    }
+
+
+def changed_since(manifest, trained, validation=None):
+    """
+    Split the manifest's live entries (in `samples()` order) into indices of
+    images that are new or changed since `trained` ({path: sha1}), of images
+    the model has already trained on, and of unchanged images it was
+    validated on (`validation`, same form).
+    """
+    validation = validation or {}
+    changed, seen, held_out = [], [], []
+    for i, entry in enumerate(live_entries(manifest)):
+        if trained.get(entry["path"]) == entry["sha1"]:
+            seen.append(i)
+        elif validation.get(entry["path"]) == entry["sha1"]:
+            held_out.append(i)
+        else:
+            changed.append(i)
+    return changed, seen, held_out
+
+
+# --------------------------------------------------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compile ./data into memory-mapped training shards")
+    parser.add_argument("--data-dir", default="./data")
+    parser.add_argument("--cache-dir", default="./data_cache")
+    parser.add_argument("--rebuild", action="store_true", help="ignore the existing manifest")
+    parser.add_argument("--deep", action="store_true", help="also stat files in unchanged folders")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="decode processes (0 = serial)")
+    args = parser.parse_args()
+
+    dataset = CompiledDataset(args.data_dir, args.cache_dir)
+    manifest = dataset.compile(rebuild=args.rebuild, workers=args.workers, deep=args.deep)
+    print(f"Classes: {manifest['class_names']}")
+    print(f"Images: {len(live_entries(manifest))} in {len(manifest['shards'])} shard(s)")
@@ -3,7 +3,6 @@ import zipfile
 from pathlib import Path
 import json
 import logging
-from kaggle.api.kaggle_api_extended import KaggleApi
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -13,6 +12,8 @@ class DatasetHandler:
         self.dataset_name = dataset_name
         self.data_dir = Path("./data")
         self.data_dir.mkdir(exist_ok=True)
+        # Kept (instead of extracted) by download_dataset(extract=False)
+        self.archive_path = Path("./data.zip")
         self.api = None
 
     # ----------------------------------------------------------------------
@@ -30,6 +31,8 @@ class DatasetHandler:
                 logger.error("Kaggle username or key missing.")
                 return False
 
+            from kaggle.api.kaggle_api_extended import KaggleApi
+
             self.api = KaggleApi()
             self.api.username = username
             self.api.key = api_key
@@ -43,8 +46,12 @@ class DatasetHandler:
             return False
 
     # ----------------------------------------------------------------------
-    def download_dataset(self):
-        """Download & unzip Kaggle dataset into ./data folder."""
+    def download_dataset(self, extract=True):
+        """
+        Download & unzip Kaggle dataset into ./data folder.
+        With extract=False the zip is kept as ./data.zip and read in place
+        (see open_archive).
+        """
         if not self.api:
             logger.error("Not authenticated with Kaggle. Run authenticate() first.")
             return False
@@ -76,6 +83,11 @@ class DatasetHandler:
             downloaded_zip = list(self.data_dir.glob("*.zip"))[0]
             logger.info(f"Downloaded ZIP: {downloaded_zip}")
 
+            if not extract:
+                os.replace(downloaded_zip, self.archive_path)
+                logger.info(f"Keeping archive at {self.archive_path}")
+                return self.open_archive() is not None
+
             # Extract files
             with zipfile.ZipFile(downloaded_zip, "r") as zip_ref:
                 zip_ref.extractall(self.data_dir)
@@ -87,6 +99,7 @@ class DatasetHandler:
 
             # Fix nested folder issue:
             self._flatten_if_nested()
+            self.index(rebuild=True)
 
             return True
 
@@ -111,6 +124,37 @@ class DatasetHandler:
                 item.rename(self.data_dir / item.name)
             inner.rmdir()
 
+    # ----------------------------------------------------------------------
+    def open_archive(self, zip_path=None, rebuild=False):
+        """
+        ArchiveDataset over the dataset zip, indexed once; images are read
+        and decoded straight from it. Nested root folders are skipped the
+        same way _flatten_if_nested flattens an extracted copy.
+        """
+        from archive_dataset import ArchiveDataset
+
+        try:
+            dataset = ArchiveDataset(zip_path or self.archive_path)
+            dataset.index(rebuild=rebuild)
+            return dataset
+        except Exception as e:
+            logger.error(f"Opening dataset archive failed: {e}")
+            return None
+
+    # ----------------------------------------------------------------------
+    def compile_dataset(self, cache_dir="./data_cache", rebuild=False):
+        """
+        Decode ./data once into memory-mapped training shards.
+        Later calls only re-process new or changed images.
+        """
+        from dataset_cache import CompiledDataset
+
+        try:
+            return CompiledDataset(self.data_dir, cache_dir).compile(rebuild=rebuild)
+        except Exception as e:
+            logger.error(f"Dataset compile failed: {e}")
+            return None
+
     # ----------------------------------------------------------------------
     def get_dataset_info(self):
         """Get dataset summary: classes + file count"""
@@ -118,30 +162,41 @@ class DatasetHandler:
             dataset_path = self.data_dir
             if not dataset_path.exists():
                 return None
+            if self.archive_path.exists() and not any(d.is_dir() for d in dataset_path.iterdir()):
+                return self._archive_info()
 
-            class_dirs = [d for d in dataset_path.iterdir() if d.is_dir()]
-
-            info = {
-                "total_files": len(list(dataset_path.rglob("*.*"))),
-                "directories": [d.name for d in class_dirs],
-                "images_by_class": self._count_images_by_class()
-            }
-            return info
+            return self.index().info()
 
         except Exception as e:
             logger.error(f"Error getting dataset info: {e}")
             return None
 
+    def _archive_info(self):
+        dataset = self.open_archive()
+        if dataset is None:
+            return None
+        counts = dataset.counts()
+        return {
+            "archive": str(self.archive_path),
+            "total_files": sum(counts.values()),
+            "directories": dataset.class_names,
+            "images_by_class": {name: num for name, num in counts.items() if num > 0},
+        }
+
     # ----------------------------------------------------------------------
     def _count_images_by_class(self):
         """Count images inside each class folder."""
-        counts = {}
-        for class_dir in self.data_dir.iterdir():
-            if class_dir.is_dir():
-                num = len(list(class_dir.glob("*.jpg"))) + len(list(class_dir.glob("*.png")))
-                if num > 0:
-                    counts[class_dir.name] = num
-        return counts
+        return self.index().counts()
+
+    # ----------------------------------------------------------------------
+    def index(self, rebuild=False):
+        """
+        DatasetIndex of ./data, refreshed for class folders that changed
+        since the last call (see dataset_index.py).
+        """
+        from dataset_index import DatasetIndex
+
+        return DatasetIndex(self.data_dir).refresh(rebuild=rebuild)
 
 # --------------------------------------------------------------------------
 if __name__ == "__main__":
@@ -151,6 +206,9 @@ if __name__ == "__main__":
     kaggle_key = os.getenv("KAGGLE_KEY", "")
 
     if handler.authenticate(kaggle_user, kaggle_key):
-        if handler.download_dataset():
+        extract = os.getenv("DATASET_EXTRACT", "true").lower() != "false"
+        if handler.download_dataset(extract=extract):
             print("Dataset Info:")
             print(json.dumps(handler.get_dataset_info(), indent=2))
+            if extract:
+                handler.compile_dataset()
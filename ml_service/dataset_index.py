@@ -0,0 +1,214 @@
+import os
+import json
+import hashlib
+import sqlite3
+import logging
+import argparse
+from pathlib import Path
+from contextlib import closing
+
+from PIL import Image
+
+from data_loader import is_image_file
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+INDEX_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS dirs (name TEXT PRIMARY KEY, mtime INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS images (
+    path TEXT PRIMARY KEY,
+    class TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime INTEGER NOT NULL,
+    sha1 TEXT NOT NULL,
+    width INTEGER,
+    height INTEGER
+);
+CREATE INDEX IF NOT EXISTS images_class ON images (class);
+CREATE INDEX IF NOT EXISTS images_sha1 ON images (sha1);
+"""
+
+
+class DatasetIndex:
+    """
+    Persistent table of the images in a class-per-folder dataset.
+
+    One row per image (relative path, class, size, mtime, SHA-1, width,
+    height) in a small SQLite file next to the data directory
+    (`./data.index.sqlite` for `./data`). `refresh()` stats the data
+    directory and each class folder and only lists and hashes folders whose
+    mtime changed, which is where adding, removing or renaming files shows
+    up. Counts, listings and duplicate checks are then queries on the
+    table instead of walks over the tree.
+
+    Editing a file in place does not touch its folder's mtime;
+    `refresh(deep=True)` also stats every indexed file to pick that up.
+    """
+
+    def __init__(self, data_dir="./data", index_path=None):
+        self.data_dir = Path(data_dir)
+        self.index_path = Path(index_path) if index_path else self.data_dir.with_name(self.data_dir.name + ".index.sqlite")
+
+    def _connect(self):
+        conn = sqlite3.connect(self.index_path)
+        conn.executescript(SCHEMA)
+        version = conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        if version is None or int(version[0]) != INDEX_VERSION:
+            conn.executescript("DELETE FROM dirs; DELETE FROM images;")
+            conn.execute("INSERT OR REPLACE INTO meta VALUES ('version', ?)", (str(INDEX_VERSION),))
+            conn.commit()
+        return conn
+
+    # ----------------------------------------------------------------------
+    def refresh(self, rebuild=False, deep=False):
+        """Bring the index up to date with `data_dir`. Returns self."""
+        if not self.data_dir.is_dir():
+            raise FileNotFoundError(f"Data directory not found: {self.data_dir}")
+
+        with closing(self._connect()) as conn:
+            if rebuild:
+                conn.executescript("DELETE FROM dirs; DELETE FROM images;")
+            known = dict(conn.execute("SELECT name, mtime FROM dirs"))
+
+            # "" is the data directory itself: its mtime changes when class folders come or go
+            root_mtime = self.data_dir.stat().st_mtime_ns
+            if known.get("") == root_mtime:
+                classes = [name for name in known if name]
+            else:
+                classes = [e.name for e in os.scandir(self.data_dir) if e.is_dir()]
+                gone = set(known) - set(classes) - {""}
+                for name in gone:
+                    conn.execute("DELETE FROM images WHERE class = ?", (name,))
+                    conn.execute("DELETE FROM dirs WHERE name = ?", (name,))
+
+            scanned = hashed = 0
+            for name in classes:
+                try:
+                    mtime = (self.data_dir / name).stat().st_mtime_ns
+                except FileNotFoundError:
+                    conn.execute("DELETE FROM images WHERE class = ?", (name,))
+                    conn.execute("DELETE FROM dirs WHERE name = ?", (name,))
+                    continue
+                if known.get(name) != mtime or deep:
+                    scanned += 1
+                    hashed += self._scan_class(conn, name)
+                    conn.execute("INSERT OR REPLACE INTO dirs VALUES (?, ?)", (name, mtime))
+
+            conn.execute("INSERT OR REPLACE INTO dirs VALUES ('', ?)", (root_mtime,))
+            conn.commit()
+
+        if scanned:
+            logger.info(f"Dataset index: rescanned {scanned} of {len(classes)} class folders, hashed {hashed} files")
+            for group in self.duplicates(cross_class_only=True):
+                logger.warning(f"Same image in several classes: {', '.join(group['paths'])}")
+        return self
+
+    def _scan_class(self, conn, name):
+        """Sync one class folder's rows with its files; returns how many were (re)hashed."""
+        indexed = {
+            row[0]: row[1:]
+            for row in conn.execute("SELECT path, size, mtime FROM images WHERE class = ?", (name,))
+        }
+        present = set()
+        hashed = 0
+        with os.scandir(self.data_dir / name) as entries:
+            for entry in entries:
+                if not entry.is_file() or not is_image_file(entry.name):
+                    continue
+                rel = f"{name}/{entry.name}"
+                present.add(rel)
+                st = entry.stat()
+                if indexed.get(rel) == (st.st_size, st.st_mtime_ns):
+                    continue
+                sha1, width, height = _describe(Path(entry.path))
+                conn.execute(
+                    "INSERT OR REPLACE INTO images VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (rel, name, st.st_size, st.st_mtime_ns, sha1, width, height),
+                )
+                hashed += 1
+        for rel in set(indexed) - present:
+            conn.execute("DELETE FROM images WHERE path = ?", (rel,))
+        return hashed
+
+    # ----------------------------------------------------------------------
+    def class_names(self):
+        """Every class folder, sorted (including empty ones)."""
+        with closing(self._connect()) as conn:
+            return [row[0] for row in conn.execute("SELECT name FROM dirs WHERE name != '' ORDER BY name")]
+
+    def counts(self):
+        """{class: image count} for classes that have images."""
+        with closing(self._connect()) as conn:
+            return dict(conn.execute("SELECT class, COUNT(*) FROM images GROUP BY class ORDER BY class"))
+
+    def samples(self):
+        """(class_names, [(image_path, class_index)]) in list_class_images order."""
+        class_names = self.class_names()
+        classes = {name: i for i, name in enumerate(class_names)}
+        with closing(self._connect()) as conn:
+            rows = conn.execute("SELECT path, class FROM images ORDER BY class, path").fetchall()
+        return class_names, [(self.data_dir / path, classes[cls]) for path, cls in rows]
+
+    def rows(self):
+        """Every indexed image as a dict, in samples() order."""
+        with closing(self._connect()) as conn:
+            conn.row_factory = sqlite3.Row
+            return [dict(r) for r in conn.execute("SELECT * FROM images ORDER BY class, path")]
+
+    def duplicates(self, cross_class_only=False):
+        """Groups of byte-identical files; `cross_class` marks groups that span classes."""
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                "SELECT sha1, GROUP_CONCAT(path, '\n'), COUNT(DISTINCT class) FROM images "
+                "GROUP BY sha1 HAVING COUNT(*) > 1 ORDER BY sha1"
+            ).fetchall()
+        groups = [
+            {"sha1": sha1, "paths": sorted(paths.split("\n")), "cross_class": n_classes > 1}
+            for sha1, paths, n_classes in rows
+        ]
+        return [g for g in groups if g["cross_class"]] if cross_class_only else groups
+
+    def info(self):
+        """Dataset summary for DatasetHandler.get_dataset_info."""
+        with closing(self._connect()) as conn:
+            total, total_bytes, unreadable = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(width IS NULL), 0) FROM images"
+            ).fetchone()
+        duplicates = self.duplicates()
+        return {
+            "total_files": total,
+            "total_bytes": total_bytes,
+            "directories": self.class_names(),
+            "images_by_class": self.counts(),
+            "unreadable_files": unreadable,
+            "duplicate_groups": len(duplicates),
+            "cross_class_duplicates": [g["paths"] for g in duplicates if g["cross_class"]],
+        }
+
+
+# --------------------------------------------------------------------------
+def _describe(path):
+    """(sha1, width, height) of one file; dimensions are None if PIL can't read its header."""
+    sha1 = hashlib.sha1(path.read_bytes()).hexdigest()
+    try:
+        with Image.open(path) as img:
+            width, height = img.size
+    except Exception:
+        width = height = None
+    return sha1, width, height
+
+
+# --------------------------------------------------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Index ./data (classes, sizes, hashes, dimensions)")
+    parser.add_argument("--data-dir", default="./data")
+    parser.add_argument("--rebuild", action="store_true", help="drop the existing index first")
+    parser.add_argument("--deep", action="store_true", help="also stat files in unchanged folders")
+    args = parser.parse_args()
+
+    index = DatasetIndex(args.data_dir).refresh(rebuild=args.rebuild, deep=args.deep)
+    print(json.dumps(index.info(), indent=2))
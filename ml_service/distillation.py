@@ -0,0 +1,176 @@
+import json
+import time
+import logging
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import tensorflow as tf
+from tensorflow import keras
+from tensorflow.keras import layers
+
+from data_loader import ImageBatchStream
+from embedding_cache import EmbeddingCache
+from inference_backends import CompiledModel
+from input_pipeline import make_dataset
+from model_export import serving_batches, _evaluate
+from preprocessing import RESNET_MEAN_BGR
+
+logger = logging.getLogger(__name__)
+
+
+def to_serving_input(images):
+    """
+    Training batches (RGB in [0, 1]) in the form app.py feeds the model:
+    BGR 0-255 minus the ImageNet means (see ImagePreprocessor.preprocess).
+    """
+    return images[..., ::-1] * 255.0 - tf.constant(RESNET_MEAN_BGR)
+
+
+def _serving_to_mobilenet():
+    """
+    Frozen per-pixel Dense(3) undoing the serving preprocessing into the
+    RGB [-1, 1] range MobileNetV2 expects. Plain Dense weights, so the
+    saved .h5 loads anywhere without custom objects.
+    """
+    kernel = np.zeros((3, 3), dtype=np.float32)
+    bias = np.zeros(3, dtype=np.float32)
+    for bgr, rgb in ((0, 2), (1, 1), (2, 0)):
+        kernel[bgr, rgb] = 1 / 127.5
+        bias[rgb] = RESNET_MEAN_BGR[bgr] / 127.5 - 1
+    layer = layers.Dense(3, name="serving_to_mobilenet", trainable=False)
+    return layer, [kernel, bias]
+
+
+def build_student(num_classes, input_shape=(224, 224, 3), width=1.0, weights="imagenet"):
+    """
+    MobileNetV2 classifier with the same input and softmax output contract
+    as the ResNet50 model, so app.py serves it unchanged. The backbone is
+    trainable; its BatchNorm layers stay in inference mode.
+    """
+    base_model = keras.applications.MobileNetV2(
+        include_top=False,
+        weights=weights,
+        input_shape=input_shape,
+        alpha=width
+    )
+
+    inputs = keras.Input(shape=input_shape)
+    adapter, adapter_weights = _serving_to_mobilenet()
+    x = adapter(inputs)
+    adapter.set_weights(adapter_weights)
+    x = base_model(x, training=False)
+    x = layers.GlobalAveragePooling2D()(x)
+    x = layers.Dropout(0.2)(x)
+    outputs = layers.Dense(num_classes, activation="softmax", dtype="float32")(x)
+    return keras.Model(inputs, outputs, name="student")
+
+
+# --------------------------------------------------------------------------
+def teacher_soft_labels(teacher, stream, cache_dir, batch_size=32):
+    """
+    Teacher class probabilities for every sample of `stream`, in sample
+    order, computed once and cached per (samples, teacher weights) in
+    `cache_dir`. Returns (probs, ok): rows of images that failed to decode
+    are zero with ok=False.
+    """
+    cache_dir = Path(cache_dir)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    key = EmbeddingCache.fingerprint(teacher, stream, "teacher")
+    probs_path = cache_dir / f"{key}.teacher.npy"
+    meta_path = cache_dir / f"{key}.teacher.json"
+
+    if meta_path.exists():
+        logger.info(f"Using cached teacher outputs {key} ({len(stream.samples)} images)")
+        probs = np.load(probs_path)
+        return probs, probs.sum(axis=1) > 0
+
+    logger.info(f"Computing teacher outputs {key} ({len(stream.samples)} images)...")
+    indexed = ImageBatchStream(
+        [(sample_key, i) for i, (sample_key, _) in enumerate(stream.samples)], stream.class_names,
+        batch_size=batch_size, img_size=stream.img_size, reader=stream.reader, content_id=stream.content_id
+    )
+    probs = np.zeros((len(stream.samples), len(stream.class_names)), dtype=np.float32)
+    # Same input convention the teacher was trained with (RGB in [0, 1])
+    for images, indices in make_dataset(indexed, batch_size=batch_size):
+        probs[indices.numpy()] = np.asarray(teacher.predict_on_batch(images), dtype=np.float32)
+
+    np.save(probs_path, probs)
+    # Written last: its presence marks a complete entry
+    with open(meta_path, "w") as f:
+        json.dump({"count": len(probs), "classes": list(stream.class_names)}, f)
+    return probs, probs.sum(axis=1) > 0
+
+
+def distillation_targets(teacher_probs, labels, temperature=4.0, alpha=0.7):
+    """
+    Per-sample training targets: `alpha` x the teacher distribution
+    softened at `temperature`, plus (1 - alpha) x the one-hot label.
+    """
+    logits = np.log(np.clip(teacher_probs, 1e-8, 1.0)) / temperature
+    soft = np.exp(logits - logits.max(axis=1, keepdims=True))
+    soft /= soft.sum(axis=1, keepdims=True)
+    hard = np.eye(teacher_probs.shape[1], dtype=np.float32)[labels]
+    return (alpha * soft + (1 - alpha) * hard).astype(np.float32)
+
+
+# --------------------------------------------------------------------------
+def _size_mb(model, path=None):
+    """On-disk size of the model's .h5 (saved to a temp file if it has none)."""
+    if path is not None and Path(path).exists():
+        return round(Path(path).stat().st_size / 1e6, 2)
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp_path = Path(tmp) / "model.h5"
+        model.save(tmp_path)
+        return round(tmp_path.stat().st_size / 1e6, 2)
+
+
+def _serving_latency_ms(compiled, sample, batch_size=16, runs=30):
+    """Median latency of the compiled serving call at batch 1 and `batch_size`."""
+    batch = np.repeat(sample, batch_size, axis=0)
+    result = {}
+    for name, inputs in (("latency_ms_batch1", sample), (f"latency_ms_batch{batch_size}", batch)):
+        compiled(inputs)  # trace + warmup
+        times = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            compiled(inputs)
+            times.append(time.perf_counter() - start)
+        result[name] = round(float(np.median(times)) * 1000, 2)
+    return result
+
+
+def compare_models(models, val_stream, batch_size=16):
+    """
+    Side-by-side report for {name: (keras model, .h5 path or None)}:
+    validation accuracy through the serving preprocessing, top-1 agreement
+    with the first model, parameter count, file size and the CPU latency
+    of the compiled call app.py serves with.
+    """
+    val_idx = np.arange(len(val_stream.samples))
+    # First image that decodes
+    sample = next(serving_batches(val_stream, val_idx, batch_size=1))[0]
+
+    report, reference = {}, None
+    for name, (model, path) in models.items():
+        compiled = CompiledModel(model)
+        # Latency first: it traces the batch buckets the evaluation then reuses
+        latency = _serving_latency_ms(compiled, sample, batch_size)
+        accuracy, probs, ms = _evaluate(compiled, serving_batches(val_stream, val_idx, batch_size))
+        stats = {
+            "accuracy": round(accuracy, 2),
+            "params": int(model.count_params()),
+            "size_mb": _size_mb(model, path),
+            "ms_per_image_batched": round(ms, 2),
+            **latency,
+        }
+        if reference is None:
+            reference = probs
+        else:
+            stats["top1_agreement"] = round(float((probs.argmax(1) == reference.argmax(1)).mean() * 100), 2)
+        report[name] = stats
+        logger.info(
+            f"{name}: accuracy {stats['accuracy']:.2f}%, {stats['params'] / 1e6:.1f}M params, "
+            f"{stats['size_mb']} MB, batch-1 latency {stats['latency_ms_batch1']} ms"
+        )
+    return {"validation_images": int(len(val_idx)), "models": report}
@@ -0,0 +1,120 @@
+import json
+import hashlib
+import logging
+from pathlib import Path
+
+import numpy as np
+from tensorflow import keras
+from tensorflow.keras import layers
+
+from similarity_index import hash_weights
+
+logger = logging.getLogger(__name__)
+
+
+def split_head(model):
+    """
+    Split a TeethDiseaseModel network at its global average pooling.
+
+    Returns (feature_model, head_layers): a model from the original input
+    to the pooled 2048-d features, and the layers after it (Dropout +
+    Dense). The head layers are the model's own instances, so training
+    them on cached features updates the full model in place.
+    """
+    pool_idx = max(i for i, layer in enumerate(model.layers) if isinstance(layer, layers.GlobalAveragePooling2D))
+    feature_model = keras.Model(model.inputs, model.layers[pool_idx].output)
+    return feature_model, model.layers[pool_idx + 1:]
+
+
+def with_embedding_output(model):
+    """
+    The same network with a second output: its pooled features, so one
+    forward pass gives both the class probabilities and the embedding.
+    """
+    feature_model, _ = split_head(model)
+    return keras.Model(model.inputs, [model.outputs[0], feature_model.outputs[0]])
+
+
+def build_head_model(head_layers, feature_dim):
+    """Stand-alone model over cached features sharing `head_layers`' weights."""
+    inputs = keras.Input(shape=(feature_dim,))
+    x = inputs
+    for layer in head_layers:
+        x = layer(x)
+    return keras.Model(inputs, x)
+
+
+# --------------------------------------------------------------------------
+class EmbeddingCache:
+    """
+    On-disk cache of pooled backbone features.
+
+    Each (dataset, backbone, augmentation variant) combination is stored
+    once as `<key>.emb.npy` / `<key>.labels.npy` and memory-mapped on
+    later runs. Variant 0 is the plain image; variant k > 0 is a fixed,
+    seeded augmentation pass, so the same k always yields the same views.
+    """
+
+    def __init__(self, cache_dir="./models/embeddings"):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    # ----------------------------------------------------------------------
+    @staticmethod
+    def fingerprint(feature_model, stream, variant):
+        """
+        Key covering the samples and their content (the stream's
+        content_id: file mtime, archive member CRC, ...), the backbone
+        weights and the variant.
+        """
+        digest = hashlib.sha1()
+        for key, label in stream.samples:
+            digest.update(f"{key}:{label}".encode())
+            digest.update(stream.content_id(key).encode())
+
+        hash_weights(digest, feature_model)
+
+        digest.update(f"{stream.img_size}:{variant}".encode())
+        return digest.hexdigest()[:20]
+
+    # ----------------------------------------------------------------------
+    def load_or_compute(self, feature_model, stream, variant=0, augmenter=None, seed=1234):
+        """(embeddings, labels) for `stream`, computing them only on a miss."""
+        key = self.fingerprint(feature_model, stream, variant)
+        meta_path = self.cache_dir / f"{key}.json"
+        emb_path = self.cache_dir / f"{key}.emb.npy"
+        labels_path = self.cache_dir / f"{key}.labels.npy"
+
+        if meta_path.exists():
+            with open(meta_path, "r") as f:
+                count = json.load(f)["count"]
+            logger.info(f"Using cached embeddings {key} (variant {variant}, {count} images)")
+            return np.load(emb_path, mmap_mode="r")[:count], np.load(labels_path)[:count]
+
+        logger.info(f"Computing embeddings {key} (variant {variant}, {len(stream.samples)} images)...")
+        source = stream.subset(shuffle=False, augmenter=augmenter if variant else None)
+        if variant:
+            # Augmenters draw their randomness from the global numpy RNG
+            np.random.seed(seed + variant)
+
+        dim = feature_model.output_shape[-1]
+        embeddings = np.lib.format.open_memmap(emb_path, mode="w+", dtype=np.float32, shape=(len(stream.samples), dim))
+        labels = np.empty(len(stream.samples), dtype=np.int64)
+        count = 0
+        for i in range(len(source)):
+            images, batch_labels = source[i]
+            if len(images) == 0:
+                continue
+            features = feature_model.predict_on_batch(images)
+            embeddings[count:count + len(images)] = np.asarray(features, dtype=np.float32)
+            labels[count:count + len(images)] = batch_labels
+            count += len(images)
+
+        embeddings.flush()
+        del embeddings
+        np.save(labels_path, labels)
+        # Written last: its presence marks a complete entry
+        with open(meta_path, "w") as f:
+            json.dump({"count": count, "variant": variant, "dim": int(dim)}, f)
+
+        return np.load(emb_path, mmap_mode="r")[:count], labels[:count]
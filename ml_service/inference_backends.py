@@ -0,0 +1,213 @@
+import bisect
+import logging
+import threading
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Batch sizes the compiled serving call is traced for; other sizes are
+# zero-padded up to the next bucket (or split above the largest one)
+BATCH_BUCKETS = (1, 2, 4, 8, 16, 32)
+
+
+def normalize_buckets(buckets):
+    return tuple(sorted({int(b) for b in buckets if int(b) > 0})) or (1,)
+
+
+def bucket_for(buckets, n):
+    """Smallest bucket holding `n` rows (the largest one if none does)."""
+    return buckets[min(bisect.bisect_left(buckets, n), len(buckets) - 1)]
+
+
+class CompiledModel:
+    """
+    Low-overhead serving call for a Keras model.
+
+    `model.predict` builds a data adapter, callbacks and a progress bar on
+    every call, which dominates latency for one 224x224 image. This wraps
+    `model(x, training=False)` in a tf.function with one fixed-shape
+    concrete function per batch bucket, traced on first use, so steady-state
+    calls never retrace. Rows are computed independently, so padding does
+    not change the real rows' outputs: results are bit-identical to
+    `model.predict` (tests/test_compiled_model.py; timings in
+    benchmarks/bench_compiled.py).
+    """
+
+    def __init__(self, model, buckets=BATCH_BUCKETS):
+        import tensorflow as tf
+
+        self.model = model
+        self.buckets = normalize_buckets(buckets)
+        self.input_shape = tuple(model.input_shape[1:])
+        self._tf = tf
+        self._fn = tf.function(lambda x: model(x, training=False), autograph=False)
+        self._concrete = {}
+        self._trace_lock = threading.Lock()
+        self._local = threading.local()
+
+    def bucket_for(self, n):
+        return bucket_for(self.buckets, n)
+
+    def _function(self, bucket):
+        fn = self._concrete.get(bucket)
+        if fn is None:
+            with self._trace_lock:
+                fn = self._concrete.get(bucket)
+                if fn is None:
+                    spec = self._tf.TensorSpec((bucket,) + self.input_shape, self._tf.float32)
+                    fn = self._concrete[bucket] = self._fn.get_concrete_function(spec)
+        return fn
+
+    def _padded(self, batch, bucket):
+        """Copy `batch` into this thread's reusable (bucket, ...) buffer."""
+        buffers = getattr(self._local, "buffers", None)
+        if buffers is None:
+            buffers = self._local.buffers = {}
+        buf = buffers.get(bucket)
+        if buf is None:
+            # Zeroed once; stale rows past len(batch) are never read back
+            buf = buffers[bucket] = np.zeros((bucket,) + self.input_shape, dtype=np.float32)
+        buf[:len(batch)] = batch
+        return buf
+
+    def __call__(self, batch):
+        batch = np.asarray(batch, dtype=np.float32)
+        n = len(batch)
+        largest = self.buckets[-1]
+        if n > largest:
+            parts = [self(batch[i:i + largest]) for i in range(0, n, largest)]
+            if isinstance(parts[0], (list, tuple)):
+                return type(parts[0])(np.concatenate(p) for p in zip(*parts))
+            return np.concatenate(parts)
+
+        bucket = self.bucket_for(n)
+        inputs = batch if bucket == n else self._padded(batch, bucket)
+        outputs = self._function(bucket)(self._tf.constant(inputs))
+        if isinstance(outputs, (list, tuple)):
+            return type(outputs)(o.numpy()[:n] for o in outputs)
+        return outputs.numpy()[:n]
+
+
+class KerasBackend:
+    """
+    Serves the trained Keras (.h5) model through a CompiledModel. With
+    `embeddings`, predict() returns (probabilities, pooled features).
+    """
+
+    name = "keras"
+
+    def __init__(self, model_path, num_threads=None, inter_op_threads=None, compiled=True, buckets=BATCH_BUCKETS,
+                 embeddings=False):
+        configure_tf_threads(num_threads, inter_op_threads)
+        from keras.models import load_model
+
+        self.model_path = model_path
+        self.model = load_model(model_path, compile=False)
+        if embeddings:
+            from embedding_cache import with_embedding_output
+            self.model = with_embedding_output(self.model)
+        self.compiled = CompiledModel(self.model, buckets) if compiled else None
+        self.buckets = self.compiled.buckets if compiled else ()
+
+    def predict(self, batch):
+        if self.compiled is None:
+            return self.model.predict(batch, verbose=0)
+        return self.compiled(batch)
+
+
+class TFLiteBackend:
+    """
+    Serves an exported .tflite artifact (float32 or int8-quantized).
+
+    The interpreter is not thread-safe, so calls are serialised. Batches
+    are zero-padded up to the same fixed buckets CompiledModel uses (and
+    split above the largest), so resize_tensor_input + allocate_tensors
+    only run when the bucket changes, not on every new batch size; the
+    padding rows are sliced off the output.
+    """
+
+    name = "tflite"
+
+    def __init__(self, model_path, num_threads=None, inter_op_threads=None, model_content=None,
+                 buckets=BATCH_BUCKETS):
+        self.model_path = model_path
+        self.buckets = normalize_buckets(buckets)
+        if model_content is not None:
+            # Buffer owned by the caller (e.g. shared across forked workers);
+            # TFLite reads constant tensors from it in place
+            self.interpreter = make_interpreter(model_content=model_content, num_threads=num_threads)
+        else:
+            self.interpreter = make_interpreter(model_path=model_path, num_threads=num_threads)
+        self._input = self.interpreter.get_input_details()[0]
+        self._output = self.interpreter.get_output_details()[0]
+        self._batch_size = None
+        # Zeroed (bucket, ...) input buffers; only used under the lock
+        self._buffers = {}
+        self._lock = threading.Lock()
+
+    def predict(self, batch):
+        batch = np.ascontiguousarray(batch, dtype=self._input["dtype"])
+        n = len(batch)
+        largest = self.buckets[-1]
+        if n > largest:
+            return np.concatenate([self.predict(batch[i:i + largest]) for i in range(0, n, largest)])
+
+        bucket = bucket_for(self.buckets, n)
+        with self._lock:
+            if bucket != self._batch_size:
+                self.interpreter.resize_tensor_input(self._input["index"], (bucket,) + batch.shape[1:])
+                self.interpreter.allocate_tensors()
+                self._batch_size = bucket
+            if bucket != n:
+                buf = self._buffers.get(bucket)
+                if buf is None:
+                    buf = self._buffers[bucket] = np.zeros((bucket,) + batch.shape[1:], dtype=batch.dtype)
+                buf[:n] = batch
+                batch = buf
+            self.interpreter.set_tensor(self._input["index"], batch)
+            self.interpreter.invoke()
+            return self.interpreter.get_tensor(self._output["index"])[:n].copy()
+
+
+def configure_tf_threads(intra_op=None, inter_op=None):
+    """Pin TensorFlow's thread pools; must run before TF executes any op."""
+    if not intra_op and not inter_op:
+        return
+    import tensorflow as tf
+
+    try:
+        if intra_op:
+            tf.config.threading.set_intra_op_parallelism_threads(intra_op)
+        if inter_op:
+            tf.config.threading.set_inter_op_parallelism_threads(inter_op)
+    except RuntimeError as e:
+        logger.warning(f"Could not set TensorFlow thread counts (already initialised): {e}")
+
+
+def make_interpreter(model_path=None, model_content=None, num_threads=None):
+    """TFLite interpreter from the standalone runtime if present, else TensorFlow."""
+    try:
+        from tflite_runtime.interpreter import Interpreter
+    except ImportError:
+        import tensorflow as tf
+        Interpreter = tf.lite.Interpreter
+    return Interpreter(model_path=model_path, model_content=model_content, num_threads=num_threads)
+
+
+BACKENDS = {
+    "keras": KerasBackend,
+    "tflite": TFLiteBackend,
+}
+
+
+def load_backend(name, model_path, **kwargs):
+    """Instantiate the inference backend called `name`."""
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown inference backend '{name}' (choose from {', '.join(BACKENDS)})")
+    if name == "keras":
+        kwargs.pop("model_content", None)
+    else:
+        kwargs.pop("compiled", None)
+        kwargs.pop("embeddings", None)
+    return BACKENDS[name](model_path, **kwargs)
@@ -0,0 +1,308 @@
+import math
+import time
+import logging
+import threading
+from collections import deque
+
+import numpy as np
+import tensorflow as tf
+from tensorflow import keras
+
+from data_loader import ImageBatchStream
+
+logger = logging.getLogger(__name__)
+
+AUTOTUNE = tf.data.AUTOTUNE
+
+
+class BatchAugmenter:
+    """
+    Vectorized stand-in for the trainer's ImageDataGenerator.
+
+    Draws the same random rotation / shift / shear / zoom / flip parameters
+    from the same ranges, builds the same affine matrix per image and
+    applies the whole batch in one ImageProjectiveTransform op (bilinear,
+    nearest-edge fill, like `order=1, fill_mode='nearest'`). Randomness
+    comes from stateless ops keyed by a (2,) seed, so a given seed always
+    yields the same augmented batch.
+    """
+
+    def __init__(self, rotation_range=20, width_shift_range=0.2, height_shift_range=0.2,
+                 shear_range=0.2, zoom_range=0.2, horizontal_flip=True, fill_mode="nearest"):
+        self.rotation_range = float(rotation_range)
+        self.width_shift_range = float(width_shift_range)
+        self.height_shift_range = float(height_shift_range)
+        # Degrees, as in ImageDataGenerator
+        self.shear_range = float(shear_range)
+        self.zoom_range = (1 - zoom_range, 1 + zoom_range)
+        self.horizontal_flip = horizontal_flip
+        self.fill_mode = fill_mode.upper()
+
+    # ----------------------------------------------------------------------
+    def transforms(self, batch_size, height, width, seed):
+        """(batch_size, 8) projective transforms mapping output to input pixels."""
+        seeds = tf.random.experimental.stateless_split(tf.cast(seed, tf.int64), num=7)
+
+        def uniform(i, low, high):
+            return tf.random.stateless_uniform([batch_size], seeds[i], low, high, dtype=tf.float32)
+
+        h, w = tf.cast(height, tf.float32), tf.cast(width, tf.float32)
+        theta = uniform(0, -self.rotation_range, self.rotation_range) * (math.pi / 180)
+        # ImageDataGenerator scales the height shift by rows but applies it
+        # to its first matrix axis (columns here); kept as is for parity
+        tx = uniform(1, -self.height_shift_range, self.height_shift_range) * h
+        ty = uniform(2, -self.width_shift_range, self.width_shift_range) * w
+        shear = uniform(3, -self.shear_range, self.shear_range) * (math.pi / 180)
+        zx = uniform(4, *self.zoom_range)
+        zy = uniform(5, *self.zoom_range)
+        if self.horizontal_flip:
+            flip = tf.cast(uniform(6, 0.0, 1.0) < 0.5, tf.float32)
+        else:
+            flip = tf.zeros([batch_size])
+
+        return affine_transforms(theta, tx, ty, shear, zx, zy, flip, h, w)
+
+    def __call__(self, images, seed):
+        """Augment a float (N, H, W, C) batch."""
+        shape = tf.shape(images)
+        transforms = self.transforms(shape[0], shape[1], shape[2], seed)
+        return tf.raw_ops.ImageProjectiveTransformV3(
+            images=images,
+            transforms=transforms,
+            output_shape=shape[1:3],
+            fill_value=0.0,
+            interpolation="BILINEAR",
+            fill_mode=self.fill_mode,
+        )
+
+    def augment_batch(self, images, seed=None):
+        """NumPy in/out; without a seed one is drawn from the global numpy RNG."""
+        if seed is None:
+            seed = np.random.randint(0, 2**31 - 1, size=2)
+        return self(tf.convert_to_tensor(images, dtype=tf.float32), seed).numpy()
+
+
+def affine_transforms(theta, tx, ty, shear, zx, zy, flip, height, width):
+    """
+    ImageDataGenerator's rotation @ shift @ shear @ zoom matrix (radians,
+    pixels), centred and optionally flipped, as (N, 8) projective transforms.
+    """
+    cos, sin = tf.cos(theta), tf.sin(theta)
+    sh_sin, sh_cos = -tf.sin(shear), tf.cos(shear)
+    a0 = cos * zx
+    a1 = (cos * sh_sin - sin * sh_cos) * zy
+    a2 = cos * tx - sin * ty
+    b0 = sin * zx
+    b1 = (sin * sh_sin + cos * sh_cos) * zy
+    b2 = sin * tx + cos * ty
+
+    # Around the image centre (transform_matrix_offset_center)
+    ox, oy = height / 2 - 0.5, width / 2 - 0.5
+    a2 = a2 + ox - a0 * ox - a1 * oy
+    b2 = b2 + oy - b0 * ox - b1 * oy
+
+    # Horizontal flip of the output: x -> (width - 1 - x)
+    sign = 1 - 2 * flip
+    a2 = a2 + flip * a0 * (width - 1)
+    b2 = b2 + flip * b0 * (width - 1)
+    a0, b0 = a0 * sign, b0 * sign
+
+    zeros = tf.zeros_like(a0)
+    return tf.stack([a0, a1, a2, b0, b1, b2, zeros, zeros], axis=1)
+
+
+# --------------------------------------------------------------------------
+class InputStallMonitor(keras.callbacks.Callback):
+    """
+    Time each training step spends waiting for its input batch.
+
+    `probe(dataset)` appends a pass-through op after the pipeline's
+    prefetch buffer; it runs when the train step pulls a batch and stamps
+    the moment the batch was handed over. The wait is that stamp minus the
+    step's start, so a pipeline that keeps up shows only the step's own
+    dispatch overhead (about a millisecond) while one that doesn't shows
+    the decode/augment time the model sat idle.
+    """
+
+    def __init__(self, log_every_epoch=True):
+        super().__init__()
+        self.log_every_epoch = log_every_epoch
+        self.epochs = []
+        self._ready = deque()
+        self._lock = threading.Lock()
+        self._step_start = None
+        self._waits = []
+        self._steps = []
+        self._images = 0
+
+    def probe(self, dataset):
+        def stamp(*batch):
+            def record(size):
+                with self._lock:
+                    self._ready.append((time.perf_counter(), int(size)))
+                return np.int64(0)
+            token = tf.numpy_function(record, [tf.shape(batch[0])[0]], tf.int64, stateful=True)
+            with tf.control_dependencies([token]):
+                return tuple(tf.identity(t) for t in batch)
+        options = tf.data.Options()
+        # An injected prefetch after the probe would stamp batches early
+        options.experimental_optimization.inject_prefetch = False
+        return dataset.map(stamp).with_options(options)
+
+    # ----------------------------------------------------------------------
+    def on_epoch_begin(self, epoch, logs=None):
+        with self._lock:
+            self._ready.clear()
+        self._waits, self._steps, self._images = [], [], 0
+
+    def on_train_batch_begin(self, batch, logs=None):
+        self._step_start = time.perf_counter()
+
+    def on_train_batch_end(self, batch, logs=None):
+        end = time.perf_counter()
+        with self._lock:
+            ready = self._ready.popleft() if self._ready else None
+        if self._step_start is None:
+            return
+        self._steps.append(end - self._step_start)
+        if ready is not None:
+            self._waits.append(max(0.0, ready[0] - self._step_start))
+            self._images += ready[1]
+
+    def on_epoch_end(self, epoch, logs=None):
+        if not self._steps:
+            return
+        # The first step includes tracing; leave it out when there are others
+        steps = self._steps[1:] or self._steps
+        waits = self._waits[1:] or self._waits
+        summary = {
+            "epoch": epoch + 1,
+            "steps": len(self._steps),
+            "images": self._images,
+            "input_wait_seconds": round(float(np.sum(self._waits)), 3),
+            "step_ms": round(1000 * float(np.mean(steps)), 2),
+            "input_wait_ms": round(1000 * float(np.mean(waits)), 2) if waits else None,
+            "input_stall_fraction": round(float(np.sum(waits) / np.sum(steps)), 4) if waits else None,
+        }
+        self.epochs.append(summary)
+        if self.log_every_epoch and summary["input_wait_ms"] is not None:
+            logger.info(
+                f"Epoch {summary['epoch']}: step {summary['step_ms']} ms, waiting on input "
+                f"{summary['input_wait_ms']} ms ({summary['input_stall_fraction'] * 100:.1f}%)"
+            )
+
+    def get_state(self):
+        return {"epochs": self.epochs}
+
+    def set_state(self, state):
+        self.epochs = list(state["epochs"])
+
+    def summary(self):
+        """Mean over epochs, for metrics.json."""
+        rows = [e for e in self.epochs if e["input_wait_ms"] is not None]
+        if not rows:
+            return None
+        return {
+            "step_ms": round(float(np.mean([e["step_ms"] for e in rows])), 2),
+            "input_wait_ms": round(float(np.mean([e["input_wait_ms"] for e in rows])), 2),
+            "input_stall_fraction": round(float(np.mean([e["input_stall_fraction"] for e in rows])), 4),
+            "per_epoch": self.epochs,
+        }
+
+
+# --------------------------------------------------------------------------
+def _stream_reader(stream):
+    """numpy_function body: sample index -> (uint8 image, label, ok)."""
+    height, width = stream.img_size[1], stream.img_size[0]
+
+    def read(index):
+        key, label = stream.samples[int(index)]
+        try:
+            image = np.asarray(stream.reader(key, stream.img_size), dtype=np.uint8)
+            return image, np.int64(label), True
+        except Exception as e:
+            logger.warning(f"Failed to load {key}: {e}")
+            return np.zeros((height, width, 3), dtype=np.uint8), np.int64(label), False
+
+    return read
+
+
+def make_dataset(source, labels=None, batch_size=32, shuffle=False, augmenter=None, seed=42,
+                 num_parallel_calls=AUTOTUNE, prefetch=AUTOTUNE, monitor=None, map_fn=None):
+    """
+    tf.data pipeline of float32 [0, 1] (images, labels) batches.
+
+    `source` is either an in-memory float array in [0, 1] (with `labels`)
+    or an ImageBatchStream, whose samples are decoded in parallel through
+    its reader and skipped if they fail. Shuffling and augmentation are
+    seeded from `seed` and differ per epoch, but repeat exactly across
+    runs. Batches are augmented as a whole on parallel map calls and
+    prefetched so the next ones are ready while the model trains.
+    `map_fn(images, labels)`, if given, transforms each finished batch
+    before prefetching.
+    """
+    streaming = isinstance(source, ImageBatchStream)
+    count = len(source.samples) if streaming else len(source)
+
+    ds = tf.data.Dataset.range(count)
+    if shuffle:
+        ds = ds.shuffle(count, seed=seed, reshuffle_each_iteration=True)
+
+    if streaming:
+        height, width = source.img_size[1], source.img_size[0]
+        read = _stream_reader(source)
+
+        def load(index):
+            image, label, ok = tf.numpy_function(read, [index], (tf.uint8, tf.int64, tf.bool))
+            image.set_shape((height, width, 3))
+            label.set_shape(())
+            ok.set_shape(())
+            return image, label, ok
+
+        ds = ds.map(load, num_parallel_calls=num_parallel_calls, deterministic=True)
+        ds = ds.filter(lambda image, label, ok: ok)
+        ds = ds.map(lambda image, label, ok: (image, label))
+        ds = ds.batch(batch_size)
+        scale = 1.0 / 255.0
+    else:
+        images = source
+        labels = np.asarray(labels, dtype=np.int64)
+        shape = images.shape[1:]
+
+        def gather(indices):
+            # Fancy indexing copies just this batch out of the array
+            return images[indices], labels[indices]
+
+        def load(indices):
+            x, y = tf.numpy_function(gather, [indices], (tf.as_dtype(images.dtype), tf.int64))
+            x.set_shape((None,) + shape)
+            y.set_shape((None,))
+            return x, y
+
+        ds = ds.batch(batch_size).map(load, num_parallel_calls=num_parallel_calls, deterministic=True)
+        scale = 1.0 if images.dtype != np.uint8 else 1.0 / 255.0
+
+    def finish(x, y, batch_seed=None):
+        x = tf.cast(x, tf.float32)
+        if augmenter is not None:
+            x = augmenter(x, tf.stack([tf.constant(seed, tf.int64), batch_seed]))
+        if scale != 1.0:
+            x = x * scale
+        return x, y
+
+    if augmenter is not None:
+        # One fresh, seed-determined draw per batch and per epoch
+        seeds = tf.data.Dataset.random(seed=seed, rerandomize_each_iteration=True)
+        ds = tf.data.Dataset.zip((ds, seeds)).map(
+            lambda batch, batch_seed: finish(*batch, batch_seed),
+            num_parallel_calls=num_parallel_calls, deterministic=True,
+        )
+    else:
+        ds = ds.map(finish, num_parallel_calls=num_parallel_calls, deterministic=True)
+
+    if map_fn is not None:
+        ds = ds.map(map_fn, num_parallel_calls=num_parallel_calls, deterministic=True)
+    ds = ds.prefetch(prefetch)
+    if monitor is not None:
+        ds = monitor.probe(ds)
+    return ds
@@ -0,0 +1,259 @@
+import os
+import time
+import bisect
+import logging
+import threading
+import cProfile
+import random
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Latency buckets in seconds: sub-ms cache hits up to multi-second outliers
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    """Base for a metric family keyed by label values."""
+
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        try:
+            if len(labels) == len(self.labelnames):
+                return tuple([str(labels[name]) for name in self.labelnames])
+        except KeyError:
+            pass
+        raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    """Monotonically increasing count."""
+
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """Value that can go up and down (in-flight requests, load time...)."""
+
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    """
+    Bucketed distribution of observations.
+
+    Only per-bucket counts, the sum and the count are kept, so observing is
+    a bisect plus a few additions under a lock.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][idx] += 1
+            state[1] += value
+            state[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((key, ([*state[0]], state[1], state[2])) for key, state in self._values.items())
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                le = _format_labels(self.labelnames, key, [("le", _format_value(float(bound)))])
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+# --------------------------------------------------------------------------
+class Registry:
+    """Set of metrics rendered together in the Prometheus text format."""
+
+    CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+    def __init__(self):
+        self._metrics = []
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._add(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._add(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._add(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# --------------------------------------------------------------------------
+class StageTimer:
+    """
+    Times the stages of one request into a histogram labelled by stage.
+
+        timer = StageTimer(STAGE_SECONDS, endpoint="/api/predict")
+        with timer.stage("decode"):
+            ...
+        timer.stages  # {"decode": 0.0123, ...}
+    """
+
+    __slots__ = ("histogram", "labels", "stages")
+
+    def __init__(self, histogram, **labels):
+        self.histogram = histogram
+        self.labels = labels
+        self.stages = {}
+
+    def stage(self, name):
+        return _Stage(self, name)
+
+    def record(self, name, elapsed):
+        self.stages[name] = self.stages.get(name, 0.0) + elapsed
+        self.histogram.observe(elapsed, stage=name, **self.labels)
+
+
+class _Stage:
+    """Plain context manager (cheaper than a generator-based one)."""
+
+    __slots__ = ("timer", "name", "start")
+
+    def __init__(self, timer, name):
+        self.timer = timer
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.timer.record(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class SlowRequestProfiler:
+    """
+    Sampling profiler for slow outliers.
+
+    A `sample_rate` fraction of requests runs under cProfile; when one of
+    them takes longer than `slow_ms` its stats are dumped to `out_dir` as
+    `<timestamp>-<ms>ms.prof` (open with `python -m pstats` or snakeviz).
+    Python allows one active profiler at a time, so a request arriving
+    while another is being profiled simply isn't sampled.
+    """
+
+    def __init__(self, sample_rate=0.0, slow_ms=500.0, out_dir="./profiles"):
+        self.sample_rate = max(0.0, min(1.0, float(sample_rate)))
+        self.slow_ms = float(slow_ms)
+        self.out_dir = out_dir
+        self.dumped = 0
+        self._busy = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.sample_rate > 0
+
+    @contextmanager
+    def maybe_profile(self, name="request"):
+        if not self.enabled or random.random() >= self.sample_rate or not self._busy.acquire(blocking=False):
+            yield
+            return
+
+        profiler = cProfile.Profile()
+        start = time.perf_counter()
+        try:
+            try:
+                profiler.enable()
+            except ValueError:
+                # Another profiling tool is active in this process
+                yield
+                return
+            try:
+                yield
+            finally:
+                profiler.disable()
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            if elapsed_ms >= self.slow_ms:
+                self._dump(profiler, name, elapsed_ms)
+        finally:
+            self._busy.release()
+
+    def _dump(self, profiler, name, elapsed_ms):
+        try:
+            os.makedirs(self.out_dir, exist_ok=True)
+            stamp = time.strftime("%Y%m%d-%H%M%S")
+            path = os.path.join(self.out_dir, f"{stamp}-{os.getpid()}-{self.dumped}-{name}-{elapsed_ms:.0f}ms.prof")
+            profiler.dump_stats(path)
+            self.dumped += 1
+            logger.warning(f"🐢 Slow {name} request ({elapsed_ms:.0f}ms), profile saved to {path}")
+        except OSError as e:
+            logger.warning(f"Could not write profile: {e}")
@@ -0,0 +1,143 @@
+import os
+import json
+import time
+import logging
+from pathlib import Path
+
+import numpy as np
+import tensorflow as tf
+
+from inference_backends import TFLiteBackend
+from preprocessing import ImagePreprocessor
+
+logger = logging.getLogger(__name__)
+
+
+def serving_batches(stream, indices, batch_size=32):
+    """
+    Yield (inputs, labels) for `indices` of `stream`, preprocessed exactly
+    the way app.py feeds the model (uint8 pixels -> ResNet caffe mode).
+    """
+    preprocessor = ImagePreprocessor(stream.img_size)
+    for start in range(0, len(indices), batch_size):
+        inputs, labels = [], []
+        for i in indices[start:start + batch_size]:
+            key, label = stream.samples[i]
+            try:
+                pixels = stream.reader(key, stream.img_size)
+            except Exception as e:
+                logger.warning(f"Failed to load {key}: {e}")
+                continue
+            inputs.append(preprocessor.preprocess(np.asarray(pixels)))
+            labels.append(label)
+        if inputs:
+            yield np.stack(inputs), np.array(labels)
+
+
+def convert_tflite(model, quantize=False, representative=None):
+    """Convert a Keras model to a TFLite flatbuffer (optionally int8)."""
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    if quantize:
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = representative
+        converter.target_spec.supported_ops = [
+            tf.lite.OpsSet.TFLITE_BUILTINS_INT8,
+            tf.lite.OpsSet.TFLITE_BUILTINS,
+        ]
+    return converter.convert()
+
+
+def _evaluate(predict_fn, batches):
+    """Top-1 accuracy, all probabilities and mean per-batch latency."""
+    probs, labels, seconds = [], [], 0.0
+    for inputs, batch_labels in batches:
+        start = time.perf_counter()
+        probs.append(np.asarray(predict_fn(inputs), dtype=np.float32))
+        seconds += time.perf_counter() - start
+        labels.append(batch_labels)
+    probs = np.concatenate(probs)
+    labels = np.concatenate(labels)
+    accuracy = float((probs.argmax(axis=1) == labels).mean() * 100)
+    return accuracy, probs, seconds / max(1, len(labels)) * 1000
+
+
+def _latency_ms(predict_fn, sample, runs=20):
+    """Median batch-of-one latency."""
+    predict_fn(sample)  # warmup
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        predict_fn(sample)
+        times.append(time.perf_counter() - start)
+    return round(float(np.median(times)) * 1000, 2)
+
+
+def export_model(model, stream, out_dir, name="teeth_disease_model", validation_split=0.2,
+                 calibration_samples=200, seed=42):
+    """
+    Export float32 and int8 TFLite artifacts and compare them to Keras.
+
+    Calibration images are drawn from the training split; the accuracy
+    comparison runs on the same validation split `train()` holds out.
+    Returns the report that is also written to `<name>_export.json`.
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    train_stream, val_stream = stream.split(validation_split, random_state=seed)
+    train_idx = np.arange(len(train_stream.samples))
+    rng = np.random.default_rng(seed)
+    calib_idx = rng.choice(train_idx, size=min(calibration_samples, len(train_idx)), replace=False)
+
+    def representative():
+        for inputs, _ in serving_batches(train_stream, calib_idx, batch_size=1):
+            yield [inputs]
+
+    artifacts = {}
+    for variant, quantize in (("fp32", False), ("int8", True)):
+        logger.info(f"Converting {variant} TFLite model...")
+        path = out_dir / f"{name}_{variant}.tflite"
+        path.write_bytes(convert_tflite(model, quantize=quantize, representative=representative))
+        artifacts[variant] = path
+        logger.info(f"Wrote {path} ({path.stat().st_size / 1e6:.1f} MB)")
+
+    val_idx = np.arange(len(val_stream.samples))
+    sample = next(serving_batches(val_stream, val_idx[:1], batch_size=1))[0]
+
+    report = {"validation_images": int(len(val_idx)), "variants": {}}
+    keras_acc, keras_probs, keras_ms = _evaluate(
+        lambda x: model.predict(x, verbose=0), serving_batches(val_stream, val_idx)
+    )
+    report["variants"]["keras"] = {
+        "accuracy": round(keras_acc, 2),
+        "ms_per_image_batched": round(keras_ms, 2),
+        "latency_ms_batch1": _latency_ms(lambda x: model.predict(x, verbose=0), sample),
+    }
+
+    for variant, path in artifacts.items():
+        backend = TFLiteBackend(str(path), num_threads=os.cpu_count())
+        acc, probs, ms = _evaluate(backend.predict, serving_batches(val_stream, val_idx))
+        report["variants"][variant] = {
+            "path": str(path),
+            "size_mb": round(path.stat().st_size / 1e6, 2),
+            "accuracy": round(acc, 2),
+            "accuracy_delta_vs_keras": round(acc - keras_acc, 2),
+            "top1_agreement_with_keras": round(float((probs.argmax(1) == keras_probs.argmax(1)).mean() * 100), 2),
+            "max_prob_diff_vs_keras": round(float(np.abs(probs - keras_probs).max()), 5),
+            "ms_per_image_batched": round(ms, 2),
+            "latency_ms_batch1": _latency_ms(backend.predict, sample),
+        }
+
+    report_path = out_dir / f"{name}_export.json"
+    with open(report_path, "w") as f:
+        json.dump(report, f, indent=2)
+    logger.info(f"Export report saved to {report_path}")
+
+    for variant, stats in report["variants"].items():
+        delta = stats.get("accuracy_delta_vs_keras")
+        logger.info(
+            f"{variant}: accuracy {stats['accuracy']:.2f}%"
+            + (f" (delta {delta:+.2f})" if delta is not None else "")
+            + f", batch-1 latency {stats['latency_ms_batch1']} ms"
+        )
+    return report
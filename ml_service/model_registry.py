@@ -0,0 +1,280 @@
+import gc
+import os
+import json
+import time
+import random
+import shutil
+import logging
+import threading
+from pathlib import Path
+
+from similarity_index import index_dir
+
+logger = logging.getLogger(__name__)
+
+MODEL_SUFFIXES = (".h5", ".keras", ".tflite")
+
+
+class ModelRegistry:
+    """
+    Directory of versioned model artifacts.
+
+        registry/
+          CURRENT                  <- name of the version to serve
+          v0001/
+            teeth_disease_model.h5
+            teeth_disease_model.similarity/   (optional, see similarity_index.py)
+            metrics.json
+          v0002/
+            ...
+
+    Versions are published into a temporary directory and renamed into
+    place, so a reader never sees a half-copied artifact. CURRENT is
+    replaced atomically the same way; when it is missing the newest
+    version is served.
+    """
+
+    def __init__(self, root="./models/registry"):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    # ----------------------------------------------------------------------
+    def versions(self):
+        """Published version names, oldest first."""
+        return sorted(p.name for p in self.root.iterdir() if p.is_dir() and p.name.startswith("v"))
+
+    def latest(self):
+        versions = self.versions()
+        return versions[-1] if versions else None
+
+    def current(self):
+        """The version CURRENT points at, else the newest one."""
+        try:
+            version = (self.root / "CURRENT").read_text().strip()
+            if version and (self.root / version).is_dir():
+                return version
+        except OSError:
+            pass
+        return self.latest()
+
+    def resolve(self, version=None):
+        """Map None/'current'/'latest' to a concrete version name."""
+        if version in (None, "", "current"):
+            version = self.current()
+        elif version == "latest":
+            version = self.latest()
+        if version is None or not (self.root / version).is_dir():
+            raise KeyError(f"Unknown model version '{version}'")
+        return version
+
+    def artifact(self, version):
+        """Path of the model file inside `version`."""
+        version_dir = self.root / self.resolve(version)
+        for path in sorted(version_dir.iterdir()):
+            if path.suffix in MODEL_SUFFIXES:
+                return path
+        raise FileNotFoundError(f"No model artifact in {version_dir}")
+
+    def metrics(self, version):
+        try:
+            with open(self.root / self.resolve(version) / "metrics.json", "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def describe(self):
+        current = self.current()
+        return [
+            {"version": v, "artifact": self.artifact(v).name, "current": v == current, "metrics": self.metrics(v)}
+            for v in self.versions()
+        ]
+
+    # ----------------------------------------------------------------------
+    def publish(self, artifact_path, metrics=None, make_current=False):
+        """Copy `artifact_path` (+ metrics) in as the next version; returns its name."""
+        artifact_path = Path(artifact_path)
+        latest = self.latest()
+        version = f"v{(int(latest[1:]) if latest else 0) + 1:04d}"
+
+        tmp = self.root / f".{version}.{os.getpid()}.tmp"
+        tmp.mkdir()
+        try:
+            shutil.copy2(artifact_path, tmp / artifact_path.name)
+            if index_dir(artifact_path).is_dir():
+                shutil.copytree(index_dir(artifact_path), index_dir(tmp / artifact_path.name))
+            with open(tmp / "metrics.json", "w") as f:
+                json.dump({**(metrics or {}), "published_at": time.strftime("%Y-%m-%dT%H:%M:%S")}, f, indent=2)
+            os.rename(tmp, self.root / version)
+        except Exception:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+
+        logger.info(f"Published {artifact_path} as model version {version}")
+        if make_current:
+            self.set_current(version)
+        return version
+
+    def set_current(self, version):
+        version = self.resolve(version)
+        tmp = self.root / f".CURRENT.{os.getpid()}.tmp"
+        tmp.write_text(version + "\n")
+        os.replace(tmp, self.root / "CURRENT")
+        return version
+
+
+# --------------------------------------------------------------------------
+class ModelVersion:
+    """
+    A loaded, warmed model plus its micro-batcher, with a reference count.
+
+    Requests `acquire()` the version they were routed to and `release()` it
+    when their forward pass is done. Once a version is retired (swapped out)
+    and its last request releases it, the batcher thread is stopped and the
+    backend dropped, so nothing holds the model any more and a collection
+    runs at once. TensorFlow keeps freed tensor memory in its allocator's
+    pool for the next model rather than returning it to the OS, so RSS may
+    not drop; keras.backend.clear_session() isn't called, since it resets
+    global state the live versions still use.
+    """
+
+    def __init__(self, name, path, backend, run=None, batcher=None, similarity=None, metrics=None):
+        self.name = name
+        self.path = str(path)
+        self.backend = backend
+        # Forward pass over a stacked batch (the backend's, or an instrumented wrapper)
+        self.run = run or backend.predict
+        self.batcher = batcher
+        # SimilarityIndex matching this model; its outputs then include embeddings
+        self.similarity = similarity
+        # Training metrics saved with the artifact (train_accuracy, val_accuracy, ...)
+        self.metrics = metrics or {}
+        self.loaded_at = time.time()
+        self._refs = 0
+        self._retired = False
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            if self._closed:
+                raise RuntimeError(f"Model version {self.name} has been unloaded")
+            self._refs += 1
+        return self
+
+    def release(self):
+        with self._lock:
+            self._refs -= 1
+            drained = self._retired and self._refs == 0
+        if drained:
+            self._close()
+
+    def retire(self):
+        """Stop taking new work; unload once in-flight requests finish."""
+        with self._lock:
+            self._retired = True
+            drained = self._refs == 0
+        if drained:
+            self._close()
+
+    def _close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        if self.batcher is not None:
+            self.batcher.stop()
+        self.batcher = None
+        self.backend = None
+        self.run = None
+        gc.collect()
+        logger.info(f"♻️ Model version {self.name} drained and unloaded")
+
+    def state(self):
+        with self._lock:
+            return {"version": self.name, "path": self.path, "in_flight": self._refs,
+                    "retired": self._retired, "unloaded": self._closed,
+                    "similarity_index": self.similarity.describe() if self.similarity is not None else None}
+
+
+class ModelRouter:
+    """
+    Routes each request to a live ModelVersion.
+
+    `primary` serves all traffic except the `canary_percent` share sent to
+    `canary`. A `shadow` version receives a copy of `shadow_percent` of
+    requests off the response path; its answers are only compared. Every
+    change is a pointer swap under one lock: requests already holding a
+    version finish on it, new requests see the new routing.
+    """
+
+    def __init__(self):
+        self.primary = None
+        self.canary = None
+        self.canary_percent = 0.0
+        self.shadow = None
+        self.shadow_percent = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """(version, role) for one request; the caller must release() it."""
+        with self._lock:
+            if self.canary is not None and random.random() * 100 < self.canary_percent:
+                return self.canary.acquire(), "canary"
+            if self.primary is None:
+                return None, None
+            return self.primary.acquire(), "primary"
+
+    def acquire_shadow(self):
+        with self._lock:
+            if self.shadow is not None and random.random() * 100 < self.shadow_percent:
+                return self.shadow.acquire()
+        return None
+
+    # ----------------------------------------------------------------------
+    def swap(self, version):
+        """Make `version` primary; the old primary drains and unloads."""
+        with self._lock:
+            old, self.primary = self.primary, version
+            if self.canary is version:
+                self.canary, self.canary_percent = None, 0.0
+            if self.shadow is version:
+                self.shadow, self.shadow_percent = None, 0.0
+        self._retire(old, keep=version)
+        return old
+
+    def set_canary(self, version, percent):
+        with self._lock:
+            old, self.canary = self.canary, version
+            self.canary_percent = float(percent) if version is not None else 0.0
+        self._retire(old, keep=version)
+
+    def set_shadow(self, version, percent):
+        with self._lock:
+            old, self.shadow = self.shadow, version
+            self.shadow_percent = float(percent) if version is not None else 0.0
+        self._retire(old, keep=version)
+
+    def promote_canary(self):
+        """Canary becomes primary (old primary drains). Returns (old primary, promoted)."""
+        with self._lock:
+            canary = self.canary
+        if canary is None:
+            raise KeyError("No canary version to promote")
+        return self.swap(canary), canary
+
+    def _retire(self, old, keep):
+        if old is None or old is keep:
+            return
+        with self._lock:
+            still_routed = old in (self.primary, self.canary, self.shadow)
+        if not still_routed:
+            old.retire()
+
+    # ----------------------------------------------------------------------
+    def state(self):
+        with self._lock:
+            return {
+                "primary": self.primary.state() if self.primary else None,
+                "canary": {**self.canary.state(), "percent": self.canary_percent} if self.canary else None,
+                "shadow": {**self.shadow.state(), "percent": self.shadow_percent} if self.shadow else None,
+            }
@@ -1,16 +1,26 @@
 import os
 import json
 import logging
-from pathlib import Path
+from pathlib import Path, PurePosixPath
 import numpy as np
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import LabelEncoder
 import tensorflow as tf
 from tensorflow import keras
 from tensorflow.keras import layers, models
-from tensorflow.keras.preprocessing.image import ImageDataGenerator
 from PIL import Image
 
+from data_loader import ImageBatchStream, read_image
+from archive_dataset import ArchiveDataset
+from dataset_index import DatasetIndex
+from input_pipeline import BatchAugmenter, InputStallMonitor, make_dataset
+from training_profiler import TrainingProfiler, final_metrics
+from training_checkpoint import resumable_callbacks
+from dataset_cache import CompiledDataset, changed_since, live_entries, trained_set
+from parallel_ingest import ingest_images
+from embedding_cache import EmbeddingCache, build_head_model, split_head
+from inference_backends import CompiledModel
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
@@ -21,6 +31,20 @@ class TeethDiseaseModel:
         self.model = None
         self.label_encoder = LabelEncoder()
         self.class_names = []
+        self.ingest_stats = None
+        self._serving = None
+        # (first, last) global training steps to capture a profiler trace of
+        self.trace_steps = None
+        self.trace_dir = "./logs/profile"
+        # Resumable training: checkpoints per run mode, every epoch or N batches
+        self.checkpoint_dir = self.model_path.parent / "checkpoints"
+        self.checkpoint_freq = "epoch"
+        # Compiled dataset behind the current stream, and the {path: sha1}
+        # images the model was trained on (for incremental fine-tuning)
+        self.dataset = None
+        self.trained_samples = None
+        # class/file name of each sample of the current stream
+        self.sample_names = None
         self.metrics = {
             "train_accuracy": 0,
             "val_accuracy": 0,
@@ -30,8 +54,11 @@ class TeethDiseaseModel:
             "classes": []
         }
 
-    def load_images_from_directory(self, data_dir, img_size=(224, 224)):
-        """Load images from directory structure"""
+    def load_images_from_directory(self, data_dir, img_size=(224, 224), workers=0):
+        """
+        Load images from directory structure.
+        workers > 0 decodes on a process pool (see parallel_ingest.py).
+        """
         images = []
         labels = []
 
@@ -40,31 +67,71 @@ class TeethDiseaseModel:
             logger.error(f"Data directory not found: {data_dir}")
             return None, None
 
-        # Get class directories
-        class_dirs = [d for d in data_path.iterdir() if d.is_dir()]
-        self.class_names = sorted([d.name for d in class_dirs])
+        # Class folders and files from the dataset index (rescans changed folders only)
+        self.class_names, samples = DatasetIndex(data_path).refresh().samples()
         logger.info(f"Found {len(self.class_names)} classes: {self.class_names}")
 
-        for class_idx, class_dir in enumerate(sorted(class_dirs)):
-            image_files = list(class_dir.glob("*.jpg")) + list(class_dir.glob("*.png"))
-            logger.info(f"Loading {len(image_files)} images from {class_dir.name}")
-
-            # Load ALL images (removed 100 limit)
-            for img_path in image_files:
-                try:
-                    img = Image.open(img_path).convert("RGB")
-                    img = img.resize(img_size)
-                    img_array = np.array(img) / 255.0
-                    images.append(img_array)
-                    labels.append(class_idx)
-                except Exception as e:
-                    logger.warning(f"Failed to load {img_path}: {e}")
+        if workers and samples:
+            pixels, kept, self.ingest_stats = ingest_images([p for p, _ in samples], img_size, workers=workers)
+            if len(kept) == 0:
+                logger.error("No images loaded")
+                return None, None
+            all_labels = np.array([label for _, label in samples])
+            return pixels.astype(np.float32) / np.float32(255.0), all_labels[kept]
+
+        # Load ALL images (removed 100 limit)
+        for img_path, class_idx in samples:
+            try:
+                images.append(read_image(img_path, img_size))
+                labels.append(class_idx)
+            except Exception as e:
+                logger.warning(f"Failed to load {img_path}: {e}")
 
         if len(images) == 0:
             logger.error("No images loaded")
             return None, None
 
-        return np.array(images), np.array(labels)
+        # float32, not float64: half the memory of a plain `/ 255.0`
+        return np.array(images, dtype=np.float32) / np.float32(255.0), np.array(labels)
+
+    # -------------------------------------------------------------------------
+    def stream_images_from_directory(self, data_dir, img_size=(224, 224), batch_size=32, cache_dir=None, workers=0):
+        """
+        Lazy, batch-at-a-time alternative to load_images_from_directory.
+        With cache_dir, images come from memory-mapped shards that are
+        refreshed for new/changed files first (see dataset_cache.py).
+        A .zip `data_dir` is read in place, without extracting it
+        (see archive_dataset.py); cache_dir does not apply to it.
+        """
+        data_path = Path(data_dir)
+        if not data_path.exists():
+            logger.error(f"Data directory not found: {data_dir}")
+            return None
+
+        if data_path.suffix == ".zip":
+            archive = ArchiveDataset(data_path)
+            archive.index()
+            stream = archive.stream(batch_size=batch_size, img_size=img_size)
+            self.class_names = stream.class_names
+            self.sample_names = [f"{e['class']}/{PurePosixPath(e['name']).name}" for e in archive.manifest["entries"]]
+        elif cache_dir is not None:
+            dataset = CompiledDataset(data_path, cache_dir, img_size)
+            dataset.compile(workers=workers)
+            stream = dataset.open().stream(batch_size=batch_size)
+            self.dataset = dataset
+            self.class_names = stream.class_names
+            self.sample_names = [e["path"] for e in live_entries(dataset.manifest)]
+        else:
+            self.class_names, samples = DatasetIndex(data_path).refresh().samples()
+            stream = ImageBatchStream(samples, self.class_names, batch_size=batch_size, img_size=img_size)
+            self.sample_names = [path.relative_to(data_path).as_posix() for path, _ in samples]
+        logger.info(f"Found {len(self.class_names)} classes: {self.class_names}")
+
+        if len(stream.samples) == 0:
+            logger.error("No images found")
+            return None
+
+        return stream
 
     # -------------------------------------------------------------------------
     # 🔥 UPDATED: ResNet50 FAST TRAINING MODEL
@@ -114,18 +181,9 @@ class TeethDiseaseModel:
         return self.model
 
     # -------------------------------------------------------------------------
-    def train(self, images, labels, epochs=30, batch_size=32, validation_split=0.2):
-        """Train the model"""
-        if self.model is None:
-            self.build_model(len(np.unique(labels)))
-
-        logger.info("Starting model training...")
-
-        # Enable mixed precision (FASTER GPU training)
-        tf.keras.mixed_precision.set_global_policy("mixed_float16")
-
-        # Data augmentation
-        train_datagen = ImageDataGenerator(
+    def _augmenter(self):
+        """Training-time augmentation (batched, see input_pipeline.py)"""
+        return BatchAugmenter(
             rotation_range=20,
             width_shift_range=0.2,
             height_shift_range=0.2,
@@ -135,13 +193,9 @@ class TeethDiseaseModel:
             fill_mode='nearest'
         )
 
-        # Split data
-        X_train, X_val, y_train, y_val = train_test_split(
-            images, labels, test_size=validation_split, random_state=42
-        )
-
-        # Callbacks
-        callbacks = [
+    def _callbacks(self):
+        """Early stopping + LR schedule shared by all training modes"""
+        return [
             keras.callbacks.EarlyStopping(
                 monitor='val_loss',
                 patience=8,
@@ -155,36 +209,353 @@ class TeethDiseaseModel:
             )
         ]
 
+    # -------------------------------------------------------------------------
+    def _trained_on_dataset(self, train_source, val_source):
+        """Record which compiled-dataset images the model trained and validated on."""
+        if self.dataset is not None and self.dataset.manifest is not None:
+            self.trained_samples = {
+                "train": trained_set(self.dataset.manifest, [key for key, _ in train_source.samples]),
+                "validation": trained_set(self.dataset.manifest, [key for key, _ in val_source.samples]),
+            }
+
+    def _resumable(self, run, callbacks, num_samples):
+        """Checkpoint callbacks for `run`; a stale checkpoint from other settings is dropped."""
+        run_info = {"run": run, "classes": self.class_names, "samples": int(num_samples)}
+        return resumable_callbacks(self.checkpoint_dir / run, callbacks, self.checkpoint_freq, run_info)
+
+    # -------------------------------------------------------------------------
+    def train(self, images, labels=None, epochs=30, batch_size=32, validation_split=0.2, seed=42, run="full",
+              validation=None):
+        """
+        Train the model on arrays, or on an ImageBatchStream (labels=None).
+        A `validation` stream is validated on as is, instead of holding out
+        `validation_split` of the images. Checkpointed under
+        checkpoint_dir/<run>; rerunning after a crash resumes from the last
+        checkpoint.
+        """
+        streaming = isinstance(images, ImageBatchStream)
+        if self.model is None:
+            self.build_model(images.num_classes if streaming else len(np.unique(labels)))
+
+        logger.info("Starting model training...")
+
+        # Enable mixed precision (FASTER GPU training)
+        tf.keras.mixed_precision.set_global_policy("mixed_float16")
+
+        # Split data
+        if validation is not None:
+            train_source, val_source = images, validation
+            train_labels = val_labels = None
+        elif streaming:
+            train_source, val_source = images.split(validation_split, random_state=42)
+            train_labels = val_labels = None
+        else:
+            train_source, val_source, train_labels, val_labels = train_test_split(
+                images, labels, test_size=validation_split, random_state=42
+            )
+
+        # Parallel decode + batched augmentation, prefetched ahead of the model
+        stall_monitor = InputStallMonitor()
+        train_data = make_dataset(
+            train_source, train_labels, batch_size=batch_size, shuffle=True,
+            augmenter=self._augmenter(), seed=seed, monitor=stall_monitor
+        )
+        val_data = make_dataset(val_source, val_labels, batch_size=batch_size)
+
+        # Callbacks (the stall monitor must run before the profiler reads it)
+        callbacks = self._callbacks()
+        profiler = TrainingProfiler(stall_monitor, trace_steps=self.trace_steps, trace_dir=self.trace_dir)
+        callbacks += [stall_monitor, profiler]
+        callbacks += self._resumable(run, callbacks, len(images.samples) if streaming else len(images))
+
         # Train
         history = self.model.fit(
-            train_datagen.flow(X_train, y_train, batch_size=batch_size),
+            train_data,
             epochs=epochs,
+            validation_data=val_data,
+            callbacks=callbacks,
+            verbose=1
+        )
+
+        # Final metrics come from the epochs already run, not extra passes
+        early_stopping = next(c for c in callbacks if isinstance(c, keras.callbacks.EarlyStopping))
+        self.metrics = {
+            **final_metrics(history, early_stopping, profiler),
+            "classes": self.class_names,
+            "training_profile": profiler.report()
+        }
+
+        if streaming:
+            self._trained_on_dataset(train_source, val_source)
+
+        logger.info(f"Training Accuracy: {self.metrics['train_accuracy']:.2f}%")
+        logger.info(f"Validation Accuracy: {self.metrics['val_accuracy']:.2f}%")
+
+        return history
+
+    # -------------------------------------------------------------------------
+    def fine_tune(self, stream, epochs=5, batch_size=32, replay_ratio=1.0, learning_rate=1e-5,
+                  validation_split=0.2, seed=42):
+        """
+        Incremental training of the saved model on new data.
+
+        Starts from the current model file and trains on every image that
+        is new or changed since it was trained (per the compiled dataset
+        manifest), mixed with a random replay sample of `replay_ratio` x as
+        many already-trained images so the old classes aren't forgotten.
+        Validates on the images the model was validated on before, so the
+        numbers stay comparable; records from older runs don't list those,
+        and `validation_split` of the already-seen images is held out instead.
+        Returns the fit history, or None if there is nothing new.
+        """
+        if self.dataset is None:
+            raise ValueError("Fine-tuning needs a compiled dataset stream (stream_images_from_directory with cache_dir)")
+        stream_classes = list(stream.class_names)
+        if not self.load_model():
+            raise FileNotFoundError(f"No model to fine-tune at {self.model_path}")
+        if self.class_names != stream_classes:
+            raise ValueError(f"Classes changed ({self.class_names} -> {stream_classes}); run a full training")
+
+        trained = self._load_trained_samples()
+        if trained is None:
+            raise ValueError(f"No record of the images {self.model_path.name} was trained on; run a full training")
+        changed, seen, held_out = changed_since(self.dataset.manifest, trained["train"], trained["validation"])
+        if not changed:
+            logger.info("No new or changed images since the last training, nothing to fine-tune")
+            return None
+
+        rng = np.random.default_rng(seed)
+        replayable = seen
+        if not held_out:
+            if len(seen) < 2:
+                raise ValueError("No validation images to fine-tune against; run a full training")
+            logger.warning("No recorded validation images; holding out already-seen ones instead")
+            replayable, held_out = train_test_split(seen, test_size=validation_split, random_state=42)
+        replay = rng.choice(replayable, size=min(len(replayable), int(round(replay_ratio * len(changed)))),
+                            replace=False)
+        indices = sorted(changed + [int(i) for i in replay])
+        logger.info(f"Fine-tuning on {len(changed)} new/changed images + {len(replay)} replayed "
+                    f"(of {len(seen)} already seen), validating on {len(held_out)}")
+
+        self.model.compile(
+            optimizer=keras.optimizers.Adam(learning_rate=learning_rate),
+            loss="sparse_categorical_crossentropy",
+            metrics=["accuracy"]
+        )
+        history = self.train(stream.subset(indices), epochs=epochs, batch_size=batch_size, seed=seed,
+                             run="finetune", validation=stream.subset(sorted(held_out), shuffle=False, augmenter=None))
+
+        # The model has now trained on everything it had before plus the new images
+        keys = [key for key, _ in stream.samples]
+        self.trained_samples = {
+            "train": trained_set(self.dataset.manifest, [keys[i] for i in changed + list(replayable)]),
+            "validation": trained_set(self.dataset.manifest, [keys[i] for i in held_out]),
+        }
+        self.metrics.update({
+            "training_mode": "fine_tune",
+            "fine_tune": {
+                "new_or_changed": len(changed),
+                "replayed": len(replay),
+                "previously_seen": len(seen),
+                "validation": len(held_out),
+                "learning_rate": learning_rate,
+            }
+        })
+        return history
+
+    # -------------------------------------------------------------------------
+    def train_head(self, stream, epochs=30, batch_size=32, validation_split=0.2,
+                   augment_variants=2, cache_dir=None):
+        """
+        Head-only training on cached backbone features.
+
+        The frozen ResNet50 runs once per image (and once per fixed
+        augmentation variant); its pooled 2048-d features are cached on
+        disk and every epoch only trains Dropout + Dense. The head layers
+        are shared with self.model, so save_model() writes the full,
+        drop-in compatible network afterwards.
+        """
+        if self.model is None:
+            self.build_model(stream.num_classes)
+
+        feature_model, head_layers = split_head(self.model)
+        cache = EmbeddingCache(cache_dir or self.model_path.parent / "embeddings")
+        train_stream, val_stream = stream.split(validation_split, random_state=42)
+
+        augmenter = self._augmenter()
+        train_parts = [
+            cache.load_or_compute(feature_model, train_stream.subset(batch_size=batch_size), variant, augmenter)
+            for variant in range(augment_variants + 1)
+        ]
+        X_train = np.concatenate([emb for emb, _ in train_parts])
+        y_train = np.concatenate([labels for _, labels in train_parts])
+        X_val, y_val = cache.load_or_compute(feature_model, val_stream.subset(batch_size=batch_size))
+        X_val = np.asarray(X_val)
+
+        head = build_head_model(head_layers, X_train.shape[1])
+        head.compile(
+            optimizer=keras.optimizers.Adam(learning_rate=1e-3),
+            loss="sparse_categorical_crossentropy",
+            metrics=["accuracy"]
+        )
+
+        profiler = TrainingProfiler(samples_per_epoch=len(X_train), trace_steps=self.trace_steps,
+                                    trace_dir=self.trace_dir)
+        callbacks = self._callbacks() + [profiler]
+        # The head model is what fits here; checkpoint it, not self.model
+        callbacks += self._resumable("head", callbacks, len(X_train))
+        logger.info(f"Training head on {len(X_train)} cached embeddings ({augment_variants} augmented variants)...")
+        history = head.fit(
+            X_train, y_train,
+            epochs=epochs,
+            batch_size=batch_size,
             validation_data=(X_val, y_val),
             callbacks=callbacks,
+            shuffle=True,
             verbose=1
         )
 
-        # Evaluate
-        train_loss, train_acc = self.model.evaluate(X_train, y_train, verbose=0)
-        val_loss, val_acc = self.model.evaluate(X_val, y_val, verbose=0)
+        # Final metrics come from the epochs already run, not extra passes
+        early_stopping = next(c for c in callbacks if isinstance(c, keras.callbacks.EarlyStopping))
+        self.metrics = {
+            **final_metrics(history, early_stopping, profiler),
+            "classes": self.class_names,
+            "training_mode": "head_only",
+            "training_profile": profiler.report()
+        }
+        self._trained_on_dataset(train_stream, val_stream)
+
+        logger.info(f"Training Accuracy: {self.metrics['train_accuracy']:.2f}%")
+        logger.info(f"Validation Accuracy: {self.metrics['val_accuracy']:.2f}%")
+
+        return history
+
+    # -------------------------------------------------------------------------
+    def distill(self, stream, student_path, epochs=30, batch_size=32, temperature=4.0, alpha=0.7,
+                width=1.0, learning_rate=1e-4, validation_split=0.2, seed=42, weights="imagenet"):
+        """
+        Knowledge distillation into a MobileNetV2 student.
+
+        The saved ResNet50 model is the teacher: its class probabilities
+        for the training split are computed once and cached next to the
+        embeddings, then the student trains on a blend of the softened
+        teacher distribution and the true label (see distillation.py),
+        with the usual batched augmentation. Validation uses the true
+        labels on the same held-out split as train().
+
+        Afterwards self.model is the student and save_model() writes it to
+        `student_path`, with the same input and softmax output as the
+        teacher, so app.py serves it as MODEL_PATH unchanged. The metrics
+        include a teacher vs student report of accuracy, size and latency.
+        """
+        from distillation import (build_student, compare_models, distillation_targets,
+                                  teacher_soft_labels, to_serving_input)
+
+        stream_classes = list(stream.class_names)
+        if not self.load_model():
+            raise FileNotFoundError(f"No teacher model at {self.model_path}")
+        if self.class_names != stream_classes:
+            raise ValueError(f"Classes changed ({self.class_names} -> {stream_classes}); retrain the teacher first")
+        teacher, teacher_path = self.model, self.model_path
+
+        train_stream, val_stream = stream.split(validation_split, random_state=42)
+        teacher_probs, ok = teacher_soft_labels(
+            teacher, train_stream, teacher_path.parent / "embeddings", batch_size=batch_size
+        )
+        labels = train_stream.labels
+        targets = distillation_targets(teacher_probs, labels, temperature, alpha)
+        teacher_train_acc = float((teacher_probs[ok].argmax(1) == labels[ok]).mean() * 100)
+        logger.info(f"Teacher agrees with {teacher_train_acc:.2f}% of training labels")
+
+        # Labels become row numbers into the target table
+        indexed = train_stream.subset()
+        indexed.samples = [(key, i) for i, (key, _) in enumerate(train_stream.samples)]
+        target_table = tf.constant(targets)
+        num_classes = len(stream_classes)
+
+        stall_monitor = InputStallMonitor()
+        train_data = make_dataset(
+            indexed, batch_size=batch_size, shuffle=True, augmenter=self._augmenter(), seed=seed,
+            monitor=stall_monitor, map_fn=lambda x, i: (to_serving_input(x), tf.gather(target_table, i))
+        )
+        val_data = make_dataset(
+            val_stream, batch_size=batch_size,
+            map_fn=lambda x, y: (to_serving_input(x), tf.one_hot(y, num_classes))
+        )
+
+        # train() may have left mixed_float16 set, which is several times slower on CPU
+        tf.keras.mixed_precision.set_global_policy(
+            "mixed_float16" if tf.config.list_physical_devices("GPU") else "float32"
+        )
+        logger.info(f"Building MobileNetV2 student (width {width})...")
+        student = build_student(num_classes, width=width, weights=weights)
+        student.compile(
+            optimizer=keras.optimizers.Adam(learning_rate=learning_rate),
+            loss="categorical_crossentropy",
+            metrics=["accuracy"]
+        )
+
+        callbacks = self._callbacks()
+        profiler = TrainingProfiler(stall_monitor, trace_steps=self.trace_steps, trace_dir=self.trace_dir)
+        callbacks += [stall_monitor, profiler]
+        callbacks += self._resumable("distill", callbacks, len(train_stream.samples))
+
+        logger.info(f"Distilling into student (T={temperature}, alpha={alpha})...")
+        history = student.fit(
+            train_data,
+            epochs=epochs,
+            validation_data=val_data,
+            callbacks=callbacks,
+            verbose=1
+        )
 
+        early_stopping = next(c for c in callbacks if isinstance(c, keras.callbacks.EarlyStopping))
+        report = compare_models({"teacher": (teacher, teacher_path), "student": (student, None)}, val_stream)
         self.metrics = {
-            "train_accuracy": float(train_acc * 100),
-            "val_accuracy": float(val_acc * 100),
-            "train_loss": float(train_loss),
-            "val_loss": float(val_loss),
+            # train_accuracy is against the blended targets' top class
+            **final_metrics(history, early_stopping, profiler),
             "classes": self.class_names,
-            "epochs_trained": epochs
+            "training_mode": "distill",
+            "distillation": {
+                "teacher_path": str(teacher_path),
+                "student_backbone": f"MobileNetV2 (width {width})",
+                "temperature": temperature,
+                "alpha": alpha,
+                "teacher_train_label_agreement": round(teacher_train_acc, 2),
+                **report,
+            },
+            "training_profile": profiler.report()
         }
 
-        logger.info(f"Training Accuracy: {train_acc*100:.2f}%")
-        logger.info(f"Validation Accuracy: {val_acc*100:.2f}%")
+        self.model = student
+        self.model_path = Path(student_path)
+        self.model_path.parent.mkdir(parents=True, exist_ok=True)
+        self._trained_on_dataset(train_stream, val_stream)
 
+        logger.info(f"Student Validation Accuracy: {self.metrics['val_accuracy']:.2f}%")
         return history
 
     # -------------------------------------------------------------------------
-    def save_model(self):
-        """Save model to disk"""
+    @property
+    def trained_samples_path(self):
+        return self.model_path.with_name(f"{self.model_path.stem}_samples.json")
+
+    def _load_trained_samples(self):
+        try:
+            with open(self.trained_samples_path, 'r') as f:
+                samples = json.load(f)
+        except (OSError, ValueError):
+            return None
+        # Older records are a flat {path: sha1} of every image, validation included
+        if "train" not in samples:
+            samples = {"train": samples, "validation": {}}
+        return samples
+
+    def save_model(self, registry_dir=None, make_current=False):
+        """
+        Save model to disk; with `registry_dir`, also publish it there as a
+        new version that a running service can hot-swap to.
+        """
         if self.model is not None:
             self.model.save(self.model_path)
             logger.info(f"Model saved to {self.model_path}")
@@ -195,6 +566,60 @@ class TeethDiseaseModel:
                 json.dump(self.metrics, f, indent=2)
             logger.info(f"Metrics saved to {metrics_path}")
 
+            # Which images this model has seen, for the next incremental fine-tune
+            if self.trained_samples is not None:
+                with open(self.trained_samples_path, 'w') as f:
+                    json.dump(self.trained_samples, f)
+
+            if registry_dir:
+                from model_registry import ModelRegistry
+
+                version = ModelRegistry(registry_dir).publish(
+                    self.model_path, metrics=self.metrics, make_current=make_current
+                )
+                self.metrics["registry_version"] = version
+                return version
+
+    # -------------------------------------------------------------------------
+    def export(self, stream, calibration_samples=200, validation_split=0.2):
+        """
+        Export optimized CPU inference artifacts next to the .h5:
+        float32 and int8 (post-training quantized) TFLite models, plus a
+        report of their accuracy delta vs. Keras on the validation split.
+        """
+        if self.model is None:
+            logger.error("Model not loaded")
+            return None
+
+        from model_export import export_model
+
+        report = export_model(
+            self.model, stream, self.model_path.parent,
+            name=self.model_path.stem,
+            validation_split=validation_split,
+            calibration_samples=calibration_samples,
+        )
+        self.metrics["export"] = report
+        return report
+
+    # -------------------------------------------------------------------------
+    def build_similarity_index(self, stream, dtype="int8", nlist=0):
+        """
+        Similar-case index over `stream` for the loaded model, saved next to
+        the .h5 (`<model>.similarity/`, see similarity_index.py), where
+        app.py picks it up to list the closest training images in reports.
+        """
+        if self.model is None:
+            logger.error("Model not loaded")
+            return None
+
+        from similarity_index import build_index, index_dir, SimilarityIndex
+
+        path = build_index(self.model, stream, index_dir(self.model_path), names=self.sample_names,
+                           dtype=dtype, nlist=nlist)
+        self.metrics["similarity_index"] = SimilarityIndex(path).describe()
+        return path
+
     # -------------------------------------------------------------------------
     def load_model(self):
         """Load model from disk"""
@@ -234,8 +659,10 @@ class TeethDiseaseModel:
         if image_array.max() > 1.0:
             image_array = image_array / 255.0
 
-        # Predict
-        predictions = self.model.predict(image_array, verbose=0)
+        # Predict through a compiled call; rebuilt if the model was replaced
+        if self._serving is None or self._serving.model is not self.model:
+            self._serving = CompiledModel(self.model)
+        predictions = self._serving(image_array)
         predicted_class_idx = np.argmax(predictions[0])
         confidence = float(predictions[0][predicted_class_idx] * 100)
 
@@ -254,16 +681,92 @@ class TeethDiseaseModel:
 
 # -------------------------------------------------------------------------
 if __name__ == "__main__":
-    model = TeethDiseaseModel()
-
-    # Load images
-    data_dir = "./data"
-    images, labels = model.load_images_from_directory(data_dir)
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Train the teeth disease classifier")
+    parser.add_argument("--mode", choices=["full", "head", "finetune", "distill", "export", "similarity"],
+                        default="full",
+                        help="full: train through the backbone every epoch; "
+                             "head: cache frozen-backbone embeddings and train only the head; "
+                             "finetune: continue the saved model on new/changed images plus a replay sample; "
+                             "distill: train a MobileNetV2 student on the saved model's soft labels; "
+                             "export: export the saved model to TFLite (fp32 + int8); "
+                             "similarity: index the saved model's embeddings of the dataset for similar-case lookup")
+    parser.add_argument("--data", default="./data",
+                        help="class-per-folder dataset directory, or a dataset .zip read without extracting")
+    parser.add_argument("--epochs", type=int, help="default: 30, or 5 for finetune")
+    parser.add_argument("--replay-ratio", type=float, default=1.0,
+                        help="finetune: already-seen images replayed per new/changed image")
+    parser.add_argument("--finetune-lr", type=float, default=1e-5)
+    parser.add_argument("--student-path", default="./models/student/teeth_disease_model.h5",
+                        help="distill: where the student model (and its metrics.json) is saved")
+    parser.add_argument("--student-width", type=float, default=1.0, help="distill: MobileNetV2 width multiplier")
+    parser.add_argument("--temperature", type=float, default=4.0, help="distill: teacher softening temperature")
+    parser.add_argument("--distill-alpha", type=float, default=0.7,
+                        help="distill: weight of the teacher distribution vs the true label")
+    parser.add_argument("--checkpoint-steps", type=int,
+                        help="checkpoint every N batches instead of every epoch")
+    parser.add_argument("--fresh", action="store_true",
+                        help="discard checkpoints of an interrupted run instead of resuming it")
+    parser.add_argument("--augment-variants", type=int, default=2,
+                        help="augmented embedding passes per image in head mode")
+    parser.add_argument("--export", action="store_true", help="also export TFLite artifacts after training")
+    parser.add_argument("--calibration-samples", type=int, default=200)
+    parser.add_argument("--index-dtype", choices=["int8", "float16"], default="int8",
+                        help="similarity: storage type of the embedding matrix")
+    parser.add_argument("--index-lists", type=int, default=0,
+                        help="similarity: k-means lists for an approximate (IVF) index; 0 = exact search")
+    parser.add_argument("--profile-steps", help="capture a TensorFlow profiler trace of steps FIRST,LAST")
+    parser.add_argument("--profile-dir", default="./logs/profile")
+    parser.add_argument("--registry", default=os.getenv("MODEL_REGISTRY_DIR", ""),
+                        help="also publish the saved model as a new version in this registry")
+    parser.add_argument("--make-current", action="store_true",
+                        help="point the registry's CURRENT at the new version (services polling it swap)")
+    args = parser.parse_args()
 
-    if images is not None:
-        # Build and train
-        model.build_model(len(np.unique(labels)))
-        model.train(images, labels, epochs=30)
-        model.save_model()
+    model = TeethDiseaseModel()
+    if args.checkpoint_steps:
+        model.checkpoint_freq = args.checkpoint_steps
+    if args.fresh:
+        import shutil
+        shutil.rmtree(model.checkpoint_dir, ignore_errors=True)
+    if args.profile_steps:
+        model.trace_steps = tuple(int(s) for s in args.profile_steps.split(","))
+        model.trace_dir = args.profile_dir
+
+    # Stream images batch by batch (memory independent of dataset size),
+    # decoded once into ./data_cache and memory-mapped on later runs
+    stream = model.stream_images_from_directory(args.data, cache_dir="./data_cache", workers=os.cpu_count())
+
+    if stream is not None and args.mode == "export":
+        if model.load_model():
+            model.export(stream, calibration_samples=args.calibration_samples)
+            model.save_model()
+    elif stream is not None and args.mode == "similarity":
+        if model.load_model():
+            model.build_similarity_index(stream, dtype=args.index_dtype, nlist=args.index_lists)
+            model.save_model(registry_dir=args.registry or None, make_current=args.make_current)
+    elif stream is not None and args.mode == "finetune":
+        if model.fine_tune(stream, epochs=args.epochs or 5, replay_ratio=args.replay_ratio,
+                           learning_rate=args.finetune_lr) is not None:
+            model.save_model(registry_dir=args.registry or None, make_current=args.make_current)
+            print(f"Metrics: {json.dumps(model.metrics, indent=2)}")
+    elif stream is not None and args.mode == "distill":
+        model.distill(stream, args.student_path, epochs=args.epochs or 30, temperature=args.temperature,
+                      alpha=args.distill_alpha, width=args.student_width)
+        if args.export:
+            model.export(stream, calibration_samples=args.calibration_samples)
+        model.save_model(registry_dir=args.registry or None, make_current=args.make_current)
+        print(f"Teacher vs student: {json.dumps(model.metrics['distillation']['models'], indent=2)}")
+    elif stream is not None:
+        # Build and train (resumes an interrupted run of the same mode)
+        model.build_model(stream.num_classes)
+        if args.mode == "head":
+            model.train_head(stream, epochs=args.epochs or 30, augment_variants=args.augment_variants)
+        else:
+            model.train(stream, epochs=args.epochs or 30)
+        if args.export:
+            model.export(stream, calibration_samples=args.calibration_samples)
+        model.save_model(registry_dir=args.registry or None, make_current=args.make_current)
         print("Training complete!")
         print(f"Metrics: {json.dumps(model.metrics, indent=2)}")
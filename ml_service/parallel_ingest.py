@@ -0,0 +1,106 @@
+import os
+import time
+import logging
+import multiprocessing as mp
+from multiprocessing import shared_memory
+
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# Set in each worker by _init_worker
+_worker_shm = None
+_worker_images = None
+
+
+def _init_worker(shm_name, shape):
+    """Attach the worker to the parent's shared image buffer."""
+    global _worker_shm, _worker_images
+    _worker_shm = shared_memory.SharedMemory(name=shm_name)
+    _worker_images = np.ndarray(shape, dtype=np.uint8, buffer=_worker_shm.buf)
+
+
+def _decode_chunk(task):
+    """Decode paths[start:start+n] straight into their shared-memory rows."""
+    start, paths, img_size = task
+    began = time.perf_counter()
+    failures = []
+    for offset, path in enumerate(paths):
+        try:
+            img = Image.open(path).convert("RGB")
+            img = img.resize(img_size)
+            _worker_images[start + offset] = np.asarray(img)
+        except Exception as e:
+            failures.append((start + offset, str(path), str(e)))
+    return os.getpid(), len(paths) - len(failures), failures, time.perf_counter() - began
+
+
+def ingest_images(paths, img_size=(224, 224), workers=None, chunk_size=32):
+    """
+    Decode + resize `paths` on a process pool.
+
+    Workers write pixels directly into one shared-memory uint8 buffer, so
+    only small (index, error) tuples cross the process boundary. Row `i`
+    of the result always belongs to `paths[i]`; files that fail are logged
+    and dropped from the returned arrays, exactly like the serial loader.
+
+    Returns (images, kept_indices, stats) where `images` is a uint8 array
+    of shape (len(kept_indices), H, W, 3) and `stats` has per-worker and
+    total throughput.
+    """
+    workers = workers or os.cpu_count() or 1
+    shape = (len(paths), img_size[1], img_size[0], 3)
+    if len(paths) == 0:
+        return np.empty(shape, dtype=np.uint8), np.empty(0, dtype=np.int64), {"workers": {}}
+
+    shm = shared_memory.SharedMemory(create=True, size=int(np.prod(shape)))
+    try:
+        tasks = [
+            (start, [str(p) for p in paths[start:start + chunk_size]], tuple(img_size))
+            for start in range(0, len(paths), chunk_size)
+        ]
+
+        began = time.perf_counter()
+        per_worker = {}
+        failed = []
+        # Workers only touch PIL/numpy, so forking is safe even after
+        # TensorFlow is imported (as with keras' own multiprocessing
+        # loaders) and avoids re-importing __main__ in every worker
+        ctx = mp.get_context("fork" if "fork" in mp.get_all_start_methods() else "spawn")
+        with ctx.Pool(processes=workers, initializer=_init_worker, initargs=(shm.name, shape)) as pool:
+            for pid, n_ok, failures, seconds in pool.imap_unordered(_decode_chunk, tasks):
+                stats = per_worker.setdefault(pid, {"images": 0, "seconds": 0.0})
+                stats["images"] += n_ok
+                stats["seconds"] += seconds
+                failed.extend(failures)
+        elapsed = time.perf_counter() - began
+
+        for _, path, error in sorted(failed):
+            logger.warning(f"Failed to load {path}: {error}")
+
+        keep = np.ones(len(paths), dtype=bool)
+        keep[[idx for idx, _, _ in failed]] = False
+        kept_indices = np.flatnonzero(keep)
+
+        # One copy out of shared memory, in the original order
+        images = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)[kept_indices]
+    finally:
+        shm.close()
+        shm.unlink()
+
+    for stats in per_worker.values():
+        stats["images_per_sec"] = round(stats["images"] / stats["seconds"], 1) if stats["seconds"] else 0.0
+    for i, (pid, stats) in enumerate(sorted(per_worker.items())):
+        logger.info(f"Worker {i} (pid {pid}): {stats['images']} images, {stats['images_per_sec']} img/s")
+
+    total = {
+        "workers": per_worker,
+        "images": len(kept_indices),
+        "failed": len(failed),
+        "seconds": round(elapsed, 3),
+        "images_per_sec": round(len(kept_indices) / elapsed, 1) if elapsed else 0.0,
+    }
+    logger.info(f"Ingested {total['images']} images with {workers} workers in {total['seconds']}s "
+                f"({total['images_per_sec']} img/s)")
+    return images, kept_indices, total
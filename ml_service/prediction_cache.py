@@ -0,0 +1,280 @@
+import os
+import json
+import time
+import hashlib
+import shutil
+import logging
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class PredictionCache:
+    """
+    Content-addressed cache of model outputs: one prediction vector, or a
+    tuple of arrays (probabilities + embedding for a model with a
+    similarity index).
+
+    Entries are keyed either by a hash of the raw upload bytes or by a hash
+    of the decoded 224x224 pixel buffer, so the same photo re-encoded by a
+    client still hits. The in-memory tier is an LRU bounded by
+    `max_entries`; every entry also expires after `ttl_seconds`.
+
+    If `disk_dir` is set, entries are mirrored to small JSON files there so
+    several workers on one host can share them. All entries are tied to the
+    current model file: when `model_path` changes on disk the cache is
+    dropped and the disk entries of other model versions are deleted.
+    Every `prune_interval` seconds a background pass deletes expired disk
+    entries and then the oldest ones beyond `disk_max_entries`.
+    """
+
+    def __init__(self, max_entries=1024, ttl_seconds=3600, disk_dir=None, model_path=None,
+                 check_interval=2.0, disk_max_entries=50000, prune_interval=300.0):
+        self.max_entries = max(1, int(max_entries))
+        self.ttl = float(ttl_seconds)
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        self.model_path = model_path
+        self.check_interval = check_interval
+        self.disk_max_entries = max(1, int(disk_max_entries))
+        self.prune_interval = float(prune_interval)
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._model_version = self._read_model_version()
+        self._last_check = time.monotonic()
+        self._last_prune = float("-inf")
+        self._pruning = False
+        self._stats = {"hits_raw": 0, "hits_pixel": 0, "hits_disk": 0, "misses": 0,
+                       "evictions": 0, "invalidations": 0, "disk_evictions": 0}
+
+        if self.disk_dir is not None:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+
+    # ----------------------------------------------------------------------
+    @staticmethod
+    def raw_key(data):
+        """Key for the raw uploaded bytes."""
+        return "raw-" + hashlib.blake2b(data, digest_size=16).hexdigest()
+
+    @staticmethod
+    def pixel_key(pixels):
+        """Key for a decoded uint8 pixel buffer."""
+        digest = hashlib.blake2b(np.ascontiguousarray(pixels).data, digest_size=16)
+        digest.update(str(pixels.shape).encode())
+        return "px-" + digest.hexdigest()
+
+    # ----------------------------------------------------------------------
+    def get(self, key):
+        """Return the cached prediction for `key`, or None."""
+        self._check_model()
+        now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, preds = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self._stats["hits_pixel" if key.startswith("px-") else "hits_raw"] += 1
+                    return preds
+                del self._entries[key]
+
+        preds = self._disk_get(key, now)
+        with self._lock:
+            if preds is not None:
+                self._stats["hits_disk"] += 1
+                self._store(key, preds, now)
+            else:
+                self._stats["misses"] += 1
+        return preds
+
+    # ----------------------------------------------------------------------
+    def put(self, key, preds):
+        """Cache the model output `preds` (array or tuple of arrays) under `key`."""
+        if isinstance(preds, (list, tuple)):
+            preds = tuple(np.asarray(p, dtype=np.float32) for p in preds)
+        else:
+            preds = np.asarray(preds, dtype=np.float32)
+        now = time.time()
+        with self._lock:
+            self._store(key, preds, now)
+        self._disk_put(key, preds, now)
+
+    # ----------------------------------------------------------------------
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def use_model(self, model_path):
+        """Follow a different model file (after a hot swap); drops all entries."""
+        self.model_path = model_path
+        version = self._read_model_version()
+        with self._lock:
+            self._entries.clear()
+            self._stats["invalidations"] += 1
+        self._model_version = version
+        self._last_check = time.monotonic()
+        self._drop_other_versions_async()
+
+    # ----------------------------------------------------------------------
+    def stats(self):
+        """Hit/miss counters for the health endpoint."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+        lookups = stats["hits_raw"] + stats["hits_pixel"] + stats["hits_disk"] + stats["misses"]
+        stats["hit_rate"] = round((lookups - stats["misses"]) / lookups, 4) if lookups else 0.0
+        stats["disk"] = str(self.disk_dir) if self.disk_dir else None
+        return stats
+
+    # ----------------------------------------------------------------------
+    def _store(self, key, preds, now):
+        self._entries[key] = (now + self.ttl, preds)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    # ----------------------------------------------------------------------
+    def _read_model_version(self):
+        """Fingerprint of the model file (mtime + size)."""
+        if not self.model_path:
+            return "none"
+        try:
+            st = os.stat(self.model_path)
+        except OSError:
+            return "missing"
+        return f"{st.st_mtime_ns:x}-{st.st_size:x}"
+
+    def _check_model(self):
+        """Drop every entry if the model file changed since the last check."""
+        now = time.monotonic()
+        if now - self._last_check < self.check_interval:
+            return
+        self._last_check = now
+
+        version = self._read_model_version()
+        if version != self._model_version:
+            logger.info(f"Model file changed ({self._model_version} -> {version}), clearing prediction cache")
+            with self._lock:
+                self._entries.clear()
+                self._stats["invalidations"] += 1
+            self._model_version = version
+            self._drop_other_versions_async()
+
+    # ----------------------------------------------------------------------
+    def _disk_path(self, key):
+        return self.disk_dir / self._model_version / key[-2:] / f"{key}.json"
+
+    def _disk_get(self, key, now):
+        if self.disk_dir is None:
+            return None
+        path = self._disk_path(key)
+        try:
+            with open(path, "r") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if entry.get("expires_at", 0) <= now:
+            path.unlink(missing_ok=True)
+            return None
+        if "outputs" in entry:
+            return tuple(np.asarray(p, dtype=np.float32) for p in entry["outputs"])
+        return np.asarray(entry["preds"], dtype=np.float32)
+
+    def _disk_put(self, key, preds, now):
+        if self.disk_dir is None:
+            return
+        path = self._disk_path(key)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+            with open(tmp, "w") as f:
+                if isinstance(preds, tuple):
+                    json.dump({"expires_at": now + self.ttl, "outputs": [p.tolist() for p in preds]}, f)
+                else:
+                    json.dump({"expires_at": now + self.ttl, "preds": preds.tolist()}, f)
+            os.replace(tmp, path)  # atomic, so readers never see a partial file
+        except OSError as e:
+            logger.warning(f"Could not write cache entry {key}: {e}")
+        self._maybe_prune()
+
+    # ----------------------------------------------------------------------
+    def _maybe_prune(self):
+        """Start a background prune of the disk tier if one is due."""
+        now = time.monotonic()
+        with self._lock:
+            if self._pruning or now - self._last_prune < self.prune_interval:
+                return
+            self._pruning = True
+            self._last_prune = now
+        threading.Thread(target=self.prune_disk, name="cache-prune", daemon=True).start()
+
+    def prune_disk(self):
+        """
+        Delete expired disk entries (of any model version) and leftover
+        temp files, then the oldest entries beyond `disk_max_entries`.
+        A file's mtime is its write time, so nothing needs to be opened.
+        """
+        try:
+            now = time.time()
+            live, removed = [], 0
+            for path in self.disk_dir.glob("*/*/*"):
+                try:
+                    mtime = path.stat().st_mtime
+                except OSError:
+                    continue
+                if mtime + self.ttl <= now:
+                    path.unlink(missing_ok=True)
+                    removed += 1
+                elif path.suffix == ".json":
+                    live.append((mtime, path))
+
+            excess = len(live) - self.disk_max_entries
+            if excess > 0:
+                live.sort(key=lambda item: item[0])
+                for _, path in live[:excess]:
+                    path.unlink(missing_ok=True)
+                removed += excess
+
+            # Empty bucket directories, and version directories left empty
+            for bucket in self.disk_dir.glob("*/*"):
+                _rmdir_if_empty(bucket)
+            for version_dir in self.disk_dir.iterdir():
+                if version_dir.name != self._model_version:
+                    _rmdir_if_empty(version_dir)
+
+            with self._lock:
+                self._stats["disk_evictions"] += removed
+            if removed:
+                logger.info(f"Pruned {removed} prediction cache files from {self.disk_dir}")
+        except OSError as e:
+            logger.warning(f"Could not prune prediction cache {self.disk_dir}: {e}")
+        finally:
+            with self._lock:
+                self._pruning = False
+
+    def _drop_other_versions_async(self):
+        """_drop_other_versions on a background thread; it can delete many files."""
+        if self.disk_dir is not None:
+            threading.Thread(target=self._drop_other_versions, name="cache-drop", daemon=True).start()
+
+    def _drop_other_versions(self):
+        """Delete the disk entries of every model version but the current one."""
+        stale = [p for p in self.disk_dir.iterdir() if p.is_dir() and p.name != self._model_version]
+        for path in stale:
+            shutil.rmtree(path, ignore_errors=True)
+        if stale:
+            logger.info(f"Deleted prediction cache entries of {len(stale)} old model version(s)")
+
+
+def _rmdir_if_empty(path):
+    try:
+        path.rmdir()
+    except OSError:
+        pass
@@ -0,0 +1,186 @@
+import logging
+import threading
+
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+IMG_SIZE = (224, 224)
+
+# Per-channel ImageNet means in BGR order ("caffe" mode of keras preprocess_input)
+RESNET_MEAN_BGR = np.array([103.939, 116.779, 123.68], dtype=np.float32)
+
+# Accepted deviation from the full-decode reference (in preprocessed units,
+# i.e. 8-bit pixel levels). Non-JPEG inputs must match exactly.
+DRAFT_MAX_ABS_TOLERANCE = 8.0
+DRAFT_MEAN_ABS_TOLERANCE = 1.0
+
+# Test-time augmentation views, in the order they are used: the plain
+# image always comes first, so a request using k views gets the first k
+TTA_VIEWS = ("plain", "flip", "center", "flip_center", "top_left", "top_right", "bottom_left", "bottom_right")
+# Side of the cropped views relative to the image
+TTA_CROP = 0.875
+
+
+class ImagePreprocessor:
+    """
+    Decode + ResNet50 preprocessing for the serving hot loop.
+
+    JPEGs are decoded with `Image.draft`, which lets libjpeg scale the DCT
+    down by 1/2, 1/4 or 1/8 while decoding, so a 12MP phone photo is never
+    materialised at full size. The final resize, RGB->BGR swap and mean
+    subtraction write straight into caller-provided (or per-thread scratch)
+    buffers instead of allocating new arrays at every step.
+
+    The result matches `keras.applications.resnet50.preprocess_input` on a
+    full-resolution decode up to the small resampling difference that draft
+    decoding introduces; see `compare_with_reference`.
+    """
+
+    def __init__(self, size=IMG_SIZE, draft=True):
+        self.size = tuple(size)
+        self.draft = draft
+        self.shape = (self.size[1], self.size[0], 3)
+        self._local = threading.local()
+
+    # ----------------------------------------------------------------------
+    def scratch(self):
+        """
+        Reusable (uint8, float32) buffers owned by the calling thread.
+
+        Only valid until the same thread preprocesses its next image.
+        """
+        bufs = getattr(self._local, "bufs", None)
+        if bufs is None:
+            bufs = (np.empty(self.shape, dtype=np.uint8), np.empty(self.shape, dtype=np.float32))
+            self._local.bufs = bufs
+        return bufs
+
+    # ----------------------------------------------------------------------
+    def decode(self, fp, out=None):
+        """Decode an image file into a resized uint8 (H, W, 3) array."""
+        return self.resize(self.open(fp), out=out)
+
+    # ----------------------------------------------------------------------
+    def open(self, fp):
+        """Decode an image file to RGB, at draft size for JPEGs."""
+        img = Image.open(fp)
+        if self.draft and img.format == "JPEG":
+            # Reduced-size DCT decode, never smaller than the target size
+            img.draft("RGB", self.size)
+        return img.convert("RGB")
+
+    # ----------------------------------------------------------------------
+    def resize(self, img, out=None):
+        """Resize a decoded RGB image into a uint8 (H, W, 3) array."""
+        if img.size != self.size:
+            img = img.resize(self.size)
+
+        if out is None:
+            return np.array(img)
+        np.copyto(out, np.asarray(img))
+        return out
+
+    # ----------------------------------------------------------------------
+    def preprocess(self, pixels, out=None):
+        """
+        ResNet50 ("caffe") preprocessing of a uint8 image.
+
+        RGB->BGR, cast to float32 and mean subtraction in a single pass.
+        """
+        if out is None:
+            out = np.empty(pixels.shape, dtype=np.float32)
+        np.subtract(pixels[..., ::-1], RESNET_MEAN_BGR, out=out, dtype=np.float32)
+        return out
+
+    # ----------------------------------------------------------------------
+    def load(self, fp, out=None):
+        """Decode + preprocess, using this thread's uint8 scratch buffer."""
+        pixels = self.decode(fp, out=self.scratch()[0])
+        return self.preprocess(pixels, out=out)
+
+    # ----------------------------------------------------------------------
+    def tta_batch(self, pixels, views, start=0):
+        """
+        Preprocessed (len, H, W, 3) batch of TTA_VIEWS[start:views] of an
+        already decoded and resized uint8 image: horizontal flips and
+        TTA_CROP crops (centre, then corners) scaled back to full size.
+        """
+        names = TTA_VIEWS[start:views]
+        batch = np.empty((len(names),) + self.shape, dtype=np.float32)
+        img = None
+        h, w = self.shape[:2]
+        ch, cw = int(round(h * TTA_CROP)), int(round(w * TTA_CROP))
+        boxes = {
+            "center": ((w - cw) // 2, (h - ch) // 2),
+            "top_left": (0, 0),
+            "top_right": (w - cw, 0),
+            "bottom_left": (0, h - ch),
+            "bottom_right": (w - cw, h - ch),
+        }
+        for i, name in enumerate(names):
+            view = pixels
+            if name.endswith("center") or name in boxes:
+                if img is None:
+                    img = Image.fromarray(pixels)
+                left, top = boxes["center" if name.endswith("center") else name]
+                view = np.asarray(img.crop((left, top, left + cw, top + ch)).resize(self.size))
+            if name.startswith("flip"):
+                view = view[:, ::-1]
+            self.preprocess(view, out=batch[i])
+        return batch
+
+
+# --------------------------------------------------------------------------
+def reference_preprocess(fp, size=IMG_SIZE):
+    """The original full-decode path, kept for equivalence checks."""
+    from keras.applications.resnet50 import preprocess_input
+
+    img = Image.open(fp).convert("RGB")
+    img = img.resize(size)
+    arr = np.array(img, dtype=np.float32)
+    return preprocess_input(arr)
+
+
+def compare_with_reference(fp, preprocessor=None):
+    """Max / mean absolute difference between the fast and reference paths."""
+    preprocessor = preprocessor or ImagePreprocessor()
+    fp.seek(0)
+    fast = preprocessor.load(fp)
+    fp.seek(0)
+    ref = reference_preprocess(fp, preprocessor.size)
+    diff = np.abs(fast - ref)
+    return {"max_abs_diff": float(diff.max()), "mean_abs_diff": float(diff.mean())}
+
+
+# --------------------------------------------------------------------------
+if __name__ == "__main__":
+    import time
+    from io import BytesIO
+
+    # Smooth synthetic "photo" at phone resolution
+    h, w = 3024, 4032
+    yy, xx = np.mgrid[0:h, 0:w].astype(np.float32)
+    photo = np.stack([
+        127 + 100 * np.sin(xx / 180.0),
+        127 + 100 * np.cos(yy / 240.0),
+        127 + 100 * np.sin((xx + yy) / 300.0),
+    ], axis=-1).astype(np.uint8)
+
+    preprocessor = ImagePreprocessor()
+    for fmt in ("JPEG", "PNG"):
+        buf = BytesIO()
+        Image.fromarray(photo).save(buf, fmt, quality=90)
+        result = compare_with_reference(buf, preprocessor)
+
+        timings = {}
+        for name, fn in (("fast", preprocessor.load), ("reference", reference_preprocess)):
+            start = time.perf_counter()
+            for _ in range(5):
+                buf.seek(0)
+                fn(buf)
+            timings[name] = round((time.perf_counter() - start) / 5 * 1000, 1)
+
+        # The tolerances are asserted in tests/test_preprocessing.py
+        print(f"{fmt}: {result}, ms/image: {timings}")
@@ -0,0 +1,165 @@
+"""
+Pre-fork production server for the ML service.
+
+The parent binds the listening socket once and forks N workers that all
+accept on it. With the TFLite backend the parent also reads the model
+artifact into memory before forking, so every worker's interpreter runs on
+the same copy-on-write pages instead of its own copy of the weights.
+
+TensorFlow itself is never initialised in the parent: its thread pools do
+not survive fork(), so the Keras backend is loaded inside each worker.
+
+    python serve.py --workers 4 --port 5000
+"""
+import os
+import sys
+import time
+import signal
+import socket
+import logging
+import argparse
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("serve")
+
+
+def read_memory(pid):
+    """RSS / PSS of `pid` in MB from /proc (Linux only)."""
+    mem = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup", "r") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key in ("Rss", "Pss"):
+                    mem[key.lower() + "_mb"] = round(int(value.split()[0]) / 1024, 1)
+    except OSError:
+        pass
+    return mem
+
+
+# --------------------------------------------------------------------------
+def run_worker(index, sock, args, app_module):
+    """Child process: pin threads, load the model, serve until killed."""
+    from werkzeug.serving import make_server
+
+    # Thread budgets must be in place before TensorFlow initialises
+    os.environ["OMP_NUM_THREADS"] = str(args.intra_op_threads)
+    os.environ["TF_NUM_INTRAOP_THREADS"] = str(args.intra_op_threads)
+    os.environ["TF_NUM_INTEROP_THREADS"] = str(args.inter_op_threads)
+    app_module.INFERENCE_THREADS = args.intra_op_threads
+    app_module.INTER_OP_THREADS = args.inter_op_threads
+
+    signal.signal(signal.SIGTERM, lambda *_: os._exit(0))
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    app_module.start_model_loading(background=True)
+    server = make_server(args.host, args.port, app_module.app, threaded=True, fd=sock.fileno())
+    logger.info(f"Worker {index} (pid {os.getpid()}) accepting connections")
+    server.serve_forever()
+
+
+def spawn(index, sock, args, app_module):
+    pid = os.fork()
+    if pid == 0:
+        try:
+            run_worker(index, sock, args, app_module)
+        except Exception as e:
+            logger.error(f"Worker {index} crashed: {e}")
+        finally:
+            os._exit(1)
+    return pid
+
+
+# --------------------------------------------------------------------------
+def main():
+    cpus = os.cpu_count() or 1
+    parser = argparse.ArgumentParser(description="Pre-fork multi-worker server for app.py")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=int(os.getenv("FLASK_PORT", "5000")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("SERVE_WORKERS", "2")))
+    parser.add_argument("--intra-op-threads", type=int, default=int(os.getenv("INFERENCE_THREADS", "0")),
+                        help="per-worker intra-op threads (default: cores / workers)")
+    parser.add_argument("--inter-op-threads", type=int, default=int(os.getenv("INTER_OP_THREADS", "1")))
+    parser.add_argument("--memory-report-interval", type=float, default=60.0,
+                        help="seconds between per-worker RSS/PSS log lines (0 = off)")
+    args = parser.parse_args()
+
+    if not hasattr(os, "fork"):
+        sys.exit("serve.py needs fork(); use `python app.py` on this platform")
+
+    args.workers = max(1, args.workers)
+    args.intra_op_threads = args.intra_op_threads or max(1, cpus // args.workers)
+    args.inter_op_threads = max(1, args.inter_op_threads)
+
+    # Import the app without loading a model: that happens per worker
+    os.environ["MODEL_AUTOLOAD"] = "false"
+    import app as app_module
+
+    if app_module.INFERENCE_BACKEND == "tflite":
+        with open(app_module.ACTIVE_MODEL_PATH, "rb") as f:
+            app_module.BACKEND_OPTIONS["model_content"] = f.read()
+        size_mb = len(app_module.BACKEND_OPTIONS["model_content"]) / 1e6
+        logger.info(f"Loaded {app_module.ACTIVE_MODEL_PATH} ({size_mb:.1f} MB) once, shared with all workers")
+    else:
+        logger.warning(
+            "Keras backend: each worker loads its own copy of the weights "
+            "(TensorFlow cannot be forked). Export with `model_trainer.py --mode export` "
+            "and set INFERENCE_BACKEND=tflite to share one copy."
+        )
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((args.host, args.port))
+    sock.listen(128)
+    sock.set_inheritable(True)
+
+    logger.info(
+        f"Serving on {args.host}:{args.port} with {args.workers} workers "
+        f"({args.intra_op_threads} intra-op / {args.inter_op_threads} inter-op threads each)"
+    )
+
+    workers = {spawn(i, sock, args, app_module): i for i in range(args.workers)}
+    stopping = False
+
+    def shutdown(*_):
+        nonlocal stopping
+        stopping = True
+        for pid in workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+
+    last_report = time.monotonic()
+    while workers:
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            break
+
+        if pid:
+            index = workers.pop(pid)
+            if not stopping:
+                logger.warning(f"Worker {index} (pid {pid}) exited with status {status}, restarting")
+                workers[spawn(index, sock, args, app_module)] = index
+            continue
+
+        if args.memory_report_interval and time.monotonic() - last_report >= args.memory_report_interval:
+            last_report = time.monotonic()
+            total_pss = 0.0
+            for child, index in sorted(workers.items(), key=lambda kv: kv[1]):
+                mem = read_memory(child)
+                total_pss += mem.get("pss_mb", 0.0)
+                logger.info(f"Worker {index} (pid {child}): rss {mem.get('rss_mb')} MB, pss {mem.get('pss_mb')} MB")
+            logger.info(f"Workers total PSS: {total_pss:.1f} MB")
+
+        time.sleep(0.5)
+
+    sock.close()
+
+
+if __name__ == "__main__":
+    main()
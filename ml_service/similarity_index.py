@@ -0,0 +1,297 @@
+import os
+import json
+import shutil
+import hashlib
+import logging
+import argparse
+import threading
+from pathlib import Path
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+INDEX_VERSION = 1
+INDEX_DTYPES = ("int8", "float16")
+
+# Rows converted to float32 at a time while scoring: small enough for the
+# block to stay in cache between the conversion and the matmul
+SCORE_CHUNK_ROWS = 128
+
+
+def index_dir(model_path):
+    """Directory of the index built for a model artifact: `<stem>.similarity/` beside it."""
+    path = Path(model_path)
+    return path.with_name(path.stem + ".similarity")
+
+
+def hash_weights(digest, model):
+    """Feed a Keras model's parameter count + first/last weight tensors into `digest`."""
+    weights = model.weights
+    digest.update(str(sum(int(np.prod(w.shape)) for w in weights)).encode())
+    for w in (weights[0], weights[-1]) if weights else ():
+        digest.update(np.asarray(w.numpy()).tobytes())
+    return digest
+
+
+def model_digest(model):
+    """Fingerprint of a Keras model's weights (see hash_weights)."""
+    return hash_weights(hashlib.sha1(), model).hexdigest()[:20]
+
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def quantize(vectors, dtype="int8"):
+    """
+    (matrix, scales) for unit rows: float16 as is (scales None), or int8
+    with one float32 scale per row, so row ~= matrix[i] * scales[i].
+    """
+    if dtype == "float16":
+        return vectors.astype(np.float16), None
+    if dtype != "int8":
+        raise ValueError(f"Unknown index dtype '{dtype}' (choose from {', '.join(INDEX_DTYPES)})")
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    matrix = np.round(vectors / scales[:, None]).astype(np.int8)
+    return matrix, scales.astype(np.float32)
+
+
+def kmeans(vectors, nlist, iterations=20, seed=42):
+    """Spherical k-means over unit rows: (unit centroids, list of each row)."""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), nlist, replace=False)].copy()
+    for _ in range(iterations):
+        assign = np.argmax(vectors @ centroids.T, axis=1)
+        for c in range(nlist):
+            members = vectors[assign == c]
+            # An empty list takes over a random row rather than dying out
+            centroids[c] = members.sum(axis=0) if len(members) else vectors[rng.integers(len(vectors))]
+        centroids = _normalize(centroids)
+    return centroids, np.argmax(vectors @ centroids.T, axis=1)
+
+
+# --------------------------------------------------------------------------
+def write_index(out_dir, embeddings, names, labels, class_names, dtype="int8", nlist=0, digest=None):
+    """
+    Save an index over `embeddings` (one row per image, named by `names`).
+
+    Rows are L2-normalised, so scores are cosine similarities. With
+    `nlist` > 0 they are also grouped into that many k-means lists and
+    stored list by list, so probing a list scans one contiguous slice.
+    The index is written to a temporary directory and renamed into place.
+    """
+    out_dir = Path(out_dir)
+    vectors = _normalize(embeddings)
+    labels = np.asarray(labels, dtype=np.int32)
+    names = list(names)
+
+    centroids = offsets = None
+    if nlist:
+        nlist = min(int(nlist), len(vectors))
+        centroids, assign = kmeans(vectors, nlist)
+        order = np.argsort(assign, kind="stable")
+        offsets = np.searchsorted(assign[order], np.arange(nlist + 1)).astype(np.int64)
+        vectors, labels, names = vectors[order], labels[order], [names[i] for i in order]
+
+    matrix, scales = quantize(vectors, dtype)
+
+    tmp = out_dir.with_name(f".{out_dir.name}.{os.getpid()}.tmp")
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+    try:
+        np.save(tmp / "vectors.npy", matrix)
+        np.save(tmp / "labels.npy", labels)
+        if scales is not None:
+            np.save(tmp / "scales.npy", scales)
+        if centroids is not None:
+            np.save(tmp / "centroids.npy", centroids)
+            np.save(tmp / "offsets.npy", offsets)
+        with open(tmp / "meta.json", "w") as f:
+            json.dump({
+                "version": INDEX_VERSION,
+                "dtype": dtype,
+                "count": len(names),
+                "dim": int(matrix.shape[1]),
+                "nlist": int(nlist),
+                "model_digest": digest,
+                "class_names": list(class_names),
+                "names": names,
+            }, f)
+        shutil.rmtree(out_dir, ignore_errors=True)
+        os.rename(tmp, out_dir)
+    except Exception:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+
+    logger.info(
+        f"Similarity index: {len(names)} images, {dtype}, "
+        f"{matrix.nbytes / 1e6:.1f} MB{f', {nlist} lists' if nlist else ''} -> {out_dir}"
+    )
+    return out_dir
+
+
+def build_index(model, stream, out_dir, names=None, dtype="int8", nlist=0, batch_size=32):
+    """
+    Embed every sample of `stream` with `model`'s pooled backbone features
+    and write the index to `out_dir`.
+
+    Images go through the serving preprocessing (ImagePreprocessor), so
+    their features match the ones app.py gets for an upload. Images that
+    fail to decode are left out. `names` labels each sample (default: its key).
+    """
+    from embedding_cache import split_head
+    from preprocessing import ImagePreprocessor
+
+    feature_model, _ = split_head(model)
+    preprocessor = ImagePreprocessor(stream.img_size)
+    names = [str(key) for key, _ in stream.samples] if names is None else list(names)
+
+    embeddings, kept = [], []
+    for start in range(0, len(stream.samples), batch_size):
+        inputs, rows = [], []
+        for i in range(start, min(start + batch_size, len(stream.samples))):
+            key, _ = stream.samples[i]
+            try:
+                pixels = stream.reader(key, stream.img_size)
+            except Exception as e:
+                logger.warning(f"Failed to load {key}: {e}")
+                continue
+            inputs.append(preprocessor.preprocess(np.asarray(pixels)))
+            rows.append(i)
+        if inputs:
+            embeddings.append(np.asarray(feature_model.predict_on_batch(np.stack(inputs)), dtype=np.float32))
+            kept.extend(rows)
+
+    labels = [stream.samples[i][1] for i in kept]
+    return write_index(
+        out_dir, np.concatenate(embeddings), [names[i] for i in kept], labels, stream.class_names,
+        dtype=dtype, nlist=nlist, digest=model_digest(model)
+    )
+
+
+# --------------------------------------------------------------------------
+class SimilarityIndex:
+    """
+    Nearest training images for an embedding, by cosine similarity.
+
+    The vector matrix is memory-mapped, so opening an index is cheap and
+    several processes share its pages. Without lists, a query scores every
+    row in one vectorised pass; with lists (IVF), only the rows of the
+    `nprobe` lists whose centroids are closest to the query, which is
+    approximate but scales to large datasets. Top-k uses argpartition.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        with open(self.path / "meta.json", "r") as f:
+            self.meta = json.load(f)
+        if self.meta.get("version") != INDEX_VERSION:
+            raise ValueError(f"Unsupported similarity index version {self.meta.get('version')} in {self.path}")
+
+        self.names = self.meta["names"]
+        self.class_names = self.meta["class_names"]
+        self.vectors = np.load(self.path / "vectors.npy", mmap_mode="r")
+        self.labels = np.load(self.path / "labels.npy")
+        self.scales = self._optional("scales.npy")
+        self.centroids = self._optional("centroids.npy")
+        self.offsets = self._optional("offsets.npy")
+        self._local = threading.local()
+
+    def _optional(self, name):
+        path = self.path / name
+        return np.load(path) if path.exists() else None
+
+    @classmethod
+    def open(cls, path):
+        """The index at `path`, or None if there isn't one."""
+        return cls(path) if (Path(path) / "meta.json").exists() else None
+
+    def __len__(self):
+        return len(self.names)
+
+    def matches(self, model):
+        """Whether the index was built from `model`'s weights."""
+        return self.meta.get("model_digest") == model_digest(model)
+
+    def describe(self):
+        return {key: self.meta[key] for key in ("count", "dtype", "dim", "nlist")}
+
+    # ----------------------------------------------------------------------
+    def _scores(self, queries, start, stop):
+        """Cosine similarity of unit `queries` (B, D) to rows [start, stop)."""
+        buf = getattr(self._local, "block", None)
+        if buf is None:
+            buf = self._local.block = np.empty((SCORE_CHUNK_ROWS, self.vectors.shape[1]), dtype=np.float32)
+        scores = np.empty((len(queries), stop - start), dtype=np.float32)
+        for a in range(start, stop, SCORE_CHUNK_ROWS):
+            b = min(a + SCORE_CHUNK_ROWS, stop)
+            block = buf[:b - a]
+            np.copyto(block, self.vectors[a:b], casting="unsafe")
+            np.matmul(queries, block.T, out=scores[:, a - start:b - start])
+        if self.scales is not None:
+            scores *= self.scales[start:stop]
+        return scores
+
+    def _candidates(self, query, nprobe):
+        """(row ids, scores) of the rows in the `nprobe` lists nearest to `query`."""
+        nprobe = min(nprobe, len(self.centroids))
+        closeness = self.centroids @ query
+        lists = np.argpartition(-closeness, nprobe - 1)[:nprobe]
+        ids = np.concatenate([np.arange(self.offsets[c], self.offsets[c + 1]) for c in lists])
+        scores = np.concatenate([self._scores(query[None], self.offsets[c], self.offsets[c + 1])[0] for c in lists])
+        return ids, scores
+
+    def search(self, queries, k=3, nprobe=8):
+        """
+        The `k` most similar images for one embedding (a list of dicts), or
+        for each row of a (B, D) batch (a list of such lists).
+        """
+        single = np.ndim(queries) == 1
+        queries = _normalize(np.atleast_2d(queries))
+
+        if self.centroids is None:
+            all_scores = self._scores(queries, 0, len(self))
+            candidates = [(None, scores) for scores in all_scores]
+        else:
+            candidates = [self._candidates(query, nprobe) for query in queries]
+
+        results = []
+        for ids, scores in candidates:
+            top = min(k, len(scores))
+            best = np.argpartition(-scores, top - 1)[:top] if top else np.empty(0, dtype=np.int64)
+            best = best[np.argsort(-scores[best], kind="stable")]
+            rows = best if ids is None else ids[best]
+            results.append([
+                {
+                    "image": self.names[row],
+                    "class": self.class_names[self.labels[row]],
+                    # int8 rounding can push a near-duplicate just past 1
+                    "similarity": round(min(float(score), 1.0), 4),
+                }
+                for row, score in zip(rows, scores[best])
+            ])
+        return results[0] if single else results
+
+
+# --------------------------------------------------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Query a similarity index with stored embeddings")
+    parser.add_argument("index", help="index directory (e.g. ./models/teeth_disease_model.similarity)")
+    parser.add_argument("--row", type=int, default=0, help="use the index's own row as the query")
+    parser.add_argument("-k", type=int, default=5)
+    parser.add_argument("--nprobe", type=int, default=8)
+    args = parser.parse_args()
+
+    index = SimilarityIndex(args.index)
+    query = np.asarray(index.vectors[args.row], dtype=np.float32)
+    if index.scales is not None:
+        query = query * index.scales[args.row]
+    print(json.dumps({
+        "index": index.describe(),
+        "query": index.names[args.row],
+        "results": index.search(query, args.k, args.nprobe),
+    }, indent=2))
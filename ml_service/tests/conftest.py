@@ -0,0 +1,44 @@
+import os
+import sys
+import logging
+from pathlib import Path
+
+import pytest
+
+SERVICE_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(SERVICE_DIR))
+sys.path.insert(0, str(SERVICE_DIR / "benchmarks"))
+
+
+@pytest.fixture(scope="session")
+def stand_in_path(tmp_path_factory):
+    """The benchmark stand-in classifier (6 classes, 224x224) saved as .h5."""
+    from stand_in import save_stand_in_model
+
+    return save_stand_in_model(str(tmp_path_factory.mktemp("stand_in")))
+
+
+@pytest.fixture(scope="session")
+def service(stand_in_path):
+    """
+    app.py serving the stand-in model: no autoload, no prediction cache,
+    one warmup run. Tests that change its module globals must restore them
+    (use monkeypatch).
+    """
+    os.environ["MODEL_AUTOLOAD"] = "false"
+    os.environ["CACHE_ENABLED"] = "false"
+    os.environ["PROFILE_SAMPLE_RATE"] = "0"
+    os.environ["WARMUP_RUNS"] = "1"
+    import app
+
+    app.ACTIVE_MODEL_PATH = stand_in_path
+    app.start_model_loading(background=False)
+    if app.model_state["status"] != "ready":
+        raise RuntimeError(f"Stand-in model failed to load: {app.model_state['error']}")
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    return app
+
+
+@pytest.fixture
+def client(service):
+    return service.app.test_client()
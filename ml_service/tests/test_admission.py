@@ -0,0 +1,162 @@
+import json
+import time
+from io import BytesIO
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from admission import AdmissionController, DeadlineExceeded, Overloaded
+
+
+def _jpeg(seed=0):
+    pixels = np.random.default_rng(seed).integers(0, 256, size=(48, 64, 3), dtype=np.uint8)
+    buf = BytesIO()
+    Image.fromarray(pixels).save(buf, "JPEG")
+    return buf.getvalue()
+
+
+# --------------------------------------------------------------------------
+# AdmissionController
+# --------------------------------------------------------------------------
+def test_admit_until_full_then_overloaded():
+    controller = AdmissionController(max_pending=2, retry_after=3)
+    first, second = controller.admit(), controller.admit()
+
+    with pytest.raises(Overloaded) as info:
+        controller.admit()
+    assert info.value.retry_after == 3
+
+    first.release()
+    first.release()  # idempotent: frees one slot, not two
+    assert controller.depth == 1
+    with controller.admit():
+        assert controller.depth == 2
+    second.release()
+
+    stats = controller.stats()
+    assert stats["pending"] == 0 and stats["peak_pending"] == 2
+    assert stats["admitted"] == 3 and stats["shed_queue_full"] == 1
+
+
+def test_deadline_from():
+    controller = AdmissionController(default_deadline_ms=0, max_deadline_ms=1000)
+    now = time.monotonic()
+
+    assert controller.deadline_from(None) is None
+    assert controller.deadline_from("0") is None
+    assert controller.deadline_from("-5") is None
+    assert now + 0.2 <= controller.deadline_from("250") <= time.monotonic() + 0.25
+    # Capped at max_deadline_ms
+    assert controller.deadline_from("999999") <= time.monotonic() + 1.0
+
+
+@pytest.mark.parametrize("value", ["nan", "NaN", "inf", "-inf", "soon", ""])
+def test_deadline_from_rejects_non_finite_values(value):
+    """They fall back to the default, like any unparseable header."""
+    assert AdmissionController(default_deadline_ms=0).deadline_from(value) is None
+
+    deadline = AdmissionController(default_deadline_ms=500).deadline_from(value)
+    assert deadline is not None and deadline <= time.monotonic() + 0.5
+
+
+def test_ticket_check():
+    controller = AdmissionController()
+    controller.admit(None).check()
+    controller.admit(time.monotonic() + 60).check()
+    with pytest.raises(DeadlineExceeded):
+        controller.admit(time.monotonic() - 1).check()
+
+
+# --------------------------------------------------------------------------
+# /api/predict and /api/predict/batch
+# --------------------------------------------------------------------------
+@pytest.fixture
+def controller(service, monkeypatch):
+    controller = AdmissionController(max_pending=1, retry_after=7)
+    monkeypatch.setattr(service, "admission", controller)
+    return controller
+
+
+@pytest.mark.parametrize("url", ["/api/predict", "/api/predict/batch"])
+def test_overload_is_503_with_retry_after(client, controller, url):
+    with controller.admit():
+        response = client.post(url, data=_jpeg(), content_type="image/jpeg")
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "7"
+    assert response.get_json()["queue_depth"] == 1
+    assert controller.stats()["shed_queue_full"] == 1
+
+
+def test_deadline_is_checked_before_decoding(client, service, controller, monkeypatch):
+    def decode(fp):
+        raise AssertionError("decoded an expired request")
+
+    monkeypatch.setattr(service.preprocessor, "open", decode)
+    response = client.post("/api/predict", data=_jpeg(), content_type="image/jpeg",
+                           headers={service.DEADLINE_HEADER: "0.001"})
+
+    assert response.status_code == 504
+    assert controller.stats()["shed_deadline"] == 1
+    assert controller.depth == 0
+
+
+def test_expired_in_the_model_queue_is_504(client, service, controller, monkeypatch):
+    def predict_one(arr, deadline=None):
+        # As if the micro-batcher dropped it while it waited for a batch
+        raise DeadlineExceeded("Request deadline exceeded")
+
+    monkeypatch.setattr(service, "predict_one", predict_one)
+    response = client.post("/api/predict", data=_jpeg(), content_type="image/jpeg",
+                           headers={service.DEADLINE_HEADER: "5000"})
+
+    assert response.status_code == 504
+    assert controller.depth == 0
+
+
+@pytest.mark.parametrize("value", ["nan", "inf", "5000"])
+def test_valid_or_ignored_deadline_is_served(client, service, controller, value):
+    response = client.post("/api/predict", data=_jpeg(), content_type="image/jpeg",
+                           headers={service.DEADLINE_HEADER: value})
+
+    assert response.status_code == 200
+    assert controller.depth == 0
+
+
+def test_bulk_expired_before_streaming_is_504(client, service, controller):
+    response = client.post("/api/predict/batch", data={"images": [(BytesIO(_jpeg()), "a.jpg")]},
+                           content_type="multipart/form-data", headers={service.DEADLINE_HEADER: "0.001"})
+
+    assert response.status_code == 504
+    assert controller.depth == 0
+
+
+def test_bulk_deadline_is_checked_per_chunk(service, controller, monkeypatch):
+    monkeypatch.setattr(service, "BULK_CHUNK_SIZE", 1)
+    jpeg = _jpeg()
+    items = [(f"{i}.jpg", lambda: BytesIO(jpeg)) for i in range(3)]
+    version, _ = service.router.acquire()
+    deadline = time.monotonic() + 2
+    try:
+        stream = service._predict_chunks(items, version, deadline)
+        first = json.loads(next(stream))
+        assert first["filename"] == "0.jpg" and "error" not in first
+
+        time.sleep(max(0.0, deadline - time.monotonic()) + 0.01)
+        rest = [json.loads(line) for chunk in stream for line in chunk.splitlines()]
+    finally:
+        version.release()
+
+    assert rest == [{"filename": "1.jpg", "error": "Request deadline exceeded"},
+                    {"filename": "2.jpg", "error": "Request deadline exceeded"}]
+    assert controller.stats()["shed_deadline"] == 1
+
+
+def test_bulk_ignores_the_default_deadline(client, service, controller, monkeypatch):
+    monkeypatch.setattr(controller, "default_deadline_ms", 0.001)
+    response = client.post("/api/predict/batch", data={"images": [(BytesIO(_jpeg()), "a.jpg")]},
+                           content_type="multipart/form-data")
+
+    assert response.status_code == 200
+    assert "error" not in json.loads(response.get_data(as_text=True))
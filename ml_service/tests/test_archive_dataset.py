@@ -0,0 +1,125 @@
+import zipfile
+from pathlib import Path, PurePosixPath
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from archive_dataset import ArchiveDataset, _data_offset, virtual_root
+from data_loader import ImageBatchStream, list_class_images
+
+ROOT = "oral-diseases/oral-diseases"
+IMG_SIZE = (32, 32)
+BAD = "Caries/c2.png"
+
+
+def _image(seed):
+    return np.random.default_rng(seed).integers(0, 256, size=(40, 48, 3), dtype=np.uint8)
+
+
+@pytest.fixture
+def dataset_zip(tmp_path):
+    """
+    Class-per-folder tree under a nested top-level folder, zipped with
+    stored (PNG) and deflated (JPEG) members, an empty class, a non-image
+    file, and one stored member whose bytes are flipped after zipping.
+    Returns (zip path, extracted class root).
+    """
+    tree = tmp_path / "tree"
+    files = {
+        "Caries/c1.png": "PNG", BAD: "PNG", "Caries/c0.jpg": "JPEG",
+        "Gingivitis/g1.jpg": "JPEG", "Gingivitis/g0.png": "PNG",
+        "Ulcers/u0.jpeg": "JPEG",
+    }
+    for seed, (rel, fmt) in enumerate(sorted(files.items())):
+        path = tree / ROOT / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        Image.fromarray(_image(seed)).save(path, fmt)
+    (tree / ROOT / "Ulcers" / "notes.txt").write_text("not an image")
+    (tree / ROOT / "Hypodontia").mkdir()
+
+    zip_path = tmp_path / "data.zip"
+    with zipfile.ZipFile(zip_path, "w") as zf:
+        for path in sorted(tree.rglob("*")):
+            name = path.relative_to(tree).as_posix()
+            compress = zipfile.ZIP_STORED if path.suffix == ".png" else zipfile.ZIP_DEFLATED
+            zf.write(path, name, compress_type=compress)
+
+    with zipfile.ZipFile(zip_path) as zf, open(zip_path, "r+b") as raw:
+        info = zf.getinfo(f"{ROOT}/{BAD}")
+        assert info.compress_type == zipfile.ZIP_STORED
+        offset = _data_offset(raw, info) + info.compress_size // 2
+        raw.seek(offset)
+        byte = raw.read(1)
+        raw.seek(offset)
+        raw.write(bytes([byte[0] ^ 0xFF]))
+
+    return zip_path, tree / ROOT
+
+
+def test_virtual_root():
+    assert virtual_root(["a/a/x/1.png", "a/a/y/2.png"]) == ("a", "a")
+    assert virtual_root(["a/x/1.png", "a/2.png"]) == ("a",)
+    assert virtual_root(["a/x/1.png", "README.md"]) == ()
+    assert virtual_root(["x/1.png", "y/2.png"]) == ()
+
+
+def test_index_strips_root_and_matches_list_class_images(dataset_zip):
+    zip_path, extracted = dataset_zip
+    dataset = ArchiveDataset(zip_path)
+
+    manifest = dataset.index()
+    class_names, samples = list_class_images(extracted)
+
+    assert manifest["root"] == ROOT
+    assert manifest["class_names"] == class_names == ["Caries", "Gingivitis", "Hypodontia", "Ulcers"]
+    indexed = [(PurePosixPath(e["name"]).relative_to(ROOT).as_posix(), class_names.index(e["class"])) for e in manifest["entries"]]
+    assert indexed == [(path.relative_to(extracted).as_posix(), label) for path, label in samples]
+    assert dataset.counts() == {"Caries": 3, "Gingivitis": 2, "Ulcers": 1}
+    assert {e["compress_type"] for e in manifest["entries"]} == {zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED}
+
+
+def test_crc_error_for_corrupted_member(dataset_zip):
+    zip_path, extracted = dataset_zip
+    dataset = ArchiveDataset(zip_path)
+    dataset.index()
+    names = [e["name"] for e in dataset.manifest["entries"]]
+
+    with pytest.raises(zipfile.BadZipFile, match="CRC mismatch"):
+        dataset.read_bytes(names.index(f"{ROOT}/{BAD}"))
+    # Every other member reads back byte for byte
+    for key, name in enumerate(names):
+        if name != f"{ROOT}/{BAD}":
+            assert dataset.read_bytes(key) == (extracted.parent.parent / name).read_bytes()
+
+
+def test_stream_matches_extracted_directory(dataset_zip):
+    zip_path, extracted = dataset_zip
+    # The extracted copy of the bad member is corrupt too: both streams skip it
+    (extracted / BAD).write_bytes(b"corrupt")
+    class_names, samples = list_class_images(extracted)
+    from_dir = ImageBatchStream(samples, class_names, batch_size=4, img_size=IMG_SIZE)
+    from_zip = ArchiveDataset(zip_path).stream(batch_size=4, img_size=IMG_SIZE)
+
+    assert len(from_zip) == len(from_dir) == 2
+    for i in range(len(from_dir)):
+        zip_images, zip_labels = from_zip[i]
+        dir_images, dir_labels = from_dir[i]
+        np.testing.assert_array_equal(zip_images, dir_images)
+        np.testing.assert_array_equal(zip_labels, dir_labels)
+    assert sum(len(from_zip[i][1]) for i in range(len(from_zip))) == len(samples) - 1
+
+
+def test_index_is_reused_until_the_zip_changes(dataset_zip, monkeypatch):
+    zip_path, _ = dataset_zip
+    first = ArchiveDataset(zip_path).index()
+    assert zip_path.with_name("data.zip.index.json").exists()
+
+    dataset = ArchiveDataset(zip_path)
+    monkeypatch.setattr(dataset, "_build_index", lambda: pytest.fail("index rebuilt for an unchanged zip"))
+    assert dataset.index() == first
+
+    with zipfile.ZipFile(zip_path, "a") as zf:
+        zf.writestr(f"{ROOT}/Ulcers/u1.png", (zip_path.parent / "tree" / ROOT / "Caries" / "c1.png").read_bytes())
+    assert ArchiveDataset(zip_path).index()["class_names"] == first["class_names"]
+    assert ArchiveDataset(zip_path).counts()["Ulcers"] == 2
@@ -0,0 +1,184 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from admission import DeadlineExceeded
+from batcher import MicroBatcher
+
+
+class FakeModel:
+    """Records batch sizes; row i of the output is derived from input i only."""
+
+    def __init__(self, outputs=1, gate=None):
+        self.outputs = outputs
+        self.gate = gate
+        self.batch_sizes = []
+
+    def __call__(self, batch):
+        if self.gate is not None:
+            self.gate.wait(5)
+        self.batch_sizes.append(len(batch))
+        sums = batch.reshape(len(batch), -1).sum(axis=1)
+        probs = np.stack([sums, -sums], axis=1)
+        return (probs, sums * 10) if self.outputs == 2 else probs
+
+
+def _input(i):
+    return np.full((2, 2, 3), i, dtype=np.float32)
+
+
+def _submit_all(batcher, n, **kwargs):
+    with ThreadPoolExecutor(n) as pool:
+        return list(pool.map(lambda i: batcher.submit(_input(i), timeout=5, **kwargs), range(n)))
+
+
+@pytest.fixture
+def make_batcher():
+    batchers = []
+
+    def make(predict_fn, **kwargs):
+        batchers.append(MicroBatcher(predict_fn, **kwargs))
+        return batchers[-1]
+
+    yield make
+    for batcher in batchers:
+        batcher.stop()
+
+
+def test_concurrent_requests_share_a_forward_pass(make_batcher):
+    model = FakeModel()
+    batcher = make_batcher(model, max_batch_size=4, max_wait_ms=2000, bypass_single=False)
+
+    results = _submit_all(batcher, 4)
+
+    assert model.batch_sizes == [4]
+    # Each caller gets its own row back
+    for i, row in enumerate(results):
+        np.testing.assert_array_equal(row, [12 * i, -12 * i])
+
+
+def test_batches_are_capped_at_max_batch_size(make_batcher):
+    model = FakeModel()
+    batcher = make_batcher(model, max_batch_size=2, max_wait_ms=200, bypass_single=False)
+
+    results = _submit_all(batcher, 5)
+
+    assert sum(model.batch_sizes) == 5
+    assert max(model.batch_sizes) == 2
+    assert [row[0] for row in results] == [12 * i for i in range(5)]
+
+
+def test_single_request_bypasses_the_window(make_batcher):
+    model = FakeModel()
+    batcher = make_batcher(model, max_wait_ms=10000, bypass_single=True)
+
+    started = time.monotonic()
+    row = batcher.submit(_input(1), timeout=5)
+
+    assert time.monotonic() - started < 2
+    assert model.batch_sizes == [1]
+    np.testing.assert_array_equal(row, [12, -12])
+
+
+def test_single_request_waits_out_the_window_without_bypass(make_batcher):
+    model = FakeModel()
+    batcher = make_batcher(model, max_wait_ms=300, bypass_single=False)
+
+    started = time.monotonic()
+    batcher.submit(_input(1), timeout=5)
+
+    assert time.monotonic() - started >= 0.3
+    assert model.batch_sizes == [1]
+
+
+def test_expired_requests_are_dropped_before_the_forward_pass(make_batcher):
+    gate = threading.Event()
+    model = FakeModel(gate=gate)
+    batcher = make_batcher(model, max_batch_size=8, max_wait_ms=0, bypass_single=True)
+
+    with ThreadPoolExecutor(3) as pool:
+        # Holds the worker in the model while the next two queue up
+        busy = pool.submit(batcher.submit, _input(1), 5)
+        time.sleep(0.1)
+        expired = pool.submit(batcher.submit, _input(2), 5, time.monotonic() + 0.05)
+        live = pool.submit(batcher.submit, _input(3), 5, time.monotonic() + 60)
+        time.sleep(0.2)
+        gate.set()
+
+        busy.result()
+        np.testing.assert_array_equal(live.result(), [36, -36])
+        with pytest.raises(DeadlineExceeded):
+            expired.result()
+
+    assert model.batch_sizes == [1, 1]
+
+
+def test_tuple_outputs_are_split_per_row(make_batcher):
+    batcher = make_batcher(FakeModel(outputs=2), max_batch_size=4, max_wait_ms=2000, bypass_single=False)
+
+    results = _submit_all(batcher, 4)
+
+    for i, result in enumerate(results):
+        assert isinstance(result, tuple)
+        probs, embedding = result
+        np.testing.assert_array_equal(probs, [12 * i, -12 * i])
+        assert embedding == 120 * i
+
+
+def test_model_errors_reach_every_caller(make_batcher):
+    def broken(batch):
+        raise ValueError("bad batch")
+
+    batcher = make_batcher(broken, max_batch_size=2, max_wait_ms=2000, bypass_single=False)
+
+    with ThreadPoolExecutor(2) as pool:
+        futures = [pool.submit(batcher.submit, _input(i), 5) for i in range(2)]
+        for future in futures:
+            with pytest.raises(ValueError, match="bad batch"):
+                future.result()
+
+
+def test_submit_timeout(make_batcher):
+    gate = threading.Event()
+    batcher = make_batcher(FakeModel(gate=gate))
+
+    with pytest.raises(TimeoutError):
+        batcher.submit(_input(1), timeout=0.1)
+    gate.set()
+
+
+def test_stop(make_batcher):
+    model = FakeModel()
+    batcher = make_batcher(model)
+    batcher.submit(_input(1), timeout=5)
+
+    batcher.stop()
+
+    assert not batcher._worker.is_alive()
+    with pytest.raises(RuntimeError, match="stopped"):
+        batcher.submit(_input(1), timeout=5)
+    assert model.batch_sizes == [1]
+
+
+def test_stop_fails_requests_left_in_the_queue(make_batcher):
+    gate = threading.Event()
+    batcher = make_batcher(FakeModel(gate=gate), max_wait_ms=0)
+
+    with ThreadPoolExecutor(2) as pool:
+        busy = pool.submit(batcher.submit, _input(1), 5)
+        time.sleep(0.1)
+        queued = pool.submit(batcher.submit, _input(2), 5)
+        time.sleep(0.1)
+        # The worker finishes its current batch, then exits; the queued request fails
+        stopper = threading.Thread(target=batcher.stop)
+        stopper.start()
+        time.sleep(0.1)
+        gate.set()
+        stopper.join(5)
+
+        np.testing.assert_array_equal(busy.result(), [12, -12])
+        with pytest.raises(RuntimeError, match="stopped"):
+            queued.result()
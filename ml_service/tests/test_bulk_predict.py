@@ -0,0 +1,126 @@
+import json
+import zipfile
+from io import BytesIO
+
+import numpy as np
+import pytest
+from PIL import Image
+from werkzeug.test import EnvironBuilder
+
+URL = "/api/predict/batch"
+
+
+def _jpeg(seed, size=(64, 48)):
+    pixels = np.random.default_rng(seed).integers(0, 256, size=(size[1], size[0], 3), dtype=np.uint8)
+    buf = BytesIO()
+    Image.fromarray(pixels).save(buf, "JPEG")
+    return buf.getvalue()
+
+
+def _zip(members, compression=zipfile.ZIP_DEFLATED):
+    buf = BytesIO()
+    with zipfile.ZipFile(buf, "w", compression) as zf:
+        for name, data in members.items():
+            zf.writestr(name, data)
+    return buf.getvalue()
+
+
+def _post(client, files, **kwargs):
+    data = {"images": [(BytesIO(body), name) for name, body in files]}
+    return client.post(URL, data=data, content_type="multipart/form-data", **kwargs)
+
+
+def _lines(response):
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+
+@pytest.fixture
+def idle(service):
+    """Asserts every request gave back its admission slot and model reference."""
+    yield
+    assert service.admission.depth == 0
+    assert service.router.primary.state()["in_flight"] == 0
+
+
+def test_files_and_zip_stream_one_line_per_image(client, service, idle):
+    archive = _zip({
+        "scans/a.jpg": _jpeg(1),
+        "scans/broken.jpg": b"not a jpeg",
+        "scans/notes.txt": b"skipped",
+        "__MACOSX/scans/._a.jpg": b"skipped",
+        "scans/b.png": _jpeg(2),
+    })
+    response = _post(client, [("one.jpg", _jpeg(0)), ("scans.zip", archive)])
+
+    assert response.status_code == 200
+    assert response.mimetype == "application/x-ndjson"
+    assert response.headers["X-Model-Version"] == service.router.primary.name
+    lines = _lines(response)
+    assert [line["filename"] for line in lines] == ["one.jpg", "scans/a.jpg", "scans/broken.jpg", "scans/b.png"]
+    assert "error" in lines[2] and "disease" not in lines[2]
+    for line in lines[:2] + lines[3:]:
+        assert "error" not in line
+        assert set(line["probabilities"]) == set(service.CLASS_LABELS)
+
+
+def test_chunks_preserve_order(client, service, monkeypatch, idle):
+    monkeypatch.setattr(service, "BULK_CHUNK_SIZE", 2)
+    files = [(f"{i}.jpg", _jpeg(i) if i != 3 else b"bad") for i in range(5)]
+
+    lines = _lines(_post(client, files))
+
+    assert [line["filename"] for line in lines] == [name for name, _ in files]
+    assert ["error" in line for line in lines] == [False, False, False, True, False]
+
+
+def test_invalid_zip_is_400(client, idle):
+    response = _post(client, [("scans.zip", b"PK but not really a zip")])
+
+    assert response.status_code == 400
+    assert "Invalid zip archive" in response.get_json()["error"]
+
+
+def test_no_images_is_400(client, idle):
+    assert _post(client, [("scans.zip", _zip({"notes.txt": b"x"}))]).status_code == 400
+    assert client.post(URL, data={}, content_type="multipart/form-data").status_code == 400
+
+
+@pytest.mark.parametrize("cap, value, files", [
+    ("BULK_MAX_IMAGES", 2, [("a.jpg", b"1"), ("b.jpg", b"2"), ("c.jpg", b"3")]),
+    ("BULK_MAX_ARCHIVE_ENTRIES", 2, [("s.zip", _zip({f"{i}.jpg": b"x" for i in range(3)}))]),
+    ("MAX_UPLOAD_BYTES", 1000, [("s.zip", _zip({"big.jpg": b"\0" * 2000}))]),
+    ("BULK_MAX_UNCOMPRESSED_BYTES", 3000, [("s.zip", _zip({f"{i}.jpg": b"\0" * 1000 for i in range(4)}))]),
+    ("BULK_MAX_UPLOAD_BYTES", 1000, [("a.jpg", b"\0" * 2000)]),
+], ids=["images", "archive_entries", "member_size", "uncompressed_total", "upload_size"])
+def test_caps_are_413(client, service, monkeypatch, idle, cap, value, files):
+    monkeypatch.setattr(service, cap, value)
+
+    response = _post(client, files)
+
+    assert response.status_code == 413
+    assert response.get_json()["error"]
+
+
+def test_disconnect_before_first_chunk_releases_everything(service, idle):
+    # Straight through WSGI: the test client always reads the first chunk
+    builder = EnvironBuilder(method="POST", path=URL, data={"images": [(BytesIO(_jpeg(0)), "one.jpg")]})
+    statuses = []
+    app_iter = service.app.wsgi_app(builder.get_environ(), lambda status, headers: statuses.append(status))
+    assert statuses == ["200 OK"]
+    assert service.admission.depth == 1
+    assert service.router.primary.state()["in_flight"] == 1
+
+    # The client goes away without reading a byte: the generator never starts
+    app_iter.close()
+
+
+def test_resources_close_is_idempotent(service):
+    ticket = service.admission.admit()
+    resources = service.BulkResources(ticket)
+    resources.version, _ = service.router.acquire()
+
+    resources.close()
+    resources.close()
+
+    assert service.admission.depth == 0
+    assert service.router.primary.state()["in_flight"] == 0
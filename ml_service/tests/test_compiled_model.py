@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+import keras
+from keras import layers
+
+from inference_backends import CompiledModel
+
+BUCKETS = (1, 2, 4, 8)
+INPUT_SHAPE = (16, 16, 3)
+
+
+def _model(outputs=1):
+    keras.utils.set_random_seed(0)
+    inputs = keras.Input(shape=INPUT_SHAPE)
+    x = layers.Conv2D(8, 3, padding="same", activation="relu")(inputs)
+    x = layers.GlobalAveragePooling2D()(x)
+    probs = layers.Dense(5, activation="softmax")(x)
+    return keras.Model(inputs, [probs, x] if outputs == 2 else probs)
+
+
+@pytest.fixture(scope="module")
+def model():
+    return _model()
+
+
+def _batch(n, seed=0):
+    # Distinct rows, so a reordered or mixed-up row can't go unnoticed
+    return np.random.default_rng(seed).normal(size=(n,) + INPUT_SHAPE).astype(np.float32)
+
+
+@pytest.mark.parametrize("n", [1, 4, 8, 3, 5, 9, 20], ids=lambda n: f"batch{n}")
+def test_matches_model_predict(model, n):
+    """On a bucket (1, 4, 8), between buckets (3, 5) and split above the largest (9, 20)."""
+    compiled = CompiledModel(model, BUCKETS)
+    batch = _batch(n, seed=n)
+
+    out = compiled(batch)
+
+    assert out.shape == (n, 5)
+    np.testing.assert_array_equal(out, model.predict(batch, verbose=0))
+    # Row i is the prediction for image i alone
+    for i in (0, n - 1):
+        np.testing.assert_allclose(out[i], model.predict(batch[i:i + 1], verbose=0)[0], rtol=1e-5, atol=1e-6)
+
+
+def test_padding_rows_do_not_leak(model):
+    """The reused padding buffer holds the previous call's rows; they never come back."""
+    compiled = CompiledModel(model, BUCKETS)
+    compiled(_batch(8, seed=1))
+    small = _batch(3, seed=2)
+
+    np.testing.assert_allclose(compiled(small), model.predict(small, verbose=0), rtol=1e-5, atol=1e-6)
+
+
+def test_bucket_for():
+    compiled = CompiledModel(_model(), BUCKETS)
+    assert [compiled.bucket_for(n) for n in (1, 2, 3, 4, 5, 8, 9)] == [1, 2, 4, 4, 8, 8, 8]
+
+
+@pytest.mark.parametrize("n", [3, 11], ids=["padded", "split"])
+def test_multiple_outputs(n):
+    model = _model(outputs=2)
+    compiled = CompiledModel(model, BUCKETS)
+    batch = _batch(n)
+
+    probs, features = compiled(batch)
+    expected_probs, expected_features = model.predict(batch, verbose=0)
+
+    assert probs.shape == (n, 5) and features.shape == (n, 8)
+    np.testing.assert_allclose(probs, expected_probs, rtol=1e-5, atol=1e-6)
+    np.testing.assert_allclose(features, expected_features, rtol=1e-5, atol=1e-6)
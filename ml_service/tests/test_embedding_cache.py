@@ -0,0 +1,119 @@
+import hashlib
+import os
+import zipfile
+from io import BytesIO
+
+import numpy as np
+import pytest
+from PIL import Image
+from tensorflow import keras
+from tensorflow.keras import layers
+
+from archive_dataset import ArchiveDataset
+from data_loader import ImageBatchStream, list_class_images
+from embedding_cache import EmbeddingCache
+from similarity_index import hash_weights, model_digest
+
+IMG_SIZE = (16, 16)
+
+
+def _png(seed):
+    pixels = np.random.default_rng(seed).integers(0, 256, size=(20, 20, 3), dtype=np.uint8)
+    buf = BytesIO()
+    Image.fromarray(pixels).save(buf, "PNG")
+    return buf.getvalue()
+
+
+def _write_zip(path, seed):
+    """Same member names and order every time; `seed` changes the pixels."""
+    with zipfile.ZipFile(path, "w") as zf:
+        for i, name in enumerate(["a/0.png", "a/1.png", "b/0.png"]):
+            zf.writestr(f"data/{name}", _png(seed * 10 + i))
+
+
+def _feature_model(seed=0):
+    keras.utils.set_random_seed(seed)
+    inputs = keras.Input(shape=IMG_SIZE[::-1] + (3,))
+    x = layers.Conv2D(4, 3)(inputs)
+    return keras.Model(inputs, layers.GlobalAveragePooling2D()(x))
+
+
+@pytest.fixture(scope="module")
+def feature_model():
+    return _feature_model()
+
+
+def _archive_stream(path):
+    return ArchiveDataset(path).stream(batch_size=2, img_size=IMG_SIZE)
+
+
+def test_replacing_the_archive_changes_the_fingerprint(tmp_path, feature_model):
+    path = tmp_path / "data.zip"
+    _write_zip(path, seed=1)
+    before = EmbeddingCache.fingerprint(feature_model, _archive_stream(path), 0)
+    assert EmbeddingCache.fingerprint(feature_model, _archive_stream(path), 0) == before
+
+    # Same names, same member indices, different images
+    _write_zip(path, seed=2)
+    after = EmbeddingCache.fingerprint(feature_model, _archive_stream(path), 0)
+
+    assert after != before
+    assert EmbeddingCache.fingerprint(feature_model, _archive_stream(path), "teacher") != after
+
+
+def test_subsets_keep_the_content_id(tmp_path):
+    path = tmp_path / "data.zip"
+    _write_zip(path, seed=1)
+    stream = _archive_stream(path)
+
+    train, val = stream.split(validation_split=0.34)
+
+    assert train.content_id == val.content_id == stream.content_id
+    with zipfile.ZipFile(path) as zf:
+        info = zf.getinfo("data/a/0.png")
+    assert stream.content_id(0) == f"{info.CRC:08x}-{info.file_size}"
+
+
+def test_touching_a_file_changes_the_fingerprint(tmp_path, feature_model):
+    for cls, seed in (("a", 1), ("b", 2)):
+        (tmp_path / cls).mkdir()
+        (tmp_path / cls / "0.png").write_bytes(_png(seed))
+    class_names, samples = list_class_images(tmp_path)
+    stream = ImageBatchStream(samples, class_names, img_size=IMG_SIZE)
+    before = EmbeddingCache.fingerprint(feature_model, stream, 0)
+
+    st = samples[0][0].stat()
+    os.utime(samples[0][0], ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+
+    assert EmbeddingCache.fingerprint(feature_model, stream, 0) != before
+
+
+def test_other_weights_change_the_fingerprint(tmp_path, feature_model):
+    path = tmp_path / "data.zip"
+    _write_zip(path, seed=1)
+    stream = _archive_stream(path)
+
+    assert EmbeddingCache.fingerprint(_feature_model(seed=1), stream, 0) != \
+        EmbeddingCache.fingerprint(feature_model, stream, 0)
+
+
+def test_model_digest_uses_hash_weights(feature_model):
+    assert model_digest(feature_model) == hash_weights(hashlib.sha1(), feature_model).hexdigest()[:20]
+    assert model_digest(feature_model) != model_digest(_feature_model(seed=1))
+
+
+def test_load_or_compute_recomputes_for_a_replaced_archive(tmp_path, feature_model):
+    path = tmp_path / "data.zip"
+    cache = EmbeddingCache(tmp_path / "embeddings")
+    _write_zip(path, seed=1)
+    first, labels = cache.load_or_compute(feature_model, _archive_stream(path))
+    cached, _ = cache.load_or_compute(feature_model, _archive_stream(path))
+    np.testing.assert_array_equal(cached, first)
+
+    _write_zip(path, seed=2)
+    replaced, replaced_labels = cache.load_or_compute(feature_model, _archive_stream(path))
+
+    assert first.shape == replaced.shape == (3, 4)
+    np.testing.assert_array_equal(replaced_labels, labels)
+    assert not np.allclose(replaced, first)
+    assert len(list((tmp_path / "embeddings").glob("*.json"))) == 2
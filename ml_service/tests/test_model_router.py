@@ -0,0 +1,216 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from batcher import MicroBatcher
+from model_registry import ModelRouter, ModelVersion
+
+
+class FakeBackend:
+    def __init__(self, value):
+        self.value = value
+
+    def predict(self, batch):
+        return np.full((len(batch), 2), self.value, dtype=np.float32)
+
+
+class FakeBatcher:
+    def __init__(self):
+        self.stopped = False
+
+    def stop(self):
+        self.stopped = True
+
+
+def _version(name, batcher=None):
+    return ModelVersion(name, f"/models/{name}.h5", FakeBackend(len(name)), batcher=batcher or FakeBatcher())
+
+
+# --------------------------------------------------------------------------
+# ModelVersion
+# --------------------------------------------------------------------------
+def test_refcount():
+    version = _version("v1")
+    assert version.acquire() is version
+    version.acquire()
+    assert version.state()["in_flight"] == 2
+
+    version.release()
+    version.release()
+    assert version.state() == {"version": "v1", "path": "/models/v1.h5", "in_flight": 0,
+                               "retired": False, "unloaded": False, "similarity_index": None}
+
+
+def test_retire_waits_for_in_flight_requests():
+    version = _version("v1")
+    batcher = version.batcher
+    version.acquire()
+
+    version.retire()
+
+    # Still serving the request it already has
+    assert not batcher.stopped
+    assert version.run(np.zeros((1, 4)))[0, 0] == 2
+    state = version.state()
+    assert state["retired"] and not state["unloaded"]
+
+    version.release()
+
+    assert batcher.stopped
+    assert version.backend is None and version.run is None and version.batcher is None
+    assert version.state()["unloaded"]
+    with pytest.raises(RuntimeError, match="unloaded"):
+        version.acquire()
+
+
+def test_retire_an_idle_version_stops_its_batcher_thread():
+    version = _version("v1")
+    batcher = MicroBatcher(version.run, max_wait_ms=0)
+    version.batcher = batcher
+    batcher.submit(np.zeros(4, dtype=np.float32), timeout=5)
+
+    version.retire()
+    version.retire()  # a second retire is a no-op
+
+    assert not batcher._worker.is_alive()
+    with pytest.raises(RuntimeError, match="stopped"):
+        batcher.submit(np.zeros(4, dtype=np.float32), timeout=5)
+
+
+def test_drain_with_concurrent_requests():
+    version = _version("v1")
+    started, finish = threading.Barrier(5), threading.Event()
+
+    def request():
+        version.acquire()
+        try:
+            started.wait(5)
+            finish.wait(5)
+            return version.run(np.zeros((1, 4)))[0, 0]
+        finally:
+            version.release()
+
+    with ThreadPoolExecutor(4) as pool:
+        futures = [pool.submit(request) for _ in range(4)]
+        started.wait(5)
+        version.retire()
+        assert not version.state()["unloaded"]
+        finish.set()
+        assert [f.result() for f in futures] == [2] * 4
+
+    assert version.state()["unloaded"] and version.state()["in_flight"] == 0
+
+
+# --------------------------------------------------------------------------
+# ModelRouter
+# --------------------------------------------------------------------------
+def test_acquire_routes_by_percent(monkeypatch):
+    router = ModelRouter()
+    assert router.acquire() == (None, None)
+
+    primary, canary = _version("v1"), _version("v2")
+    router.swap(primary)
+    router.set_canary(canary, 25)
+
+    monkeypatch.setattr("model_registry.random.random", lambda: 0.2)
+    version, role = router.acquire()
+    assert (version, role) == (canary, "canary")
+    version.release()
+
+    monkeypatch.setattr("model_registry.random.random", lambda: 0.3)
+    version, role = router.acquire()
+    assert (version, role) == (primary, "primary")
+    version.release()
+
+
+def test_swap_retires_the_old_primary_after_it_drains():
+    router = ModelRouter()
+    old, new = _version("v1"), _version("v2")
+    router.swap(old)
+    held, _ = router.acquire()
+
+    assert router.swap(new) is old
+    assert router.primary is new
+    assert old.state()["retired"] and not old.state()["unloaded"]
+
+    held.release()
+    assert old.state()["unloaded"]
+    assert not new.state()["retired"]
+
+
+def test_promote_canary_retires_the_old_primary():
+    router = ModelRouter()
+    primary, canary = _version("v1"), _version("v2")
+    router.swap(primary)
+    router.set_canary(canary, 10)
+
+    old, promoted = router.promote_canary()
+
+    assert (old, promoted) == (primary, canary)
+    assert router.primary is canary
+    assert router.canary is None and router.canary_percent == 0.0
+    assert primary.state()["unloaded"] and primary.batcher is None
+    assert not canary.state()["retired"]
+
+
+def test_promote_without_canary():
+    router = ModelRouter()
+    router.swap(_version("v1"))
+
+    with pytest.raises(KeyError):
+        router.promote_canary()
+
+
+def test_retire_skips_versions_still_routed_as_canary_or_shadow():
+    router = ModelRouter()
+    primary, candidate = _version("v1"), _version("v2")
+    router.swap(primary)
+    router.set_canary(candidate, 10)
+    router.set_shadow(candidate, 50)
+
+    # Dropped as canary, still the shadow
+    router.set_canary(None, 0)
+    assert not candidate.state()["retired"]
+
+    # Dropped as shadow too: now it goes
+    router.set_shadow(None, 0)
+    assert candidate.state()["unloaded"]
+    assert not primary.state()["retired"]
+
+
+def test_swap_to_the_shadow_keeps_it_loaded():
+    router = ModelRouter()
+    primary, shadow = _version("v1"), _version("v2")
+    router.swap(primary)
+    router.set_shadow(shadow, 100)
+
+    router.swap(shadow)
+
+    assert router.primary is shadow and router.shadow is None
+    assert not shadow.state()["retired"]
+    assert primary.state()["unloaded"]
+
+
+def test_replacing_the_canary_keeps_a_version_that_is_also_primary():
+    router = ModelRouter()
+    primary = _version("v1")
+    router.swap(primary)
+    router.set_canary(primary, 10)
+
+    router.set_canary(_version("v2"), 10)
+
+    assert not primary.state()["retired"]
+
+
+def test_state():
+    router = ModelRouter()
+    router.swap(_version("v1"))
+    router.set_canary(_version("v2"), 10)
+
+    state = router.state()
+
+    assert state["primary"]["version"] == "v1"
+    assert state["canary"]["version"] == "v2" and state["canary"]["percent"] == 10.0
+    assert state["shadow"] is None
@@ -0,0 +1,120 @@
+import base64
+import json
+from io import BytesIO
+
+import numpy as np
+import pytest
+from PIL import Image
+
+URL = "/api/predict"
+
+
+@pytest.fixture(scope="module")
+def jpeg():
+    pixels = np.random.default_rng(0).integers(0, 256, size=(96, 128, 3), dtype=np.uint8)
+    buf = BytesIO()
+    Image.fromarray(pixels).save(buf, "JPEG")
+    return buf.getvalue()
+
+
+@pytest.fixture(scope="module")
+def client_module(service):
+    return service.app.test_client()
+
+
+@pytest.fixture(scope="module")
+def expected(client_module, jpeg):
+    response = client_module.post(URL, data=jpeg, content_type="image/jpeg")
+    assert response.status_code == 200
+    return response.get_json()["probabilities"]
+
+
+def _data_url(data, mimetype="image/jpeg"):
+    return f"data:{mimetype};base64," + base64.b64encode(data).decode()
+
+
+def _chunked(client, body, content_type):
+    # No Content-Length: Werkzeug only reads a chunked body when told the input ends
+    return client.post(URL, input_stream=BytesIO(body), content_type=content_type,
+                       headers={"Transfer-Encoding": "chunked"},
+                       environ_base={"wsgi.input_terminated": True})
+
+
+@pytest.mark.parametrize("payload", [
+    "raw_jpeg", "octet_stream", "json_data_url", "json_plain_base64", "form_base64", "multipart_file", "chunked_raw",
+])
+def test_payload_formats_give_the_same_prediction(client, jpeg, expected, payload):
+    b64 = base64.b64encode(jpeg).decode()
+    if payload == "raw_jpeg":
+        response = client.post(URL, data=jpeg, content_type="image/jpeg")
+    elif payload == "octet_stream":
+        response = client.post(URL, data=jpeg, content_type="application/octet-stream")
+    elif payload == "json_data_url":
+        response = client.post(URL, json={"image_base64": _data_url(jpeg)})
+    elif payload == "json_plain_base64":
+        response = client.post(URL, json={"image": b64})
+    elif payload == "form_base64":
+        response = client.post(URL, data={"image_base64": _data_url(jpeg)})
+    elif payload == "multipart_file":
+        response = client.post(URL, data={"image": (BytesIO(jpeg), "scan.jpg")}, content_type="multipart/form-data")
+    else:
+        response = _chunked(client, jpeg, "image/jpeg")
+
+    assert response.status_code == 200, response.get_json()
+    report = response.get_json()
+    assert report["probabilities"] == pytest.approx(expected, abs=1e-6)
+    assert report["predicted_class"] == max(expected, key=expected.get)
+    assert "Server-Timing" in response.headers
+
+
+def test_report_shape(client, jpeg, service):
+    report = client.post(URL, data=jpeg, content_type="image/jpeg").get_json()
+
+    assert set(report["probabilities"]) == set(service.CLASS_LABELS)
+    assert 0 <= report["confidence"] <= 100
+    assert report["model_version"] == service.router.primary.name
+    # The stand-in model has no metrics.json next to it
+    assert report["model_accuracy"] is None and report["training_accuracy"] is None
+
+
+def test_training_metrics_next_to_artifact(service, tmp_path):
+    (tmp_path / "metrics.json").write_text(json.dumps({"train_accuracy": 93.1, "val_accuracy": 90.4}))
+
+    assert service.training_metrics(str(tmp_path / "model.h5")) == {"train_accuracy": 93.1, "val_accuracy": 90.4}
+    assert service.training_metrics(str(tmp_path / "missing" / "model.h5")) == {}
+
+
+@pytest.mark.parametrize("kwargs, error", [
+    ({"data": b"", "content_type": "image/jpeg"}, "No image provided"),
+    ({"json": {}}, "No image provided"),
+    ({"json": {"image_base64": "not base64!!"}}, None),
+    ({"data": "{not json", "content_type": "application/json"}, "No image provided"),
+    ({"data": {"image_base64": "%%%"}}, None),
+    ({"data": b"definitely not an image", "content_type": "image/png"}, "Not a recognised image format"),
+    ({"data": b"\xff\xd8\xff\xe0 truncated", "content_type": "image/jpeg"}, None),
+], ids=["empty_raw", "json_without_image", "bad_json_base64", "malformed_json", "bad_form_base64",
+        "not_an_image", "truncated_jpeg"])
+def test_bad_payloads_are_400(client, kwargs, error):
+    response = client.post(URL, **kwargs)
+
+    assert response.status_code == 400
+    message = response.get_json()["error"]
+    assert message if error is None else message == error
+
+
+@pytest.mark.parametrize("payload", ["declared_raw", "chunked_raw", "chunked_json", "multipart"])
+def test_uploads_past_the_limit_are_413(client, service, monkeypatch, jpeg, payload):
+    monkeypatch.setattr(service, "MAX_UPLOAD_BYTES", len(jpeg) - 1)
+
+    if payload == "declared_raw":
+        response = client.post(URL, data=jpeg, content_type="image/jpeg")
+    elif payload == "chunked_raw":
+        response = _chunked(client, jpeg, "image/jpeg")
+    elif payload == "chunked_json":
+        response = _chunked(client, json.dumps({"image_base64": _data_url(jpeg)}).encode(), "application/json")
+    else:
+        response = client.post(URL, data={"image": (BytesIO(jpeg), "scan.jpg")}, content_type="multipart/form-data")
+
+    assert response.status_code == 413
+    assert response.get_json()["error"]
+    assert service.admission.depth == 0
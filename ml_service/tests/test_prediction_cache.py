@@ -0,0 +1,185 @@
+import os
+import time
+
+import numpy as np
+import pytest
+
+from prediction_cache import PredictionCache
+
+
+def _preds(i):
+    return np.array([i, 1 - i / 10], dtype=np.float32)
+
+
+@pytest.fixture
+def model_file(tmp_path):
+    path = tmp_path / "model.h5"
+    path.write_bytes(b"weights")
+    return path
+
+
+@pytest.fixture
+def make_cache(tmp_path, model_file, monkeypatch):
+    """Cache checking the model file on every lookup, without the background prune."""
+    def make(**kwargs):
+        kwargs = {"disk_dir": tmp_path / "cache", "model_path": str(model_file), "check_interval": 0, **kwargs}
+        cache = PredictionCache(**kwargs)
+        monkeypatch.setattr(cache, "_maybe_prune", lambda: None)
+        return cache
+    return make
+
+
+def _disk_files(cache):
+    return sorted(p.name for p in cache.disk_dir.glob("*/*/*.json"))
+
+
+def _wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_lru_eviction(make_cache):
+    cache = make_cache(max_entries=2, disk_dir=None)
+    cache.put("raw-a", _preds(1))
+    cache.put("raw-b", _preds(2))
+    assert cache.get("raw-a") is not None  # a is now the most recent
+
+    cache.put("raw-c", _preds(3))
+
+    assert cache.get("raw-b") is None
+    np.testing.assert_array_equal(cache.get("raw-a"), _preds(1))
+    np.testing.assert_array_equal(cache.get("raw-c"), _preds(3))
+    stats = cache.stats()
+    assert stats["entries"] == 2 and stats["evictions"] == 1
+
+
+def test_evicted_entries_come_back_from_disk(make_cache):
+    cache = make_cache(max_entries=1)
+    cache.put("raw-a", _preds(1))
+    cache.put("raw-b", _preds(2))
+
+    np.testing.assert_array_equal(cache.get("raw-a"), _preds(1))
+    assert cache.stats()["hits_disk"] == 1
+
+
+def test_ttl_expiry(make_cache):
+    cache = make_cache(ttl_seconds=0.2)
+    cache.put("raw-a", _preds(1))
+    assert cache.get("raw-a") is not None
+
+    time.sleep(0.25)
+
+    # Expired in memory and on disk; the stale file is deleted on read
+    assert cache.get("raw-a") is None
+    assert _disk_files(cache) == []
+
+
+def test_raw_miss_then_pixel_hit(make_cache):
+    """The same photo re-encoded: new bytes, same decoded pixels."""
+    cache = make_cache()
+    pixels = np.random.default_rng(0).integers(0, 256, size=(224, 224, 3), dtype=np.uint8)
+    cache.put(PredictionCache.raw_key(b"first upload"), _preds(1))
+    cache.put(PredictionCache.pixel_key(pixels), _preds(1))
+
+    assert cache.get(PredictionCache.raw_key(b"same photo, other encoder")) is None
+    np.testing.assert_array_equal(cache.get(PredictionCache.pixel_key(pixels.copy())), _preds(1))
+
+    stats = cache.stats()
+    assert stats["misses"] == 1 and stats["hits_pixel"] == 1 and stats["hit_rate"] == 0.5
+
+
+def test_keys():
+    pixels = np.zeros((4, 6, 3), dtype=np.uint8)
+    assert PredictionCache.raw_key(b"x") == PredictionCache.raw_key(b"x") != PredictionCache.raw_key(b"y")
+    assert PredictionCache.pixel_key(pixels).startswith("px-")
+    # Same bytes, different shape
+    assert PredictionCache.pixel_key(pixels) != PredictionCache.pixel_key(pixels.reshape(6, 4, 3))
+
+
+def test_tuple_outputs_round_trip_through_disk(make_cache):
+    outputs = (_preds(1), np.arange(8, dtype=np.float32))
+    make_cache().put("px-a", outputs)
+
+    cached = make_cache().get("px-a")
+
+    assert isinstance(cached, tuple) and len(cached) == 2
+    for got, expected in zip(cached, outputs):
+        np.testing.assert_array_equal(got, expected)
+
+
+def test_disk_tier_is_shared_between_workers(make_cache):
+    make_cache().put("raw-a", _preds(1))
+    other = make_cache()
+
+    np.testing.assert_array_equal(other.get("raw-a"), _preds(1))
+    assert other.stats()["hits_disk"] == 1
+
+
+def test_model_file_change_invalidates(make_cache, model_file):
+    cache = make_cache()
+    cache.put("raw-a", _preds(1))
+    old_versions = [p.name for p in cache.disk_dir.iterdir()]
+
+    st = model_file.stat()
+    os.utime(model_file, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+
+    assert cache.get("raw-a") is None
+    assert cache.stats()["invalidations"] == 1
+    # The old version's disk entries are deleted in the background
+    _wait_for(lambda: not any((cache.disk_dir / name).exists() for name in old_versions))
+
+    cache.put("raw-a", _preds(2))
+    np.testing.assert_array_equal(cache.get("raw-a"), _preds(2))
+
+
+def test_use_model_switches_version(make_cache, tmp_path):
+    cache = make_cache()
+    cache.put("raw-a", _preds(1))
+    other = tmp_path / "other.h5"
+    other.write_bytes(b"other weights")
+
+    cache.use_model(str(other))
+
+    assert cache.get("raw-a") is None
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_prune_disk_keeps_the_newest_disk_max_entries(make_cache):
+    cache = make_cache(disk_max_entries=3)
+    now = time.time()
+    for i in range(5):
+        cache.put(f"raw-{i:02d}", _preds(i))
+    # Write times a second apart: raw-00 oldest
+    for i, path in enumerate(sorted(cache.disk_dir.glob("*/*/*.json"), key=lambda p: p.name)):
+        os.utime(path, (now - 10 + i, now - 10 + i))
+
+    cache.prune_disk()
+
+    assert _disk_files(cache) == ["raw-02.json", "raw-03.json", "raw-04.json"]
+    assert cache.stats()["disk_evictions"] == 2
+
+
+def test_prune_disk_removes_expired_files_first(make_cache):
+    cache = make_cache(ttl_seconds=60, disk_max_entries=10)
+    cache.put("raw-old", _preds(1))
+    cache.put("raw-new", _preds(2))
+    old = next(cache.disk_dir.glob("*/*/raw-old.json"))
+    os.utime(old, (time.time() - 120, time.time() - 120))
+
+    cache.prune_disk()
+
+    assert _disk_files(cache) == ["raw-new.json"]
+
+
+def test_put_schedules_a_background_prune(tmp_path, model_file):
+    cache = PredictionCache(disk_dir=tmp_path / "cache", model_path=str(model_file), disk_max_entries=1)
+    cache.put("raw-a", _preds(1))
+    _wait_for(lambda: not cache._pruning)
+    cache.put("raw-b", _preds(2))
+
+    # The second put is inside prune_interval: nothing pruned yet
+    assert len(_disk_files(cache)) == 2
+    cache.prune_disk()
+    assert len(_disk_files(cache)) == 1
@@ -0,0 +1,95 @@
+from io import BytesIO
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from preprocessing import (
+    DRAFT_MAX_ABS_TOLERANCE,
+    DRAFT_MEAN_ABS_TOLERANCE,
+    ImagePreprocessor,
+    compare_with_reference,
+    reference_preprocess,
+)
+
+# (width, height): at the target size (no draft scaling), then 1/2, 1/4 and
+# 1/8 DCT scaling for a landscape phone photo
+SIZES = [(224, 224), (640, 480), (1600, 1200), (4032, 3024)]
+
+
+def _photo(width, height):
+    """Smooth synthetic photo, so JPEG compresses it like a real one."""
+    yy, xx = np.mgrid[0:height, 0:width].astype(np.float32)
+    scale = max(width, height) / 4032
+    return np.stack([
+        127 + 100 * np.sin(xx / (180.0 * scale)),
+        127 + 100 * np.cos(yy / (240.0 * scale)),
+        127 + 100 * np.sin((xx + yy) / (300.0 * scale)),
+    ], axis=-1).astype(np.uint8)
+
+
+def _encode(pixels, fmt):
+    buf = BytesIO()
+    Image.fromarray(pixels).save(buf, fmt, quality=90)
+    buf.seek(0)
+    return buf
+
+
+@pytest.mark.parametrize("size", SIZES, ids=lambda s: f"{s[0]}x{s[1]}")
+def test_jpeg_draft_decode_within_tolerance(size):
+    result = compare_with_reference(_encode(_photo(*size), "JPEG"))
+
+    assert result["max_abs_diff"] <= DRAFT_MAX_ABS_TOLERANCE, result
+    assert result["mean_abs_diff"] <= DRAFT_MEAN_ABS_TOLERANCE, result
+
+
+@pytest.mark.parametrize("size", SIZES[:2], ids=lambda s: f"{s[0]}x{s[1]}")
+def test_non_jpeg_matches_exactly(size):
+    assert compare_with_reference(_encode(_photo(*size), "PNG"))["max_abs_diff"] == 0.0
+
+
+def test_draft_off_matches_exactly():
+    result = compare_with_reference(_encode(_photo(1600, 1200), "JPEG"), ImagePreprocessor(draft=False))
+
+    assert result["max_abs_diff"] == 0.0
+
+
+def test_out_buffers_are_filled_in_place():
+    preprocessor = ImagePreprocessor()
+    jpeg = _encode(_photo(640, 480), "JPEG")
+    expected = preprocessor.load(jpeg)
+
+    out = np.full(preprocessor.shape, np.nan, dtype=np.float32)
+    jpeg.seek(0)
+    result = preprocessor.load(jpeg, out=out)
+
+    assert result is out
+    np.testing.assert_array_equal(out, expected)
+
+    pixels_buf, arr_buf = preprocessor.scratch()
+    jpeg.seek(0)
+    pixels = preprocessor.decode(jpeg, out=pixels_buf)
+    arr = preprocessor.preprocess(pixels, out=arr_buf)
+    assert pixels is pixels_buf and arr is arr_buf
+    np.testing.assert_array_equal(arr, expected)
+
+
+def test_scratch_buffers_are_per_thread():
+    from concurrent.futures import ThreadPoolExecutor
+
+    preprocessor = ImagePreprocessor()
+    mine = preprocessor.scratch()
+    assert preprocessor.scratch()[0] is mine[0]
+    with ThreadPoolExecutor(1) as pool:
+        theirs = pool.submit(preprocessor.scratch).result()
+    assert theirs[0] is not mine[0] and theirs[1] is not mine[1]
+
+
+def test_matches_keras_preprocess_input_layout():
+    """BGR order, mean-subtracted float32 of the target shape."""
+    png = _encode(_photo(224, 224), "PNG")
+    arr = ImagePreprocessor().load(png)
+    png.seek(0)
+
+    assert arr.shape == (224, 224, 3) and arr.dtype == np.float32
+    np.testing.assert_array_equal(arr, reference_preprocess(png))
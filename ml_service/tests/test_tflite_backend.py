@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+import tensorflow as tf
+import keras
+from keras import layers
+
+from inference_backends import TFLiteBackend, load_backend
+
+BUCKETS = (1, 2, 4, 8)
+INPUT_SHAPE = (16, 16, 3)
+
+
+@pytest.fixture(scope="module")
+def model():
+    keras.utils.set_random_seed(0)
+    inputs = keras.Input(shape=INPUT_SHAPE)
+    x = layers.Conv2D(8, 3, padding="same", activation="relu")(inputs)
+    x = layers.GlobalAveragePooling2D()(x)
+    return keras.Model(inputs, layers.Dense(5, activation="softmax")(x))
+
+
+@pytest.fixture(scope="module")
+def tflite_path(model, tmp_path_factory):
+    path = tmp_path_factory.mktemp("tflite") / "model.tflite"
+    path.write_bytes(tf.lite.TFLiteConverter.from_keras_model(model).convert())
+    return str(path)
+
+
+@pytest.fixture
+def backend(tflite_path):
+    backend = TFLiteBackend(tflite_path, buckets=BUCKETS)
+    resize = backend.interpreter.resize_tensor_input
+    backend.resizes = []
+
+    def counting_resize(index, shape, *args, **kwargs):
+        backend.resizes.append(tuple(shape))
+        return resize(index, shape, *args, **kwargs)
+
+    backend.interpreter.resize_tensor_input = counting_resize
+    return backend
+
+
+def _batch(n, seed=0):
+    return np.random.default_rng(seed).normal(size=(n,) + INPUT_SHAPE).astype(np.float32)
+
+
+@pytest.mark.parametrize("n", [1, 4, 8, 3, 5, 9, 20], ids=lambda n: f"batch{n}")
+def test_matches_keras(backend, model, n):
+    """On a bucket (1, 4, 8), between buckets (3, 5) and split above the largest (9, 20)."""
+    batch = _batch(n, seed=n)
+
+    out = backend.predict(batch)
+
+    assert out.shape == (n, 5)
+    np.testing.assert_allclose(out, model.predict(batch, verbose=0), rtol=1e-5, atol=1e-6)
+
+
+def test_resizes_only_when_the_bucket_changes(backend):
+    for n in (3, 4, 3, 4, 3):
+        backend.predict(_batch(n))
+    assert backend.resizes == [(4,) + INPUT_SHAPE]
+
+    backend.predict(_batch(6))
+    backend.predict(_batch(7))
+    backend.predict(_batch(1))
+    assert backend.resizes == [(4,) + INPUT_SHAPE, (8,) + INPUT_SHAPE, (1,) + INPUT_SHAPE]
+
+
+def test_padding_rows_do_not_leak(backend, model):
+    backend.predict(_batch(4, seed=1))
+    small = _batch(3, seed=2)
+
+    np.testing.assert_allclose(backend.predict(small), model.predict(small, verbose=0), rtol=1e-5, atol=1e-6)
+
+
+def test_load_backend_passes_buckets(tflite_path):
+    backend = load_backend("tflite", tflite_path, buckets=[8, 2, 2], compiled=True, embeddings=False)
+
+    assert backend.buckets == (2, 8)
+    assert backend.predict(_batch(3)).shape == (3, 5)
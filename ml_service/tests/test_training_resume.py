@@ -0,0 +1,63 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+from tensorflow import keras
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from training_checkpoint import resumable_callbacks  # noqa: E402
+from training_profiler import TrainingProfiler, final_metrics  # noqa: E402
+
+CRASH_AFTER = 4
+EPOCHS = 8
+
+
+class Crash(keras.callbacks.Callback):
+    """Kills the run once the checkpoint for epoch CRASH_AFTER is written."""
+
+    def on_epoch_end(self, epoch, logs=None):
+        if epoch + 1 == CRASH_AFTER:
+            raise RuntimeError("simulated crash")
+
+
+def _fit(model, data, backup_dir, crash=False):
+    early_stopping = keras.callbacks.EarlyStopping(monitor="val_loss", patience=100, restore_best_weights=True)
+    profiler = TrainingProfiler()
+    callbacks = [early_stopping, profiler]
+    callbacks += resumable_callbacks(backup_dir, callbacks, run_info={"run": "test"})
+    if crash:
+        callbacks.append(Crash())
+    (x, y), val = data
+    history = model.fit(x, y, epochs=EPOCHS, batch_size=16, validation_data=val, callbacks=callbacks, verbose=0)
+    return history, early_stopping, profiler
+
+
+@pytest.mark.parametrize("val_flipped", [False, True], ids=["best_after_resume", "best_before_resume"])
+def test_final_metrics_after_resume(tmp_path, val_flipped):
+    rng = np.random.default_rng(0)
+    x = rng.normal(size=(64, 4)).astype(np.float32)
+    y = (x[:, 0] > 0).astype(np.int64)
+    # Flipped validation labels get worse as training improves, so the best
+    # epoch is the first one, before the crash
+    data = ((x, y), (x, 1 - y if val_flipped else y))
+
+    keras.utils.set_random_seed(0)
+    model = keras.Sequential([keras.Input((4,)), keras.layers.Dense(2, activation="softmax")])
+    model.compile(optimizer=keras.optimizers.Adam(0.05), loss="sparse_categorical_crossentropy",
+                  metrics=["accuracy"])
+
+    with pytest.raises(RuntimeError, match="simulated crash"):
+        _fit(model, data, tmp_path / "backup", crash=True)
+    history, early_stopping, profiler = _fit(model, data, tmp_path / "backup")
+
+    assert len(history.history["loss"]) == EPOCHS - CRASH_AFTER
+    metrics = final_metrics(history, early_stopping, profiler)
+    assert metrics["epochs_trained"] == EPOCHS
+    assert metrics["best_epoch"] == int(early_stopping.best_epoch) + 1
+    assert (metrics["best_epoch"] <= CRASH_AFTER) == val_flipped
+
+    best = next(row for row in profiler.epochs if row["epoch"] == metrics["best_epoch"])
+    assert metrics["val_loss"] == pytest.approx(best["val_loss"])
+    assert metrics["train_accuracy"] == pytest.approx(best["accuracy"] * 100)
@@ -0,0 +1,133 @@
+import os
+import json
+import shutil
+import logging
+from pathlib import Path
+
+import numpy as np
+from tensorflow import keras
+
+logger = logging.getLogger(__name__)
+
+STATE_NAME = "callbacks.json"
+BEST_WEIGHTS_NAME = "best_weights.npz"
+
+# Counters Keras' own callbacks reset in on_train_begin and need back on resume
+KERAS_CALLBACK_STATE = {
+    keras.callbacks.EarlyStopping: ("wait", "stopped_epoch", "best", "best_epoch"),
+    keras.callbacks.ReduceLROnPlateau: ("wait", "cooldown_counter", "best"),
+}
+
+
+class CallbackStateCheckpoint(keras.callbacks.Callback):
+    """
+    Persist the state of the other training callbacks next to Keras'
+    BackupAndRestore checkpoint, and put it back when a run resumes.
+
+    BackupAndRestore saves the weights, optimizer slots and epoch, but
+    EarlyStopping and ReduceLROnPlateau restart their patience counters and
+    best values on every fit() (and EarlyStopping loses its best weights),
+    so a resumed run would behave differently from an uninterrupted one.
+    Saved per epoch into `backup_dir`, which BackupAndRestore deletes once
+    training finishes. Must come after the callbacks it restores.
+
+    Callbacks with their own `get_state()` / `set_state(state)` (the
+    profiler and stall monitor) are saved through those.
+    """
+
+    def __init__(self, backup_dir, callbacks, run_info=None):
+        super().__init__()
+        self.backup_dir = Path(backup_dir)
+        self.callbacks = list(callbacks)
+        self.run_info = run_info or {}
+        self.resumed_epoch = None
+
+    @property
+    def state_path(self):
+        return self.backup_dir / STATE_NAME
+
+    def discard_if_stale(self):
+        """Drop a checkpoint left by a different run (mode, classes, data size)."""
+        state = self._read()
+        if state is not None and state.get("run") != self.run_info:
+            logger.warning(f"Discarding checkpoint in {self.backup_dir} from a different training run")
+            shutil.rmtree(self.backup_dir, ignore_errors=True)
+
+    def _read(self):
+        try:
+            with open(self.state_path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    # ----------------------------------------------------------------------
+    def on_train_begin(self, logs=None):
+        state = self._read()
+        if state is None:
+            return
+        for i, callback in enumerate(self.callbacks):
+            saved = state["callbacks"].get(_key(i, callback))
+            if saved is None:
+                continue
+            if hasattr(callback, "set_state"):
+                callback.set_state(saved)
+            else:
+                for attr, value in saved.items():
+                    setattr(callback, attr, value)
+            if isinstance(callback, keras.callbacks.EarlyStopping) and callback.restore_best_weights:
+                best = self.backup_dir / BEST_WEIGHTS_NAME
+                if best.exists():
+                    with np.load(best) as data:
+                        callback.best_weights = [data[f"arr_{j}"] for j in range(len(data.files))]
+        self.resumed_epoch = state["epoch"]
+        logger.info(f"Resuming training after epoch {state['epoch']} from {self.backup_dir}")
+
+    def on_epoch_end(self, epoch, logs=None):
+        saved = {}
+        for i, callback in enumerate(self.callbacks):
+            if hasattr(callback, "get_state"):
+                saved[_key(i, callback)] = callback.get_state()
+                continue
+            for cls, attrs in KERAS_CALLBACK_STATE.items():
+                if isinstance(callback, cls):
+                    saved[_key(i, callback)] = {a: _plain(getattr(callback, a, None)) for a in attrs}
+            if isinstance(callback, keras.callbacks.EarlyStopping) and callback.best_weights is not None:
+                if callback.best_epoch == epoch or not (self.backup_dir / BEST_WEIGHTS_NAME).exists():
+                    self._atomic(BEST_WEIGHTS_NAME, lambda f: np.savez(f, *callback.best_weights))
+
+        state = {"epoch": epoch + 1, "run": self.run_info, "callbacks": saved}
+        self._atomic(STATE_NAME, lambda f: f.write(json.dumps(state).encode()))
+
+    def _atomic(self, name, write):
+        self.backup_dir.mkdir(parents=True, exist_ok=True)
+        tmp = self.backup_dir / f".{name}.tmp"
+        with open(tmp, "wb") as f:
+            write(f)
+        os.replace(tmp, self.backup_dir / name)
+
+
+def _key(i, callback):
+    return f"{i}:{type(callback).__name__}"
+
+
+def _plain(value):
+    """JSON-safe copy of a callback counter (numpy scalars, inf)."""
+    if isinstance(value, (np.floating, np.integer)):
+        return value.item()
+    return value
+
+
+# --------------------------------------------------------------------------
+def resumable_callbacks(backup_dir, callbacks, save_freq="epoch", run_info=None):
+    """
+    BackupAndRestore + callback state for `callbacks`, to append after them.
+
+    A crashed or killed run restarts from its last checkpoint the next time
+    the same training is started; a finished run removes the checkpoint.
+    `save_freq` is "epoch" or a number of batches (a resumed epoch then
+    restarts from its first batch, with the mid-epoch weights).
+    """
+    state = CallbackStateCheckpoint(backup_dir, callbacks, run_info)
+    state.discard_if_stale()
+    backup = keras.callbacks.BackupAndRestore(str(backup_dir), save_freq=save_freq, delete_checkpoint=True)
+    return [backup, state]
@@ -0,0 +1,205 @@
+import time
+import logging
+
+import numpy as np
+import tensorflow as tf
+from tensorflow import keras
+
+logger = logging.getLogger(__name__)
+
+
+def current_rss_mb():
+    """Resident set size of this process right now."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            pages = int(f.read().split()[1])
+        import resource
+        return round(pages * resource.getpagesize() / 2**20, 1)
+    except (OSError, ValueError, ImportError):
+        return None
+
+
+def peak_rss_mb():
+    """High-water mark of this process's resident set size."""
+    try:
+        import resource
+        # ru_maxrss is KiB on Linux
+        return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    except ImportError:
+        return None
+
+
+class TrainingProfiler(keras.callbacks.Callback):
+    """
+    Per-epoch training report for metrics.json.
+
+    Records, for every epoch: wall time split into the training pass and
+    validation, images/sec, time spent waiting on input vs computing (from
+    an InputStallMonitor, which must come earlier in the callback list),
+    current and peak RSS, the learning rate the epoch ran at (so
+    ReduceLROnPlateau's schedule is visible) and the epoch's logged
+    loss/accuracy.
+
+    `trace_steps=(first, last)` captures a TensorFlow profiler trace of
+    those global training steps into `trace_dir`, for TensorBoard's
+    profile plugin.
+    """
+
+    def __init__(self, stall_monitor=None, samples_per_epoch=None, trace_steps=None, trace_dir="./logs/profile"):
+        super().__init__()
+        self.stall_monitor = stall_monitor
+        self.samples_per_epoch = samples_per_epoch
+        self.trace_steps = tuple(trace_steps) if trace_steps else None
+        self.trace_dir = str(trace_dir)
+        self.epochs = []
+        self._step = 0
+        self._tracing = False
+        self._started = None
+        self._epoch_start = None
+        self._val_start = None
+        self._val_seconds = 0.0
+        self._lr = None
+
+    # ----------------------------------------------------------------------
+    def _learning_rate(self):
+        try:
+            return float(np.asarray(self.model.optimizer.learning_rate))
+        except (AttributeError, TypeError, ValueError):
+            return None
+
+    def on_train_begin(self, logs=None):
+        self._started = time.perf_counter()
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self._epoch_start = time.perf_counter()
+        self._val_start = None
+        self._val_seconds = 0.0
+        self._lr = self._learning_rate()
+
+    def on_train_batch_begin(self, batch, logs=None):
+        if self.trace_steps and self._step == self.trace_steps[0] and not self._tracing:
+            logger.info(f"Capturing profiler trace of steps {self.trace_steps[0]}-{self.trace_steps[1]} "
+                        f"into {self.trace_dir}")
+            tf.profiler.experimental.start(self.trace_dir)
+            self._tracing = True
+
+    def on_train_batch_end(self, batch, logs=None):
+        if self._tracing and self._step >= self.trace_steps[1]:
+            self._stop_trace()
+        self._step += 1
+
+    def on_test_begin(self, logs=None):
+        self._val_start = time.perf_counter()
+
+    def on_test_end(self, logs=None):
+        if self._val_start is not None:
+            self._val_seconds += time.perf_counter() - self._val_start
+
+    def on_epoch_end(self, epoch, logs=None):
+        end = time.perf_counter()
+        epoch_seconds = end - self._epoch_start
+        train_seconds = epoch_seconds - self._val_seconds
+
+        stall = None
+        if self.stall_monitor is not None and self.stall_monitor.epochs:
+            if self.stall_monitor.epochs[-1]["epoch"] == epoch + 1:
+                stall = self.stall_monitor.epochs[-1]
+        images = stall["images"] if stall else self.samples_per_epoch
+        input_wait = stall["input_wait_seconds"] if stall else None
+        rss, peak = current_rss_mb(), peak_rss_mb()
+        if rss is not None and peak is not None:
+            # ru_maxrss lags the live counter slightly
+            peak = max(rss, peak)
+
+        row = {
+            "epoch": epoch + 1,
+            "epoch_seconds": round(epoch_seconds, 3),
+            "train_seconds": round(train_seconds, 3),
+            "validation_seconds": round(self._val_seconds, 3),
+            "images": images,
+            "images_per_sec": round(images / train_seconds, 2) if images and train_seconds > 0 else None,
+            "input_wait_seconds": input_wait,
+            "compute_seconds": round(train_seconds - input_wait, 3) if input_wait is not None else None,
+            "rss_mb": rss,
+            "peak_rss_mb": peak,
+            "learning_rate": self._lr,
+            **{k: float(v) for k, v in (logs or {}).items() if np.isscalar(v) and k != "learning_rate"},
+        }
+        self.epochs.append(row)
+        logger.info(
+            f"Epoch {row['epoch']}: {row['epoch_seconds']}s ({row['images_per_sec']} img/s, "
+            f"val {row['validation_seconds']}s), lr {row['learning_rate']}, peak RSS {row['peak_rss_mb']} MB"
+        )
+
+    def on_train_end(self, logs=None):
+        if self._tracing:
+            self._stop_trace()
+
+    def _stop_trace(self):
+        tf.profiler.experimental.stop()
+        self._tracing = False
+        logger.info(f"Profiler trace saved to {self.trace_dir}")
+
+    # ----------------------------------------------------------------------
+    def get_state(self):
+        return {"epochs": self.epochs, "step": self._step}
+
+    def set_state(self, state):
+        self.epochs = list(state["epochs"])
+        self._step = state["step"]
+
+    def report(self):
+        """Totals plus the per-epoch rows."""
+        if not self.epochs:
+            return None
+        train_seconds = sum(e["train_seconds"] for e in self.epochs)
+        images = sum(e["images"] or 0 for e in self.epochs)
+        waits = [e["input_wait_seconds"] for e in self.epochs if e["input_wait_seconds"] is not None]
+        return {
+            "total_seconds": round(time.perf_counter() - self._started, 3) if self._started else None,
+            "train_seconds": round(train_seconds, 3),
+            "validation_seconds": round(sum(e["validation_seconds"] for e in self.epochs), 3),
+            "images_per_sec": round(images / train_seconds, 2) if images and train_seconds > 0 else None,
+            "input_wait_seconds": round(sum(waits), 3) if waits else None,
+            "input_stall_fraction": round(sum(waits) / train_seconds, 4) if waits and train_seconds > 0 else None,
+            "peak_rss_mb": max(e["peak_rss_mb"] or 0 for e in self.epochs) or None,
+            "learning_rates": [e["learning_rate"] for e in self.epochs],
+            "epochs": self.epochs,
+        }
+
+
+def final_metrics(history, early_stopping=None, profiler=None):
+    """
+    Train/val loss and accuracy for the weights the model ends up with,
+    read from the fit history instead of re-evaluating: the best epoch if
+    EarlyStopping restored it, else the last one. Train figures are the
+    epoch's running average over its (augmented) batches.
+
+    Epochs are absolute: after a resume, `history` only covers the epochs
+    this fit() ran, so earlier ones come from the (checkpointed) profiler
+    rows. Also returns how many epochs the whole run trained.
+    """
+    logs = {epoch: {k: v[i] for k, v in history.history.items()} for i, epoch in enumerate(history.epoch)}
+    for row in profiler.epochs if profiler is not None else ():
+        logs.setdefault(row["epoch"] - 1, row)
+
+    last = max(logs)
+    idx = last
+    if early_stopping is not None and early_stopping.restore_best_weights and early_stopping.best_weights is not None:
+        # Keras 3 restores best weights at the end of every fit; Keras 2
+        # only when it actually stopped early
+        if early_stopping.stopped_epoch > 0 or int(keras.__version__.split(".")[0]) >= 3:
+            best = int(early_stopping.best_epoch)
+            if best in logs:
+                idx = best
+            else:
+                logger.warning(f"No logged metrics for best epoch {best + 1}; reporting epoch {last + 1}")
+    row = logs[idx]
+    return {
+        "train_accuracy": float(row["accuracy"] * 100),
+        "val_accuracy": float(row["val_accuracy"] * 100),
+        "train_loss": float(row["loss"]),
+        "val_loss": float(row["val_loss"]),
+        "best_epoch": idx + 1,
+        "epochs_trained": last + 1,
+    }
@@ -1,26 +1,25 @@
 import { RequestHandler } from "express";
-import FormData from "form-data";
 import fs from "fs";
 import path from "path";
 import fetch from "node-fetch";
 
 const ML_SERVICE_URL = process.env.ML_SERVICE_URL || "http://localhost:5000";
 
+// /api/predict returns the diagnostic report fields at the top level,
+// or { error } with a 4xx/5xx status
 interface PredictionResponse {
-  status: string;
-  prediction?: {
-    predicted_class: string;
-    confidence: number;
-    all_predictions: Record<string, number>;
-    model_accuracy: number;
-    training_accuracy: number;
+  predicted_class?: string;
+  confidence?: number;
+  probabilities?: Record<string, number>;
+  overall_health_score?: number;
+  triage?: {
+    level: string;
+    message: string;
   };
-  model_metrics?: {
-    real_time_accuracy: number;
-    training_accuracy: number;
-    confidence: number;
-  };
-  message?: string;
+  model_version?: string | null;
+  model_accuracy?: number | null;
+  training_accuracy?: number | null;
+  error?: string;
 }
 
 export const handlePredict: RequestHandler = async (req, res) => {
@@ -35,33 +34,54 @@ export const handlePredict: RequestHandler = async (req, res) => {
       return;
     }
 
-    const form = new FormData();
-    form.append("image_base64", imageBase64);
+    // Forward the decoded bytes as a raw image body: no multipart wrapping
+    // and no base64 decoding on the ML service side
+    const match = /^data:([^;,]+)?(?:;[^,]*)?,/.exec(imageBase64);
+    const contentType = match?.[1]?.startsWith("image/")
+      ? match[1]
+      : "application/octet-stream";
+    const imageBuffer = Buffer.from(
+      match ? imageBase64.slice(match[0].length) : imageBase64,
+      "base64",
+    );
 
     const response = await fetch(`${ML_SERVICE_URL}/api/predict`, {
       method: "POST",
-      body: form,
-      headers: form.getHeaders(),
+      body: imageBuffer,
+      headers: {
+        "Content-Type": contentType,
+        "Content-Length": String(imageBuffer.length),
+      },
     });
 
     const data = (await response.json()) as PredictionResponse;
 
-    if (data.status === "success" && data.prediction) {
+    if (response.ok && data.predicted_class) {
+      const confidence = data.confidence ?? 0;
+      // Same shape as before: percentages (0-100) throughout
+      const allPredictions = Object.fromEntries(
+        Object.entries(data.probabilities ?? {}).map(([name, p]) => [
+          name,
+          p * 100,
+        ]),
+      );
       res.json({
         status: "success",
         prediction: {
-          disease: data.prediction.predicted_class,
-          confidence: data.prediction.confidence,
-          healthScore: 100 - data.prediction.confidence,
-          allPredictions: data.prediction.all_predictions,
-          modelAccuracy: data.prediction.model_accuracy,
-          trainingAccuracy: data.prediction.training_accuracy,
+          disease: data.predicted_class,
+          confidence,
+          healthScore: data.overall_health_score ?? 100 - confidence,
+          allPredictions,
+          modelAccuracy: data.model_accuracy ?? null,
+          trainingAccuracy: data.training_accuracy ?? null,
+          triage: data.triage,
+          modelVersion: data.model_version,
         },
       });
     } else {
-      res.status(500).json({
+      res.status(response.ok ? 500 : response.status).json({
         status: "error",
-        message: data.message || "Prediction failed",
+        message: data.error || "Prediction failed",
       });
     }
   } catch (error) {